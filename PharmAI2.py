@@ -1,391 +1,663 @@
+import time
+
 import streamlit as st
 import pandas as pd
 
-from tool_functions1.combinations      import create_combination_column
-from tool_functions1.summary           import generate_molecule_overview
-from tool_functions1.PacksAndProducts  import generate_combination_first_clean_summary
-from tool_functions1.MohapLandscape    import format_registered_products_by_company
-from tool_functions1.MoleculePlot      import plot_combination_market_breakdown_plotly, generate_growth_by_column_card
-from tool_functions1.MoleculeATC4      import plotly_combinations_within_atc4_go
-#from tool_functions.OrangeBook import generate_uptake_patent_view
-from tool_functions1.SummaryGen import generate_exec_summary_data
-from tool_functions1.MarketShare import plot_manufacturer_market_share
-from tool_functions1.Erosion import plot_market_erosion
-from tool_functions1.OrangeBook import display_patent_summary
-from tool_functions1.Reg import get_regulatory_summary
-from tool_functions1.DetailedForecast import create_combination_column, forecast_molecule_product_fmt
-# --- Load Master Data ---
-@st.cache_data
-def load_master_data():
-    df = pd.read_csv("MasterData2025.csv")
-
-    # Clean column names early to avoid hidden '\n' or trailing spaces
-    df.columns = df.columns.str.replace("\n", " ", regex=False).str.strip()
-
-    # Normalize molecule and product columns BEFORE creating combination column
-    df["Molecule"] = df["Molecule"].astype(str).str.strip().str.upper()
-    df["Product"] = df["Product"].astype(str).str.strip().str.upper()
-
-    # Create 'Molecule Combination' and 'Molecule Combination Type'
-    df = create_combination_column(df)
-
-    # Final clean of numeric columns
-    for col in df.columns:
-        if "Value" in col or "Units" in col:
-            df[col] = pd.to_numeric(
-                df[col].astype(str).str.replace(",", "").str.strip(),
-                errors="coerce"
-            )
+RERUN_STARTED = time.perf_counter()
+
+# Tool modules load lazily, on first use inside the tab that needs them (streamlit itself already imports plotly)
+import tool_functions1 as tools
+from tool_functions1.DataLoader import read_master_data, read_mohap_data, read_orange_book, compute_top_products
+from tool_functions1.DiskCache import DiskCache, cached_call, scoped_version
+from tool_functions1.ResultCache import MemoryCache, TieredCache
+from tool_functions1.DataRegistry import registry
+from tool_functions1.StartupLoader import StartupLoader
+from tool_functions1.SharedFrame import freeze_frame, freeze_frames
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, load_mapped
+from tool_functions1.MasterIngest import load_master, load_master_aggregates
+from tool_functions1.PartitionStore import (
+    PartitionedStore, default_partition, master_sources, partition_key, partitioning_enabled
+)
+from tool_functions1.SearchIndex import build_combination_index, build_ingredient_index, build_pair_index
+from tool_functions1.Metrics import METRICS, start_metrics_writer
+from tool_functions1.SlowLog import install_slow_log, annotate
 
-    return df
+# Max number of options handed to a selector widget per render
+SEARCH_LIMIT = 50
+
+# Main tabs, in display order (the open one is st.session_state["main_tabs"])
+TAB_LABELS = [
+    "📊 Exec Summary",
+    "📈 Graph + Table",
+    "📈 NFC3 + Strength Growth",
+    "🔍 ATC4 Breakdown",
+    "🌳 ATC Drill-down",
+    "🧭 Opportunity Screener",
+    "📋 Summary + Packs",
+    "🏛️ MOHAP Insights",
+    "📅 Patent Expiry Finder",
+    "📉 Erosion & Uptake",
+    "🔮 Forecast",
+    "tab batch"
+]
+
+# --- Result cache: bounded in-process memory in front of the shared on-disk SQLite file ---
+@st.cache_resource
+def get_shared_cache():
+    return TieredCache(MemoryCache(), DiskCache())
+
+shared_cache = get_shared_cache()
+
+# --- Memory-mapped Arrow copies of the sources (one physical copy for every worker) ---
+@st.cache_resource
+def get_arrow_store():
+    return ArrowStore() if arrow_available() else None
+
+arrow_store = get_arrow_store()
+
+# --- Partitioned master (PHARMAI_MASTER_SOURCES): every country and release, one view reads one of them ---
+@st.cache_resource
+def get_partition_store():
+    return PartitionedStore() if partitioning_enabled() else None
+
+partition_store = get_partition_store()
+
+# --- Runtime metrics: this worker's counters and latencies, rewritten every few seconds for the scraper ---
+start_metrics_writer()  # one writer thread per process
+# Tool calls slower than PHARMAI_SLOW_SECONDS are logged with their inputs (see replay.py)
+slow_log = install_slow_log()
+
+# --- Dataset version: fingerprints every source file, goes into every cache key ---
+DATA_VERSION, changed_sources = registry.refresh()
+if changed_sources:
+    # A source file was swapped under a running worker: drop every stale entry
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    shared_cache = get_shared_cache()
+    shared_cache.evict_stale(DATA_VERSION)
+
+# --- Country and data release: only that partition of the master is loaded ---
+@st.cache_resource(max_entries=1)
+def load_catalog(dataset_version):
+    return partition_store.ensure(master_sources(), dataset_version)
+
+if partition_store is not None:
+    catalog = load_catalog(DATA_VERSION)
+    default_country, _ = default_partition(catalog)
+    countries = catalog.countries()
+    country = st.sidebar.selectbox("🌍 Country", countries, index=countries.index(default_country), key="country")
+    release = st.sidebar.selectbox("🗓️ Data release", catalog.releases(country), key=f"release_{country}")
+    PARTITION = partition_key(country, release)
+else:
+    catalog, country, release, PARTITION = None, "UAE", None, None
+# Cache entries and per-process handles of one partition never serve another
+MASTER_VERSION = scoped_version(DATA_VERSION, PARTITION)
+
+def cached(fn, *args, **kwargs):
+    """
+    Runs a tool function through the shared disk cache for this dataset version
+    (and country / release, when the master is partitioned).
+    """
+    return cached_call(shared_cache, MASTER_VERSION, fn, *args, **kwargs)
+
+def cached_source(fn, *args, **kwargs):
+    """
+    Same as `cached`, for the country-independent sources (MOHAP, Orange Book):
+    one entry per dataset version, whichever partition is selected.
+    """
+    return cached_call(shared_cache, DATA_VERSION, fn, *args, **kwargs)
+
+def load_master_source(dataset_version, country, release):
+    if partition_store is not None:
+        return partition_store.scan(catalog, country, release)
+    # Large master files are streamed into the Arrow store in chunks
+    return load_master(arrow_store, dataset_version, lambda: cached(read_master_data))
+
+# --- Background loading: all sources read concurrently, one future each ---
+# Sources are frozen (read-only, shared by every session) as soon as they load
+@st.cache_resource(max_entries=1)
+def start_loading_sources(dataset_version):
+    # MOHAP and the Orange Book do not depend on the country: loaded once per dataset version
+    return StartupLoader(
+        {
+            "mohap":       lambda: freeze_frame(load_mapped(
+                arrow_store, "mohap", dataset_version, lambda: cached_source(read_mohap_data)
+            )),
+            "orange_book": lambda: freeze_frames(load_mapped(
+                arrow_store, ("ob_products", "ob_patents", "ob_exclusivity"), dataset_version,
+                lambda: cached_source(read_orange_book)
+            )),
+        },
+        derived={
+            "ob_product_table": ("orange_book", lambda ob: freeze_frame(
+                cached_source(tools.build_product_regulatory_table, ob[1], ob[2])
+            )),
+        }
+    )
+
+@st.cache_resource(max_entries=4)
+def start_loading(dataset_version, master_version, country, release):
+    # per-partition aggregates are summed in memory; the Arrow store keys files by dataset version only
+    aggregates_store = arrow_store if partition_store is None else None
+    return StartupLoader(
+        {
+            "master":      lambda: freeze_frame(load_master_source(dataset_version, country, release)),
+        },
+        derived={
+            "master_aggregates": ("master", lambda master: load_master_aggregates(aggregates_store, dataset_version, master)),
+            "top_products": ("master_aggregates", lambda totals: cached(compute_top_products, totals)),
+            "atc_hierarchy": ("master", lambda master: cached(tools.build_atc_hierarchy, master)),
+            "uptake_library": ("master", lambda master: freeze_frame(cached(tools.build_uptake_library, master))),
+            "trend_forecasts": ("master", lambda master: cached(tools.build_trend_forecasts, master)),
+        }
+    )
+
+sources_loader = start_loading_sources(DATA_VERSION)
+loader = start_loading(DATA_VERSION, MASTER_VERSION, country, release)
+
+# --- Load Master Data (cache_resource: one shared handle, no per-rerun unpickle) ---
+@st.cache_resource(max_entries=4)
+def load_master_data(master_version):
+    return loader.result("master")
 
 # --- Load MOHAP Data ---
-@st.cache_data
-def load_mohap_data():
-    mohap_df = pd.read_csv("PriceListMOHAP.csv")
-    mohap_df.columns = mohap_df.columns.str.replace("\n", " ", regex=False).str.strip()
+@st.cache_resource(max_entries=1)
+def load_mohap_data(dataset_version):
+    return sources_loader.result("mohap")
 
+# --- Load Orange Book Data ---
+@st.cache_resource(max_entries=1)
+def load_orange_book(dataset_version):
+    return sources_loader.result("orange_book")
 
-    return mohap_df
+# --- Per-product patent × exclusivity table (built once, no cartesian merge) ---
+@st.cache_resource(max_entries=1)
+def load_ob_product_table(dataset_version):
+    return sources_loader.result("ob_product_table")
 
 
-# --- Load data ---
-df = load_master_data()
-mohap_df = load_mohap_data()
+# --- Top product per combination (read by the batch tab's pair index) ---
+@st.cache_resource(max_entries=4)
+def load_top_products(master_version):
+    return loader.result("top_products")
 
+# --- ATC1 → ATC4 → combination rollups: class figures and drill-downs are lookups ---
+@st.cache_resource(max_entries=4)
+def load_atc_hierarchy(master_version):
+    return loader.result("atc_hierarchy")
 
-# ── Compute top-seller per Molecule Combination ────────────────────────────────
-combo_prod_sales = (
-    df.groupby(["Molecule Combination", "Product"])["2024 Units"]
-      .sum()
-)
-# for each combo, pick the (combo,product) with max units
-top_pairs = combo_prod_sales.groupby(level=0).idxmax().tolist()
-# build lookup dict: { combo: top_product }
-top_product_for_combo = { combo: prod for combo, prod in top_pairs }
+# --- Log-linear trend fits for every combination: projections are lookups ---
+@st.cache_resource(max_entries=4)
+def load_trend_forecasts(master_version):
+    return loader.result("trend_forecasts")
+
+
+# --- Load data: only the master blocks the selector; the rest is waited for by the tabs that read it ---
+df = load_master_data(MASTER_VERSION)
+
+
+# --- Search indexes (built once per process, not on every rerun) ---
+@st.cache_resource(max_entries=4)
+def get_combination_index(master_version, _df):
+    return build_combination_index(_df)
+
+@st.cache_resource(max_entries=1)
+def get_mohap_index(dataset_version, _mohap_df):
+    return build_ingredient_index(_mohap_df["Ingredient"])
+
+@st.cache_resource(max_entries=4)
+def get_pair_index(master_version, _df, _top_product_for_combo):
+    return build_pair_index(_df, _top_product_for_combo)
+
+@st.cache_resource(max_entries=1)
+def get_ob_index(dataset_version, _ob_products):
+    return build_ingredient_index(_ob_products["Ingredient_Formatted_Clean"])
 
 
 # --- UI ---
-st.title("💊 UAE Molecule Intelligence Platform")
+st.title(f"💊 {country} Molecule Intelligence Platform")
 
-# Shared molecule selector
-selected_combo = st.selectbox(
+# Shared molecule selector: typeahead over the index, widget only gets the top hits
+combo_index = get_combination_index(MASTER_VERSION, df)
+combo_query = st.text_input(
     "🔎 Search Molecule:",
-    sorted(df["Molecule Combination"].dropna().unique())
+    key="combo_query",
+    placeholder="Type a molecule or combination (any component matches)"
+)
+combo_hits = combo_index.search(combo_query, limit=SEARCH_LIMIT)
+if not combo_hits:
+    st.warning(f"❌ No molecule matches `{combo_query}` — showing top sellers instead.")
+    combo_hits = combo_index.search("", limit=SEARCH_LIMIT)
+selected_combo = st.selectbox("Select Molecule:", combo_hits)
+
+# What this run is showing, attached to any slow-call record it writes
+open_tab = st.session_state.get("main_tabs") or TAB_LABELS[0]
+annotate(
+    version=DATA_VERSION, partition=PARTITION, tab=open_tab, combo=selected_combo,
+    widgets={k: v for k, v in st.session_state.items()
+             if isinstance(v, (str, int, float, bool, list, tuple)) and not k.startswith("saved_")}
 )
 
-# Tabs
-tab1a, tab1b, tab_nfc3_growth, tab2, tab3, tab4, tab5, tab6, tab7, tab_batch = st.tabs([
-    "📊 Exec Summary",
-    "📈 Graph + Table",
-    "📈 NFC3 + Strength Growth",
-    "🔍 ATC4 Breakdown",
-    "📋 Summary + Packs",
-    "🏛️ MOHAP Insights",
-    "📅 Patent Expiry Finder",
-    "📉 Erosion & Uptake",
-    "🔮 Forecast",
-    "tab batch"
-])
+# --- Combination context: the selected molecule's typed slice and aggregates, built once ---
+@st.cache_resource(max_entries=32)
+def get_combination_context(master_version, combo, _df):
+    return tools.build_combination_context(_df, combo)
+
+ctx = get_combination_context(MASTER_VERSION, selected_combo, df)
+
+def sticky_radio(label, options, key, **kwargs):
+    """
+    Radio whose choice survives while its tab is closed: lazy tabs skip the
+    widget, and Streamlit drops state for widgets that were not rendered.
+    """
+    saved = st.session_state.get(f"saved_{key}", options[0])
+    choice = st.radio(label, options, index=options.index(saved), key=key, **kwargs)
+    st.session_state[f"saved_{key}"] = choice
+    return choice
+
+# Tabs: lazy — only the open tab's body runs on a rerun
+tab1a, tab1b, tab_nfc3_growth, tab2, tab_atc, tab_screener, tab3, tab4, tab5, tab6, tab7, tab_batch = st.tabs(
+    TAB_LABELS, key="main_tabs", on_change="rerun"
+)
 # === Tab 1: Molecule-Level Market Breakdown ===
 # === Tab 1A: Executive Summary ===
 with tab1a:
-    st.subheader("🧬 Executive Summary")
+    if tab1a.open:
+        st.subheader("🧬 Executive Summary")
 
-    summary = generate_exec_summary_data(df, selected_combo)
+        atc_hierarchy = load_atc_hierarchy(MASTER_VERSION)
+        summary = cached(tools.generate_exec_summary_data, df, selected_combo, hierarchy=atc_hierarchy, context=ctx)
 
-    # Block 1: Sales & Growth
-    st.markdown("### 💰 Sales & Growth")
-    col1, col2, col3 = st.columns(3)
-    col1.metric("2024 Sales (AED)", f"{summary['total_sales']:,.0f}")
-    col2.metric("2024 Units", f"{summary['total_units']:,.0f}")
-    col3.metric("Unique Manufacturers", summary['unique_manufacturers'])
+        # Block 1: Sales & Growth
+        st.markdown("### 💰 Sales & Growth")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("2024 Sales (AED)", f"{summary['total_sales']:,.0f}")
+        col2.metric("2024 Units", f"{summary['total_units']:,.0f}")
+        col3.metric("Unique Manufacturers", summary['unique_manufacturers'])
     
-    col4, col5 = st.columns(2)
-    col4.metric("CAGR (Units)", f"{summary['unit_cagr']:.1f}%")
-    col5.metric("CAGR (Value)", f"{summary['value_cagr']:.1f}%")
+        col4, col5 = st.columns(2)
+        col4.metric("CAGR (Units)", f"{summary['unit_cagr']:.1f}%")
+        col5.metric("CAGR (Value)", f"{summary['value_cagr']:.1f}%")
     
-    # 👉 New: Predicted Revenue
-    st.markdown("#### 📈 Predict Your Entry Revenue")
-    entry_pct = st.number_input("🔢 Expected Market Capture (%)", min_value=0.0, max_value=100.0, value=8.0, step=0.5)
-    adjusted_cif_price = (summary["total_sales"] / 1.4) * 0.4
-    predicted_revenue = adjusted_cif_price * (entry_pct / 100)
+        # 👉 New: Predicted Revenue
+        st.markdown("#### 📈 Predict Your Entry Revenue")
+        entry_pct = st.number_input("🔢 Expected Market Capture (%)", min_value=0.0, max_value=100.0, value=8.0, step=0.5)
+        adjusted_cif_price = (summary["total_sales"] / 1.4) * 0.4
+        predicted_revenue = adjusted_cif_price * (entry_pct / 100)
     
-    st.metric("💡 Predicted Revenue (AED)", f"{predicted_revenue:,.0f}")
+        st.metric("💡 Predicted Revenue (AED)", f"{predicted_revenue:,.0f}")
     
-    st.divider()
+        st.divider()
 
-        # Block 1: Sales & Growth
-    st.markdown("### 💰 2025 Sales & Units")
-    col20, col21, col22 = st.columns(3)
-    col20.metric("2025 Sales (AED)", f"{summary['total_sales_2025']:,.0f}")
-    col21.metric("2025 Units", f"{summary['total_units_2025']:,.0f}")
-    col22.metric("📊 Predicted Sales (2x Units)", f"{summary['total_sales_2025'] * 2:,.0f}")
-
-
-   # Block 2: Market Leaders
-    st.markdown("### 🥇 Market Leaders")
-    col6, col7 = st.columns(2)
-    col6.metric("Top Manufacturer", summary['top_2024_manufacturer'])
-    col7.metric("Market Share", f"{summary['top_2024_share']:.1f}%")
+            # Block 1: Sales & Growth
+        st.markdown("### 💰 2025 Sales & Units")
+        col20, col21, col22 = st.columns(3)
+        col20.metric("2025 Sales (AED)", f"{summary['total_sales_2025']:,.0f}")
+        col21.metric("2025 Units", f"{summary['total_units_2025']:,.0f}")
+        col22.metric("📊 Predicted Sales (2x Units)", f"{summary['total_sales_2025'] * 2:,.0f}")
+
+
+       # Block 2: Market Leaders
+        st.markdown("### 🥇 Market Leaders")
+        col6, col7 = st.columns(2)
+        col6.metric("Top Manufacturer", summary['top_2024_manufacturer'])
+        col7.metric("Market Share", f"{summary['top_2024_share']:.1f}%")
     
-    st.markdown(f"**Originator Value Share Change:** {summary['originator_share_change']}")
-    st.markdown(f"**Top 3 Manufacturers:**")
-    for manu, share in summary["top3_manufacturers"].items():
-        st.markdown(f"- `{manu}` → {share:.1f}%")
+        st.markdown(f"**Originator Value Share Change:** {summary['originator_share_change']}")
+        st.markdown(f"**Top 3 Manufacturers:**")
+        for manu, share in summary["top3_manufacturers"].items():
+            st.markdown(f"- `{manu}` → {share:.1f}%")
     
-    st.markdown(f"**# Manufacturers >3% Share**: `{summary['manufacturers_above_3_pct']}`")
+        st.markdown(f"**# Manufacturers >3% Share**: `{summary['manufacturers_above_3_pct']}`")
     
-    # 👉 New: Top product and launch year
-    st.markdown(f"**Top Product (from {summary['top_2024_manufacturer']}):** `{summary['top_product']}`")
-    if summary['top_product_launch_year']:
-        st.markdown(f"**Launch Year:** `{summary['top_product_launch_year']}`")
+        # 👉 New: Top product and launch year
+        st.markdown(f"**Top Product (from {summary['top_2024_manufacturer']}):** `{summary['top_product']}`")
+        if summary['top_product_launch_year']:
+            st.markdown(f"**Launch Year:** `{summary['top_product_launch_year']}`")
     
-    st.divider()
+        st.divider()
 
-    # Block 3: Market Split
-    st.markdown("### 🏪 Market Split")
-    col8, col9 = st.columns(2)
-    col8.metric("Private Market", f"{summary['private_pct']:.1f}%")
-    col9.metric("LPO Market", f"{summary['lpo_pct']:.1f}%")
+        # Block 3: Market Split
+        st.markdown("### 🏪 Market Split")
+        col8, col9 = st.columns(2)
+        col8.metric("Private Market", f"{summary['private_pct']:.1f}%")
+        col9.metric("LPO Market", f"{summary['lpo_pct']:.1f}%")
 
-    col10, col11 = st.columns(2)
-    col10.metric("Private CAGR (Units)", f"{summary['private_cagr']:.1f}%")
-    col11.metric("LPO CAGR (Units)", f"{summary['lpo_cagr']:.1f}%")
+        col10, col11 = st.columns(2)
+        col10.metric("Private CAGR (Units)", f"{summary['private_cagr']:.1f}%")
+        col11.metric("LPO CAGR (Units)", f"{summary['lpo_cagr']:.1f}%")
 
-    st.divider()
+        st.divider()
 
-    # Block 4: ATC Classification
-    st.markdown("### 🧬 ATC Classification")
-    st.markdown(f"""
+        # Block 4: ATC Classification
+        st.markdown("### 🧬 ATC Classification")
+        st.markdown(f"""
     - **ATC1**: {summary['atc1']}  
     - **ATC2**: {summary['atc2']}  
     - **ATC3**: {summary['atc3']}  
     - **ATC4**: {summary['atc4']}
     """)
 
-    st.divider()
-
-    # Block 5: 📈 5-Year Forecast
-    st.markdown("### 📈 Market Forecast (2025–2029)")
-
-    forecast_table = pd.DataFrame({
-        "Year": list(summary["forecast_units"].keys()),
-        "Forecasted Units": list(summary["forecast_units"].values()),
-        "Forecasted Value (AED)": list(summary["forecast_value"].values())
-    })
-
-    st.dataframe(forecast_table, use_container_width=True)
+        st.divider()
 
-    st.caption("🔮 Based on historical CAGR from 2021–2024. These values are simple forecasts and assume trend continuation.")
+        # Block 5: 📈 5-Year Forecast
+        st.markdown("### 📈 Market Forecast (2025–2029)")
 
-    st.divider()
+        projection_mode = sticky_radio(
+            "Projection:", ["CAGR compounding", "Fitted trend (log-linear)"], key="exec_projection", horizontal=True
+        )
+        trend_forecasts = load_trend_forecasts(MASTER_VERSION)
+        fitted = trend_forecasts.projection(selected_combo, scale=1 / (selected_combo.count(" + ") + 1))
 
-    # Block 6: 🧬 Class Overview
-    st.markdown("### 🧬 Class Overview (2024)")
+        if projection_mode == "CAGR compounding" or fitted is None:
+            forecast_table = pd.DataFrame({
+                "Year": list(summary["forecast_units"].keys()),
+                "Forecasted Units": list(summary["forecast_units"].values()),
+                "Forecasted Value (AED)": list(summary["forecast_value"].values())
+            })
 
-    st.markdown("#### 📦 ATC4 Level")
-    st.markdown(f"**ATC4 Name:** {summary['atc4']}")
-    colA1, colA2, colA3 = st.columns(3)
-    colA1.metric("2024 Value (AED)", f"{summary['atc4_metrics']['value_2024']:,.0f}")
-    colA2.metric("CAGR (Value)", f"{summary['atc4_metrics']['value_cagr']:.1f}%")
-    colA3.metric("CAGR (Units)", f"{summary['atc4_metrics']['unit_cagr']:.1f}%")
+            st.dataframe(forecast_table, use_container_width=True)
 
-    st.markdown("#### 🧪 ATC3 Level")
-    st.markdown(f"**ATC3 Name:** {summary['atc3']}")
-    colB1, colB2, colB3 = st.columns(3)
-    colB1.metric("2024 Value (AED)", f"{summary['atc3_metrics']['value_2024']:,.0f}")
-    colB2.metric("CAGR (Value)", f"{summary['atc3_metrics']['value_cagr']:.1f}%")
-    colB3.metric("CAGR (Units)", f"{summary['atc3_metrics']['unit_cagr']:.1f}%")
-    
+            st.caption("🔮 Based on historical CAGR from 2021–2024. These values are simple forecasts and assume trend continuation.")
+        else:
+            st.dataframe(fitted.round(0), use_container_width=True)
 
-    st.divider()
-    
-        # Block 4: Regulatory Snapshot
-    st.markdown("### 📜 Regulatory Snapshot")
+            value_trend = trend_forecasts.tables["LC Value"].loc[selected_combo]
+            st.caption(
+                f"🔮 Log-linear fit over {trend_forecasts.history[0]}–{trend_forecasts.history[-1]} "
+                f"({int(value_trend['Fit Points'])} years with sales, {value_trend['Trend Growth (%)']:.1f}% fitted value growth); "
+                f"Low / High bound a {trend_forecasts.level:.0%} prediction interval."
+            )
 
-        # --- Load Data ---
-    ob_products = pd.read_csv("OBproducts.csv")
-    ob_patents  = pd.read_csv("OBpatents.csv")
+        st.divider()
 
-        # --- Clean Orange Book product data ---
-    ob_products.columns = ob_products.columns.str.strip()
-    ob_products["Ingredient"] = ob_products["Ingredient"].astype(str).str.upper().str.strip()
-    ob_products["Ingredient_List"] = ob_products["Ingredient"].str.split(";")
-    ob_products["Ingredient_Formatted"] = ob_products["Ingredient_List"].apply(lambda x: " +".join(x))
-    ob_products["Ingredient_Formatted_Clean"] = ob_products["Ingredient_Formatted"].str.strip().str.upper()
+        # Block 6: 🧬 Class Overview
+        st.markdown("### 🧬 Class Overview (2024)")
 
-    reg_data = get_regulatory_summary(selected_combo, mohap_df, ob_products, ob_patents)
+        st.markdown("#### 📦 ATC4 Level")
+        st.markdown(f"**ATC4 Name:** {summary['atc4']}")
+        colA1, colA2, colA3 = st.columns(3)
+        colA1.metric("2024 Value (AED)", f"{summary['atc4_metrics']['value_2024']:,.0f}")
+        colA2.metric("CAGR (Value)", f"{summary['atc4_metrics']['value_cagr']:.1f}%")
+        colA3.metric("CAGR (Units)", f"{summary['atc4_metrics']['unit_cagr']:.1f}%")
 
-    colA, colB = st.columns(2)
-    colA.metric("MOHAP Registered Manufacturers", reg_data["mohap_manufacturers"])
-    colB.metric("Orange Book Latest Expiry", str(reg_data["orange_book_expiry"]))
+        st.markdown("#### 🧪 ATC3 Level")
+        st.markdown(f"**ATC3 Name:** {summary['atc3']}")
+        colB1, colB2, colB3 = st.columns(3)
+        colB1.metric("2024 Value (AED)", f"{summary['atc3_metrics']['value_2024']:,.0f}")
+        colB2.metric("CAGR (Value)", f"{summary['atc3_metrics']['value_cagr']:.1f}%")
+        colB3.metric("CAGR (Units)", f"{summary['atc3_metrics']['unit_cagr']:.1f}%")
+    
 
-    st.markdown(f"**Search logic**: includes any ingredient that contains the term `{selected_combo.upper()}`.")
-    st.divider()
+        st.divider()
+    
+            # Block 4: Regulatory Snapshot
+        st.markdown("### 📜 Regulatory Snapshot")
+
+            # --- Load Data (cached per dataset version, loaded in the background) ---
+        with st.spinner("Loading regulatory data..."):
+            mohap_df = load_mohap_data(DATA_VERSION)
+            ob_products, _, _ = load_orange_book(DATA_VERSION)
+            ob_product_table = load_ob_product_table(DATA_VERSION)
+        reg_data = cached(tools.get_regulatory_summary, selected_combo, mohap_df, ob_products, ob_product_table)
+
+        colA, colB = st.columns(2)
+        colA.metric("MOHAP Registered Manufacturers", reg_data["mohap_manufacturers"])
+        colB.metric("Orange Book Latest Expiry", str(reg_data["orange_book_expiry"]))
+
+        st.markdown(f"**Search logic**: includes any ingredient that contains the term `{selected_combo.upper()}`.")
+        st.divider()
 with tab1b:
-    st.subheader("🧪 Molecule-Level Market Breakdown")
+    if tab1b.open:
+        st.subheader("🧪 Molecule-Level Market Breakdown")
+
+        plot_market = sticky_radio(
+            "Market Type:",
+            ["PRIVATE MARKET", "LPO", "TOTAL (PRIVATE + LPO)"],
+            key="plot_market",
+            horizontal=True
+        )
+        plot_metric = sticky_radio(
+            "Metric:",
+            ["Units", "Value"],
+            key="plot_metric",
+            horizontal=True
+        )
+        group_by_column = sticky_radio(
+            "Group By:",
+            ["Manufacturer", "Product", "Strength", "NFC3"],  # 🆕 NFC3 added here
+            key="group_by",
+            horizontal=True
+        )
 
-    plot_market = st.radio(
-        "Market Type:",
-        ["PRIVATE MARKET", "LPO", "TOTAL (PRIVATE + LPO)"],
-        horizontal=True
-    )
-    plot_metric = st.radio(
-        "Metric:",
-        ["Units", "Value"],
-        horizontal=True
-    )
-    group_by_column = st.radio(
-        "Group By:",
-        ["Manufacturer", "Product", "Strength", "NFC3"],  # 🆕 NFC3 added here
-        horizontal=True
-    )
+        use_value         = (plot_metric == "Value")
+        use_market_filter = (plot_market != "TOTAL (PRIVATE + LPO)")
+        market_type_pass  = plot_market
 
-    use_value         = (plot_metric == "Value")
-    use_market_filter = (plot_market != "TOTAL (PRIVATE + LPO)")
-    market_type_pass  = plot_market
-
-    # Core plot and summary
-    fig_mol, mol_summary = plot_combination_market_breakdown_plotly(
-        df,
-        selected_molecule=selected_combo,
-        use_market_filter=use_market_filter,
-        market_type=market_type_pass,
-        use_value=use_value,
-        group_by_column=group_by_column
-    )
-    if fig_mol:
-        st.plotly_chart(fig_mol, use_container_width=True)
-        show_manu_summary = st.toggle("📊 Show 2024 Summary Table")
-        if show_manu_summary:
-            st.subheader("🔢 2024 Manufacturer Summary")
-            st.dataframe(mol_summary)
-    else:
-        st.warning("⚠️ No molecule-level data to show for that selection.")
-
-    # Optional market share trends
-    show_share_plot = st.toggle("📈 Show Market Share Line Chart")
-    if show_share_plot:
-        share_market_type = "TOTAL" if not use_market_filter else market_type_pass
-        fig_share = plot_manufacturer_market_share(
+        # Core plot and summary
+        fig_mol, mol_summary = cached(
+            tools.plot_combination_market_breakdown_plotly,
             df,
             selected_molecule=selected_combo,
-            market_type=share_market_type
+            use_market_filter=use_market_filter,
+            market_type=market_type_pass,
+            use_value=use_value,
+            group_by_column=group_by_column,
+            context=ctx
         )
-        if fig_share:
-            st.plotly_chart(fig_share, use_container_width=True)
+        if fig_mol:
+            st.plotly_chart(fig_mol, use_container_width=True)
+            show_manu_summary = st.toggle("📊 Show 2024 Summary Table")
+            if show_manu_summary:
+                st.subheader("🔢 2024 Manufacturer Summary")
+                st.dataframe(mol_summary)
         else:
-            st.warning("⚠️ Not enough data to show market share trends.")
+            st.warning("⚠️ No molecule-level data to show for that selection.")
+
+        # Optional market share trends
+        show_share_plot = st.toggle("📈 Show Market Share Line Chart")
+        if show_share_plot:
+            share_market_type = "TOTAL" if not use_market_filter else market_type_pass
+            fig_share = cached(
+                tools.plot_manufacturer_market_share,
+                df,
+                selected_molecule=selected_combo,
+                market_type=share_market_type,
+                context=ctx
+            )
+            if fig_share:
+                st.plotly_chart(fig_share, use_container_width=True)
+            else:
+                st.warning("⚠️ Not enough data to show market share trends.")
 
 
 # === Tab: NFC3 + Strength Growth ===
 with tab_nfc3_growth:
-    st.subheader("📈 Market Growth Breakdown (NFC3 & Strength)")
-    col1, col2 = st.columns(2)
+    if tab_nfc3_growth.open:
+        st.subheader("📈 Market Growth Breakdown (NFC3 & Strength)")
+        col1, col2 = st.columns(2)
 
-    with col1:
-        st.markdown("### NFC3 Growth Breakdown")
-        nfc3_card = generate_growth_by_column_card(df, combo=selected_combo, group_col="NFC3")
-        st.markdown(nfc3_card, unsafe_allow_html=True)
+        with col1:
+            st.markdown("### NFC3 Growth Breakdown")
+            nfc3_card = cached(tools.generate_growth_by_column_card, df, combo=selected_combo, group_col="NFC3", context=ctx)
+            st.markdown(nfc3_card, unsafe_allow_html=True)
 
-    with col2:
-        st.markdown("### Strength Growth Breakdown")
-        strength_card = generate_growth_by_column_card(df, combo=selected_combo, group_col="Strength")
-        st.markdown(strength_card, unsafe_allow_html=True)
+        with col2:
+            st.markdown("### Strength Growth Breakdown")
+            strength_card = cached(tools.generate_growth_by_column_card, df, combo=selected_combo, group_col="Strength", context=ctx)
+            st.markdown(strength_card, unsafe_allow_html=True)
 
 # === Tab 2: ATC4 Breakdown ===
 with tab2:
-    st.subheader("🔍 ATC4 Market Breakdown")
+    if tab2.open:
+        st.subheader("🔍 ATC4 Market Breakdown")
 
-    atc4_name = df.loc[
-        df["Molecule Combination"] == selected_combo,
-        "ATC4"
-    ].dropna().unique()[0]
+        # Metric follows the Graph + Table tab, even when that tab is closed
+        use_value = st.session_state.get("saved_plot_metric", "Units") == "Value"
 
-    fig_atc4, atc4_summary = plotly_combinations_within_atc4_go(
-        df,
-        atc4_name=atc4_name,
-        UseValue=use_value
-    )
-    if fig_atc4:
-        st.plotly_chart(fig_atc4, use_container_width=True)
-        # Display Top 5 Winners and Losers
-        sort_cagr_col = "Value CAGR (%)" if use_value else "Units CAGR (%)"
-        st.markdown("### 🏆 Top 5 Winners by CAGR")
-        top_5_winners = atc4_summary.sort_values(by=sort_cagr_col, ascending=False).head(5)
-        st.dataframe(top_5_winners[["Combination", sort_cagr_col]])
+        atc4_name = ctx.atc["ATC4"]
 
-        st.markdown("### 📉 Top 5 Losers by CAGR")
-        top_5_losers = atc4_summary.sort_values(by=sort_cagr_col, ascending=True).head(5)
-        st.dataframe(top_5_losers[["Combination", sort_cagr_col]])
+        fig_atc4, atc4_summary = cached(
+            tools.plotly_combinations_within_atc4_go,
+            df,
+            atc4_name=atc4_name,
+            UseValue=use_value,
+            hierarchy=load_atc_hierarchy(MASTER_VERSION)
+        )
+        if fig_atc4:
+            st.plotly_chart(fig_atc4, use_container_width=True)
+            # Display Top 5 Winners and Losers
+            sort_cagr_col = "Value CAGR (%)" if use_value else "Units CAGR (%)"
+            st.markdown("### 🏆 Top 5 Winners by CAGR")
+            top_5_winners = atc4_summary.sort_values(by=sort_cagr_col, ascending=False).head(5)
+            st.dataframe(top_5_winners[["Combination", sort_cagr_col]])
+
+            st.markdown("### 📉 Top 5 Losers by CAGR")
+            top_5_losers = atc4_summary.sort_values(by=sort_cagr_col, ascending=True).head(5)
+            st.dataframe(top_5_losers[["Combination", sort_cagr_col]])
+
+        show_atc4_summary = st.toggle("📊 Show Full 2024 ATC4 Summary")
+        if show_atc4_summary:
+            st.subheader("🔢 2024 ATC4 Summary")
+            st.dataframe(atc4_summary)
+
+
+# === Tab 2B: ATC Drill-down ===
+with tab_atc:
+    if tab_atc.open:
+        st.subheader("🌳 ATC Drill-down")
+        st.caption("Open a class at each level; every table is read from the precomputed hierarchy.")
+
+        # Start from the selected molecule's own classes
+        atc_hierarchy = load_atc_hierarchy(MASTER_VERSION)
+        levels = atc_hierarchy.levels
+        default_path = ctx.atc
+
+        nodes = atc_hierarchy.roots()
+        for level, col in zip(levels[:-1], st.columns(len(levels) - 1)):
+            table = tools.format_atc_nodes(nodes)
+            options = table.index.tolist()
+            default = default_path.get(level)
+            with col:
+                code = st.selectbox(level, options, index=options.index(default) if default in options else 0, key=f"drill_{level}")
+            with st.expander(f"{level} classes ({len(options)})", expanded=level == levels[0]):
+                st.dataframe(table, use_container_width=True)
+            nodes = atc_hierarchy.children(level, code)
+
+        st.markdown(f"#### 💊 Combinations in {code}")
+        st.dataframe(tools.format_atc_nodes(nodes), use_container_width=True)
+
+
+# === Tab 2C: Opportunity Screener ===
+with tab_screener:
+    if tab_screener.open:
+        st.subheader("🧭 Opportunity Screener")
+
+        with st.spinner("Scoring every combination..."):
+            mohap_df = load_mohap_data(DATA_VERSION)
+            ob_products, _, _ = load_orange_book(DATA_VERSION)
+            ob_product_table = load_ob_product_table(DATA_VERSION)
+            screener = cached(
+                tools.build_screener_table, df, mohap_df, ob_products, ob_product_table,
+                hierarchy=load_atc_hierarchy(MASTER_VERSION), trends=load_trend_forecasts(MASTER_VERSION)
+            )
 
-    show_atc4_summary = st.toggle("📊 Show Full 2024 ATC4 Summary")
-    if show_atc4_summary:
-        st.subheader("🔢 2024 ATC4 Summary")
-        st.dataframe(atc4_summary)
+        # Filters and sorting only mask / reorder the precomputed table
+        colF1, colF2, colF3 = st.columns(3)
+        atc1_filter = colF1.multiselect("ATC1", sorted(screener["ATC1"].dropna().unique()), key="screen_atc1")
+        min_value = colF2.number_input("Min 2024 Value (AED)", min_value=0, value=0, step=1_000_000, key="screen_min_value")
+        min_cagr = colF3.number_input("Min Value CAGR (%)", value=-100.0, step=5.0, key="screen_min_cagr")
+
+        colF4, colF5, colF6 = st.columns(3)
+        max_manu = colF4.number_input(
+            "Max Manufacturers", min_value=1, value=int(screener["Manufacturers"].max() or 1), key="screen_max_manu"
+        )
+        expiry_year = colF5.number_input(
+            "OB expiry before (year, 0 = any)", min_value=0, max_value=2100, value=0, key="screen_expiry"
+        )
+        sort_by = colF6.selectbox("Sort by", tools.SCREENER_METRICS, key="screen_sort")
+        ascending = st.toggle("Ascending", key="screen_ascending")
+
+        screened = tools.screen_combinations(
+            screener,
+            atc1=atc1_filter,
+            min_value=min_value,
+            min_value_cagr=min_cagr,
+            max_manufacturers=max_manu,
+            expiry_before=f"{int(expiry_year)}-01-01" if expiry_year else None,
+            sort_by=sort_by,
+            ascending=ascending
+        )
+        st.caption(f"{len(screened):,} of {len(screener):,} combinations match")
+        st.dataframe(screened.round(1), use_container_width=True)
 
 
 # === Tab 3: Summary + Packs ===
 with tab3:
-    st.subheader("📋 Molecule Summary and Pack Overview")
+    if tab3.open:
+        st.subheader("📋 Molecule Summary and Pack Overview")
 
-    summary_df = generate_molecule_overview(df, selected_combo)
-    if summary_df is not None:
-        st.table(summary_df)
-    else:
-        st.warning(f"❌ No summary data for '{selected_combo}'")
+        summary_df = cached(
+            tools.generate_molecule_overview, df, selected_combo, hierarchy=load_atc_hierarchy(MASTER_VERSION), context=ctx
+        )
+        if summary_df is not None:
+            st.table(summary_df)
+        else:
+            st.warning(f"❌ No summary data for '{selected_combo}'")
 
-    st.markdown("---")
-    packs_md = generate_combination_first_clean_summary(df, selected_combo)
-    st.markdown(packs_md)
+        st.markdown("---")
+        # One precomputed combination → product → pack table set, rendered paginated
+        breakdown = cached(tools.build_pack_breakdown, df, selected_combo, context=ctx)
+        tools.render_pack_breakdown(breakdown)
 
 
 # === Tab 4: MOHAP Insights ===
 with tab4:
-    st.subheader("🏛️ MOHAP Registered Product Landscape")
+    if tab4.open:
+        st.subheader("🏛️ MOHAP Registered Product Landscape")
 
-    # Ingredient dropdown
-    ingredient_opts = sorted(mohap_df["Ingredient"].dropna().unique())
-    choice = st.selectbox("🔎 Search by Ingredient (MOHAP):", [""] + ingredient_opts)
-    if choice:
-        format_registered_products_by_company(choice, mohap_df)
+        with st.spinner("Loading MOHAP data..."):
+            mohap_df = load_mohap_data(DATA_VERSION)
+
+        # Ingredient typeahead
+        mohap_query = st.text_input("🔎 Search by Ingredient (MOHAP):", key="mohap_query")
+        ingredient_opts = get_mohap_index(DATA_VERSION, mohap_df).search(mohap_query, limit=SEARCH_LIMIT)
+        choice = st.selectbox("Matching Ingredients:", [""] + ingredient_opts, key="mohap_choice")
+        if choice:
+            tools.format_registered_products_by_company(choice, mohap_df)
 
 with tab5:
-    st.subheader("📅 Orange Book Patent Expiry Lookup")
-
-    # --- Load Data ---
-    ob_products    = pd.read_csv("OBproducts.csv")
-    ob_patents     = pd.read_csv("OBpatents.csv")
-    ob_exclusive   = pd.read_csv("OBexclusivity.csv")  # ✅ Load this too
-
-    # --- Clean Orange Book product data ---
-    ob_products.columns = ob_products.columns.str.strip()
-    ob_products["Ingredient"] = ob_products["Ingredient"].astype(str).str.upper().str.strip()
-    ob_products["Ingredient_List"] = ob_products["Ingredient"].str.split(";")
-    ob_products["Ingredient_Formatted"] = ob_products["Ingredient_List"].apply(lambda x: " +".join(x))
-    ob_products["Ingredient_Formatted_Clean"] = ob_products["Ingredient_Formatted"].str.strip().str.upper()
-
-    # --- Dropdown selection ---
-    selected_ingredient = st.selectbox(
-        "🔎 Select Ingredient Combination:",
-        sorted(ob_products["Ingredient_Formatted_Clean"].dropna().unique())
-    )
+    if tab5.open:
+        st.subheader("📅 Orange Book Patent Expiry Lookup")
+
+        # --- Load Data (cached per dataset version, loaded in the background) ---
+        with st.spinner("Loading Orange Book data..."):
+            ob_products, _, _ = load_orange_book(DATA_VERSION)
+            ob_product_table = load_ob_product_table(DATA_VERSION)
+
+        # --- Typeahead selection ---
+        ob_query = st.text_input("🔎 Search Ingredient Combination:", key="ob_query")
+        selected_ingredient = st.selectbox(
+            "🔎 Select Ingredient Combination:",
+            get_ob_index(DATA_VERSION, ob_products).search(ob_query, limit=SEARCH_LIMIT)
+        )
 
-    # --- Display patent + exclusivity summary ---
-    display_patent_summary(ob_products, ob_patents, ob_exclusive, selected_ingredient)
+        # --- Display patent + exclusivity summary ---
+        if selected_ingredient:
+            tools.display_patent_summary(ob_products, ob_product_table, selected_ingredient)
 with tab6:
-    st.subheader("📉 Originator Erosion & Uptake Curve")
+    if tab6.open:
+        st.subheader("📉 Originator Erosion & Uptake Curve")
 
-    with st.spinner("Analyzing erosion and plotting uptake..."):
-        try:
-            fig, erosion_summary = plot_market_erosion(df.copy(), selected_combo)
+        with st.spinner("Analyzing erosion and plotting uptake..."):
+            try:
+                fig, erosion_summary = cached(tools.plot_market_erosion, df, selected_combo, context=ctx)
 
-            if fig:
-                st.plotly_chart(fig, use_container_width=True)
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
 
-            if erosion_summary:
-                st.markdown(f"""
+                if erosion_summary:
+                    st.markdown(f"""
 ### 📉 **Originator Erosion for `{selected_combo.upper()}`**
 - **2021 Market Share:** {erosion_summary['originator_2021']:.2%}  
 - **2024 Market Share:** {erosion_summary['originator_2024']:.2%}  
@@ -398,29 +670,78 @@ with tab6:
 - **Avg Originator Share in 2021:** {erosion_summary['avg_originator_2021']:.2%}  
 - **Avg Originator Share in 2024:** {erosion_summary['avg_originator_2024']:.2%}
                 """)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+
+        # --- Cohort uptake benchmark: how past generic entrants grew their share ---
+        st.markdown("### 📈 Cohort Uptake Benchmark")
+        uptake_library = loader.result("uptake_library")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            uptake_scope = sticky_radio("Cohorts:", ["Same ATC4", "All classes"], key="uptake_scope")
+        with col2:
+            uptake_bucket = sticky_radio("Incumbents at entry:", ["Any"] + list(tools.COMPETITOR_BUCKETS), key="uptake_bucket")
+        with col3:
+            uptake_market = sticky_radio("Market:", ["ALL", "PRIVATE MARKET", "LPO"], key="uptake_market")
+
+        uptake_table = tools.uptake_percentiles(
+            uptake_library,
+            atc4=ctx.atc["ATC4"] if uptake_scope == "Same ATC4" else None,
+            competitors=tools.COMPETITOR_BUCKETS.get(uptake_bucket),
+            market=uptake_market
+        )
+        if uptake_table.empty:
+            st.info("No generic entries match these filters.")
+        else:
+            st.plotly_chart(
+                tools.plot_uptake_percentiles(uptake_table, f"Share Since Entry – {ctx.atc['ATC4'] if uptake_scope == 'Same ATC4' else 'all classes'}, {uptake_bucket} incumbents"),
+                use_container_width=True
+            )
+            st.dataframe(uptake_table.round(1), use_container_width=True)
 
 with tab7:
-    st.subheader("🔮 Product-Level Forecast")
-
-    # 1) pick a product under the selected molecule combo
-    prods = (
-        df[df["Molecule Combination"] == selected_combo]
-          ["Product"]
-          .str.upper()
-          .drop_duplicates()
-          .tolist()
-    )
-    selected_product = st.selectbox("🔎 Select Product:", prods, key="forecast_prod")
+    if tab7.open:
+        st.subheader("🔮 Product-Level Forecast")
+
+        # 1) pick a product under the selected molecule combo
+        prods = ctx.product_names()
+        selected_product = st.selectbox("🔎 Select Product:", prods, key="forecast_prod")
+
+        # 2) inputs for penetration & growth
+        pen = st.number_input("Market Penetration Y1 (%):", min_value=0.0, max_value=100.0, value=3.0, step=0.5, key="forecast_pen") / 100
+        gr  = st.number_input("YoY Growth Rate (%):",       min_value=0.0, max_value=100.0, value=10.0, step=0.5, key="forecast_gr")  / 100
 
-    # 2) inputs for penetration & growth
-    pen = st.number_input("Market Penetration Y1 (%):", min_value=0.0, max_value=100.0, value=3.0, step=0.5, key="forecast_pen") / 100
-    gr  = st.number_input("YoY Growth Rate (%):",       min_value=0.0, max_value=100.0, value=10.0, step=0.5, key="forecast_gr")  / 100
+        forecast_mode = sticky_radio("Mode:", ["Single scenario", "Scenario grid"], key="forecast_mode", horizontal=True)
 
-    if st.button("Run Forecast", key="run_forecast"):
-        fc = forecast_molecule_product_fmt(df, selected_combo, selected_product, pen, gr)
-        st.dataframe(fc, use_container_width=True)
+        if forecast_mode == "Single scenario":
+            if st.button("Run Forecast", key="run_forecast"):
+                fc = tools.forecast_molecule_product_fmt(
+                    df, selected_combo, selected_product, growth_rate=gr, context=ctx, penetration=pen
+                )
+                st.dataframe(fc, use_container_width=True)
+        else:
+            # 3) every penetration × growth pair in one broadcast, around the inputs above
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                pen_range = st.slider("Penetration range (%):", 0.0, 100.0, (0.5, 20.0), step=0.5, key="grid_pen")
+            with col2:
+                gr_range = st.slider("Growth range (%):", 0.0, 100.0, (0.0, 30.0), step=0.5, key="grid_gr")
+            with col3:
+                steps = st.number_input("Grid points per axis:", min_value=5, max_value=200, value=50, step=5, key="grid_steps")
+            grid_metric = sticky_radio("Revenue:", tools.SCENARIO_METRICS, key="grid_metric", horizontal=True)
+
+            try:
+                grid = tools.forecast_scenario_grid(
+                    df, selected_combo, selected_product,
+                    tools.grid_axis(pen_range[0] / 100, pen_range[1] / 100, steps),
+                    tools.grid_axis(gr_range[0] / 100, gr_range[1] / 100, steps),
+                    context=ctx
+                )
+                st.plotly_chart(tools.plot_scenario_heatmap(grid, grid_metric, marker=(pen, gr)), use_container_width=True)
+                st.markdown("#### Sensitivity at the base case")
+                st.plotly_chart(tools.plot_sensitivity_slices(grid, pen, gr, grid_metric), use_container_width=True)
+            except KeyError as e:
+                st.error(f"⚠️ {e}")
 
 
 import re
@@ -462,85 +783,104 @@ def pct_fmt(x):
 
 # === Tab 7: Batch Forecasts ===
 with tab_batch:
-    st.subheader("🧮 Select one or more Molecule ▶ Product to forecast")
-
-    # Unique Molecule→Product pairs
-    pairs = (
-        df[["Molecule Combination", "Product"]]
-        .drop_duplicates()
-        .sort_values(["Molecule Combination", "Product"])
-    )
-
-    options = []
-    for combo, prod in zip(pairs["Molecule Combination"], pairs["Product"]):
-        label = f"{combo} → {prod}"
-        if top_product_for_combo.get(combo) == prod:
-            label += " ★"
-        options.append(label)
-
-    selections = st.multiselect(
-        "🔎 Pick Molecule + Product",
-        options,
-        help="You can Ctrl-click (or Cmd-click) to select multiple."
-    )
-
-    if not selections:
-        st.info("Select at least one pair above to see your batch forecast.")
-    else:
-        results = []
-        total_y1 = 0
-        total_y2 = 0
-        total_y3 = 0
-
-        for sel in selections:
-            combo, prod = [s.strip() for s in sel.replace("★", "").split("→")]
-            try:
-                fc = forecast_molecule_product_fmt(df, combo, prod)
-                fc.insert(0, "Molecule Combination", combo)
-
-                # === FIXED LPO/Private Split Calculation ===
-                mol_df = df[df["Molecule Combination"].str.upper() == combo.upper()].copy()
-                mol_df["Market"] = mol_df["Market"].astype(str).str.upper().str.strip()
-                mol_df["2024 Units"] = pd.to_numeric(mol_df["2024 Units"], errors="coerce").fillna(0)
-                mol_df["n_mols"] = mol_df["Molecule Combination"].str.count(r" \+ ") + 1
-                mol_df["2024 Units"] = mol_df["2024 Units"] / mol_df["n_mols"]
-
-                private_units = mol_df[mol_df["Market"] == "PRIVATE MARKET"]["2024 Units"].sum()
-                lpo_units     = mol_df[mol_df["Market"] == "LPO"]["2024 Units"].sum()
-                total_units   = private_units + lpo_units
-
-                private_pct = (private_units / total_units * 100) if total_units else 0
-                lpo_pct     = (lpo_units / total_units * 100) if total_units else 0
-
-                fc["Private %"] = pct_fmt(private_pct)
-                fc["LPO %"]     = pct_fmt(lpo_pct)
-
-                results.append(fc)
-
-                # Revenue Totals
-                total_y1 += fc["Y1 Revenue"].map(parse_aed).sum()
-                total_y2 += fc["Y2 Revenue"].map(parse_aed).sum()
-                total_y3 += fc["Y3 Revenue"].map(parse_aed).sum()
-
-            except Exception as e:
-                st.error(f"⚠️ Forecast for `{combo}` → `{prod}` failed: {e}")
-
-        if results:
-            # Merge results with spacers
-            merged = []
-            for fc in results:
-                merged.append(fc)
-                spacer = pd.DataFrame([[None]*len(fc.columns)], columns=fc.columns)
-                merged.append(spacer)
-            batch_df = pd.concat(merged, ignore_index=True)
+    if tab_batch.open:
+        st.subheader("🧮 Select one or more Molecule ▶ Product to forecast")
+
+        # Molecule→Product pairs come from the prebuilt index; keep current picks selectable
+        pair_query = st.text_input("🔎 Search Molecule + Product:", key="pair_query")
+        picked = st.session_state.get("saved_batch_pairs", [])
+        options = picked + [
+            label for label in get_pair_index(MASTER_VERSION, df, load_top_products(MASTER_VERSION)).search(pair_query, limit=SEARCH_LIMIT)
+            if label not in picked
+        ]
+
+        selections = st.multiselect(
+            "🔎 Pick Molecule + Product",
+            options,
+            default=picked,
+            key="batch_pairs",
+            help="You can Ctrl-click (or Cmd-click) to select multiple."
+        )
+        st.session_state["saved_batch_pairs"] = selections
 
-            st.dataframe(batch_df, use_container_width=True)
+        penetration_basis = sticky_radio(
+            "Y1–Y3 penetration:",
+            ["Fixed rule (20% / 10% / 5% by competitors)", "Empirical uptake (median of past entrants)"],
+            key="batch_penetration",
+            horizontal=True
+        )
 
-            # Markdown Summary
-            summary_md = f"""
+        if not selections:
+            st.info("Select at least one pair above to see your batch forecast.")
+        else:
+            results = []
+            total_y1 = 0
+            total_y2 = 0
+            total_y3 = 0
+
+            for sel in selections:
+                combo, prod = [s.strip() for s in sel.replace("★", "").split("→")]
+                try:
+                    uptake = None
+                    combo_ctx = get_combination_context(MASTER_VERSION, combo, df)
+                    if penetration_basis.startswith("Empirical"):
+                        uptake, basis = tools.empirical_uptake(
+                            loader.result("uptake_library"),
+                            atc4=combo_ctx.atc["ATC4"],
+                            competitors=tools.competitor_range(len(combo_ctx.manufacturers))
+                        )
+                        if uptake is None:
+                            st.warning(f"No uptake cohorts for `{combo}` — using the fixed rule.")
+                        else:
+                            st.caption(f"`{combo}`: {basis}")
+                    fc = tools.forecast_molecule_product_fmt(df, combo, prod, context=combo_ctx, uptake=uptake)
+                    fc.insert(0, "Molecule Combination", combo)
+
+                    # === LPO/Private Split: 2024 units by market of the typed combination slice ===
+                    # (the per-molecule split of units is the same for every row, so it cancels in the shares)
+                    market_units  = combo_ctx.rows.groupby("Market")["2024 Units"].sum()
+                    private_units = market_units.get("PRIVATE MARKET", 0)
+                    lpo_units     = market_units.get("LPO", 0)
+                    total_units   = private_units + lpo_units
+
+                    private_pct = (private_units / total_units * 100) if total_units else 0
+                    lpo_pct     = (lpo_units / total_units * 100) if total_units else 0
+
+                    fc["Private %"] = pct_fmt(private_pct)
+                    fc["LPO %"]     = pct_fmt(lpo_pct)
+
+                    results.append(fc)
+
+                    # Revenue Totals
+                    total_y1 += fc["Y1 Revenue"].map(parse_aed).sum()
+                    total_y2 += fc["Y2 Revenue"].map(parse_aed).sum()
+                    total_y3 += fc["Y3 Revenue"].map(parse_aed).sum()
+
+                except Exception as e:
+                    st.error(f"⚠️ Forecast for `{combo}` → `{prod}` failed: {e}")
+
+            if results:
+                # Merge results with spacers
+                merged = []
+                for fc in results:
+                    merged.append(fc)
+                    spacer = pd.DataFrame([[None]*len(fc.columns)], columns=fc.columns)
+                    merged.append(spacer)
+                batch_df = pd.concat(merged, ignore_index=True)
+
+                st.dataframe(batch_df, use_container_width=True)
+
+                # Markdown Summary
+                summary_md = f"""
             ### 💼 Portfolio Revenue Summary
             **Total Y1 Revenue:** {total_y1:,.0f}  
             **Total Y2 Revenue:** {total_y2:,.0f}  
             **Total Y3 Revenue:** {total_y3:,.0f}
             """
-            st.markdown(summary_md)
\ No newline at end of file
+                st.markdown(summary_md)
+
+
+# --- Runtime metrics: whole-rerun time, labelled with the tab that was open ---
+rerun_seconds = time.perf_counter() - RERUN_STARTED
+METRICS.observe("pharmai_rerun_seconds", rerun_seconds, tab=open_tab)
+slow_log.record_rerun(rerun_seconds)
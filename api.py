@@ -0,0 +1,477 @@
+"""
+Local JSON API over the same data and tool functions as the Streamlit app.
+
+    python api.py --port 8502 --workers 8
+
+GET  /health                                   dataset version, cache and pool stats
+GET  /metrics[?format=json]                    runtime metrics (Prometheus text by default)
+GET  /combinations?q=metformin&limit=20        combination search (same index as the app)
+GET  /summary?molecule=METFORMIN               exec summary numbers
+GET  /breakdown?molecule=...&market=PRIVATE MARKET&metric=units&group_by=Manufacturer
+GET  /regulatory?molecule=...                  MOHAP / Orange Book snapshot
+GET  /forecast?molecule=...&product=...&growth=0.1[&penetration=0.05]
+POST /batch  {"endpoint": "summary", "molecules": ["A", "B"], "params": {...}}
+
+Tool results go through the shared disk cache (so the app's warm entries are
+reused); encoded responses are kept in a bounded in-process LRU keyed by the
+dataset version. Requests are served by a fixed-size worker pool. With a
+partitioned master (PHARMAI_MASTER_SOURCES) one process serves one country
+and release (--country, --release; default PHARMAI_COUNTRY at its latest).
+"""
+import argparse
+import datetime
+import inspect
+import json
+import math
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.DataLoader import read_master_data, read_mohap_data, read_orange_book
+from tool_functions1.DataRegistry import registry
+from tool_functions1.DiskCache import DiskCache, cached_call, scoped_version
+from tool_functions1.StartupLoader import StartupLoader
+from tool_functions1.SharedFrame import freeze_frame, freeze_frames
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, load_mapped
+from tool_functions1.MasterIngest import load_master
+from tool_functions1.PartitionStore import (
+    DEFAULT_COUNTRY, PartitionedStore, default_partition, master_sources, partition_key, partitioning_enabled
+)
+from tool_functions1.SearchIndex import build_combination_index
+from tool_functions1.Metrics import METRICS
+from tool_functions1.QueryEngine import current_engine
+from tool_functions1.AtcHierarchy import build_atc_hierarchy
+from tool_functions1.OrangeBook import build_product_regulatory_table
+from tool_functions1.CombinationContext import build_combination_context
+from tool_functions1.SummaryGen import generate_exec_summary_data
+from tool_functions1.MoleculePlot import plot_combination_market_breakdown_plotly
+from tool_functions1.Reg import get_regulatory_summary
+from tool_functions1.DetailedForecast import forecast_molecule_product
+
+MAX_BATCH = 200
+# Seconds a keep-alive connection may sit idle before its worker drops it
+IDLE_TIMEOUT = float(os.environ.get("PHARMAI_API_IDLE_TIMEOUT", "2"))
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ─── 1/ JSON encoding ───────────────────────────────────────────────────────────
+def to_jsonable(value):
+    """
+    Tool results (frames, numpy scalars, timestamps, NaN) as plain JSON values.
+    """
+    if isinstance(value, pd.DataFrame):
+        frame = value.reset_index() if not isinstance(value.index, pd.RangeIndex) else value
+        return [to_jsonable(row) for row in frame.to_dict("records")]
+    if isinstance(value, pd.Series):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, np.ndarray)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if value is pd.NaT or value is pd.NA:
+        return None
+    return value
+
+
+# ─── 2/ Bounded response cache ──────────────────────────────────────────────────
+class ResponseCache:
+    """
+    LRU of encoded responses, at most `max_entries`. Keys include the dataset
+    version, so a data refresh never serves an old body.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        METRICS.inc("pharmai_cache_requests_total", layer="response", result="miss" if body is None else "hit")
+        return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+# ─── 3/ Data handle and endpoints ───────────────────────────────────────────────
+class PharmaService:
+    """
+    Loads the sources once per dataset version (memory-mapped and frozen, as
+    in the app) and answers endpoint calls from them. With a partitioned
+    master only the `country` / `release` partition is loaded, and each
+    molecule's context is built from a scan filtered down to its rows.
+    """
+
+    def __init__(self, cache=None, store=None, response_cache=None, country=DEFAULT_COUNTRY, release=None):
+        self.cache = cache or DiskCache()
+        self.store = store if store is not None else (ArrowStore() if arrow_available() else None)
+        self.partitions = PartitionedStore() if partitioning_enabled() else None
+        self.country, self.release = country, release
+        self.catalog = self.partition = None
+        self.responses = response_cache or ResponseCache()
+        self._lock = threading.Lock()
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reloads when a source file changed since the last request.
+        """
+        version, _ = registry.refresh()
+        if version == self.version:
+            return version
+        with self._lock:
+            if version != self.version:
+                self.cache.evict_stale(version)
+                if self.partitions is not None:
+                    self.catalog = self.partitions.ensure(master_sources(), version)
+                    self.partition = default_partition(self.catalog, self.country, self.release)
+                self.loader = self._start_loader(version)
+                self.version = version
+                self._indexes = {}
+        return version
+
+    def _load_master(self, version):
+        if self.partitions is not None:
+            return self.partitions.scan(self.catalog, *self.partition)
+        return load_master(self.store, version, lambda: cached_call(self.cache, version, read_master_data))
+
+    def _start_loader(self, version):
+        cache, store = self.cache, self.store
+        return StartupLoader(
+            {
+                "master":      lambda: freeze_frame(self._load_master(version)),
+                "mohap":       lambda: freeze_frame(load_mapped(
+                    store, "mohap", version, lambda: cached_call(cache, version, read_mohap_data)
+                )),
+                "orange_book": lambda: freeze_frames(load_mapped(
+                    store, ("ob_products", "ob_patents", "ob_exclusivity"), version,
+                    lambda: cached_call(cache, version, read_orange_book)
+                )),
+            },
+            derived={
+                "atc_hierarchy": ("master", lambda master: cached_call(cache, version, build_atc_hierarchy, master)),
+                "ob_product_table": ("orange_book", lambda ob: freeze_frame(cached_call(
+                    cache, version, build_product_regulatory_table, ob[1], ob[2]
+                ))),
+            }
+        )
+
+    def cached(self, fn, *args, **kwargs):
+        scope = partition_key(*self.partition) if self.partition else None
+        return cached_call(self.cache, scoped_version(self.version, scope), fn, *args, **kwargs)
+
+    def _context(self, molecule):
+        if not molecule:
+            raise ApiError(400, "missing 'molecule'")
+        if self.partitions is not None:
+            # only the combination's rows and its ATC4 class are read from the partition files
+            rows = self.partitions.scan_combination(self.catalog, *self.partition, molecule)
+        else:
+            rows = self.loader.result("master")
+        ctx = build_combination_context(rows, molecule)
+        if ctx.empty:
+            raise ApiError(404, f"unknown molecule combination: {molecule}")
+        return ctx
+
+    # --- endpoints: each takes the query params (single values) and returns JSON-able data ---
+    def combinations(self, q="", limit="20"):
+        index = self._indexes.get("combinations")
+        if index is None:
+            index = self._indexes["combinations"] = build_combination_index(self.loader.result("master"))
+        return index.search(q, limit=int(limit))
+
+    def summary(self, molecule=None):
+        ctx = self._context(molecule)
+        df = self.loader.result("master")
+        return self.cached(
+            generate_exec_summary_data, df, ctx.combo, hierarchy=self.loader.result("atc_hierarchy"), context=ctx
+        )
+
+    def breakdown(self, molecule=None, market="PRIVATE MARKET", metric="units", group_by="Manufacturer"):
+        ctx = self._context(molecule)
+        df = self.loader.result("master")
+        _, table = self.cached(
+            plot_combination_market_breakdown_plotly, df,
+            selected_molecule=ctx.combo, use_market_filter=market.upper() != "TOTAL", market_type=market.upper(),
+            use_value=metric.lower() == "value", group_by_column=group_by, context=ctx
+        )
+        if table is None:
+            raise ApiError(404, f"no '{group_by}' breakdown for {ctx.combo} in {market}")
+        return table
+
+    def regulatory(self, molecule=None):
+        ctx = self._context(molecule)
+        ob_products = self.loader.result("orange_book")[0]
+        return self.cached(
+            get_regulatory_summary, ctx.combo, self.loader.result("mohap"), ob_products, self.loader.result("ob_product_table")
+        )
+
+    def forecast(self, molecule=None, product=None, growth="0.10", penetration=None):
+        ctx = self._context(molecule)
+        if not product:
+            raise ApiError(400, "missing 'product'")
+        try:
+            return self.cached(
+                forecast_molecule_product, self.loader.result("master"), ctx.combo, product,
+                growth_rate=float(growth), context=ctx, penetration=float(penetration) if penetration else None
+            )
+        except KeyError as e:
+            raise ApiError(404, str(e).strip("'\""))
+
+    def health(self):
+        return {
+            "status": "ok",
+            "version": self.version,
+            "partition": partition_key(*self.partition) if self.partition else None,
+            "engine": current_engine().name,
+            "sources": self.loader.status(),
+            "response_cache": self.responses.stats(),
+            "disk_cache": self.cache.stats(),
+        }
+
+    ENDPOINTS = ("combinations", "summary", "breakdown", "regulatory", "forecast")
+
+    def call(self, endpoint, params):
+        """
+        Encoded JSON body for one endpoint call, from the response cache when possible.
+        """
+        if endpoint not in self.ENDPOINTS:
+            raise ApiError(404, f"unknown endpoint: {endpoint}")
+        version = self.refresh()
+        key = (version, endpoint, tuple(sorted(params.items())))
+        body = self.responses.get(key)
+        if body is None:
+            handler = getattr(self, endpoint)
+            try:
+                inspect.signature(handler).bind(**params)
+            except TypeError as e:
+                raise ApiError(400, f"bad parameters for /{endpoint}: {e}")
+            body = json.dumps(to_jsonable(handler(**params))).encode()
+            self.responses.set(key, body)
+        return body
+
+    def batch(self, payload):
+        """
+        One endpoint over many molecules: {molecule: result} with per-molecule
+        errors instead of failing the whole call.
+        """
+        endpoint = payload.get("endpoint")
+        molecules = payload.get("molecules") or []
+        params = {k: str(v) for k, v in (payload.get("params") or {}).items()}
+        if not isinstance(molecules, list) or not molecules:
+            raise ApiError(400, "'molecules' must be a non-empty list")
+        if len(molecules) > MAX_BATCH:
+            raise ApiError(400, f"at most {MAX_BATCH} molecules per batch")
+
+        parts = []
+        for molecule in molecules:
+            try:
+                result = self.call(endpoint, {**params, "molecule": str(molecule)})
+            except ApiError as e:
+                if e.status == 404 and str(e).startswith("unknown endpoint"):
+                    raise
+                result = json.dumps({"error": str(e), "status": e.status}).encode()
+            parts.append(json.dumps(str(molecule)).encode() + b": " + result)
+        return b"{" + b", ".join(parts) + b"}"
+
+
+# ─── 4/ HTTP server with a fixed worker pool ────────────────────────────────────
+class PooledHTTPServer(HTTPServer):
+    """
+    Hands each accepted connection to a bounded thread pool instead of a
+    new thread per request; excess requests queue instead of piling up threads.
+    A worker keeps a keep-alive connection only while it is in use: it is
+    dropped after `IDLE_TIMEOUT` without a request, or as soon as another
+    connection is queued (`waiting`), so open client sessions cannot hold
+    the whole pool.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, handler, service, workers=8):
+        super().__init__(address, handler)
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pharmai-api")
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    def waiting(self):
+        """
+        Accepted connections not yet picked up by a worker.
+        """
+        return self._queued
+
+    def _serve(self, request, client_address):
+        with self._queued_lock:
+            self._queued -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        with self._queued_lock:
+            self._queued += 1
+        self.pool.submit(self._serve, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT           # also bounds a client that stalls mid-request
+    IDLE_POLL = 0.05
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._next_request_ready():
+            self.handle_one_request()
+
+    def _next_request_ready(self):
+        """
+        Waits on a keep-alive connection: True once the next request (or the
+        client's close) arrives, False when it idles past `timeout` or other
+        connections are queued for a worker.
+        """
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):       # pipelined request already buffered
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline and not self.server.waiting():
+            readable, _, _ = select.select([self.connection], [], [], self.IDLE_POLL)
+            if readable:
+                return True
+        return False
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.waiting():
+            # other clients are queued for a worker: don't keep this one
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, endpoint, handler):
+        t0 = time.perf_counter()
+        status = 200
+        try:
+            self._send(200, handler())
+        except ApiError as e:
+            status = e.status
+            self._send(e.status, json.dumps({"error": str(e)}).encode())
+        except Exception as e:
+            status = 500
+            self._send(500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode())
+        elapsed = time.perf_counter() - t0
+        # unknown paths share one label so a crawler cannot grow the series
+        label = endpoint if endpoint in PharmaService.ENDPOINTS + ("health", "batch") else "other"
+        METRICS.inc("pharmai_requests_total", endpoint=label, status=status)
+        METRICS.observe("pharmai_request_seconds", elapsed, endpoint=label)
+        self.log_message("%s %.1f ms", self.path, elapsed * 1000)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.strip("/")
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        service = self.server.service
+        if endpoint == "metrics":
+            if params.get("format") == "json":
+                self._send(200, json.dumps(METRICS.snapshot()).encode())
+            else:
+                self._send(200, METRICS.to_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8")
+        elif endpoint == "health":
+            self._dispatch(endpoint, lambda: json.dumps(to_jsonable(service.health())).encode())
+        else:
+            self._dispatch(endpoint, lambda: service.call(endpoint, params))
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip("/") != "batch":
+            self._send(404, json.dumps({"error": "POST is only supported on /batch"}).encode())
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+
+        def run():
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as e:
+                raise ApiError(400, f"invalid JSON: {e}")
+            return self.server.service.batch(payload)
+
+        self._dispatch("batch", run)
+
+
+def serve(host="127.0.0.1", port=8502, workers=8, cache_entries=1024, cache=None, country=DEFAULT_COUNTRY, release=None):
+    service = PharmaService(cache=cache, response_cache=ResponseCache(cache_entries), country=country, release=release)
+    server = PooledHTTPServer((host, port), ApiHandler, service, workers=workers)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve PharmAI numbers as JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, default=8, help="request worker threads")
+    parser.add_argument("--cache-entries", type=int, default=1024, help="max responses kept in memory")
+    parser.add_argument("--cache", default=None, help="SQLite cache path (default: PHARMAI_CACHE_PATH or .cache/)")
+    parser.add_argument("--country", default=DEFAULT_COUNTRY, help="country served from a partitioned master")
+    parser.add_argument("--release", default=None, help="data release (default: the country's latest)")
+    opts = parser.parse_args()
+    server = serve(
+        opts.host, opts.port, opts.workers, opts.cache_entries, DiskCache(opts.cache) if opts.cache else None,
+        opts.country, opts.release
+    )
+    print(f"PharmAI API on http://{opts.host}:{opts.port} (dataset {server.service.version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,142 @@
+"""
+Compares the query engines on the hot aggregations of the app.
+
+    python engine_compare.py --top 20 --repeat 3
+    python engine_compare.py --engine arrow --engine duckdb --out engines.json
+
+Loads the master for the current dataset version (as the app does: Arrow
+store, or the default country and release when it is partitioned), then
+runs the molecule breakdown, growth cards, manufacturer share, erosion and
+ATC4 breakdown of the top-N combinations on every available engine
+(`tool_functions1.QueryEngine`), bypassing every cache. Reports the median
+time per tool and engine, the speedup over pandas, and any result that
+differs from the pandas one. Exits 1 on a mismatch. The ATC4 breakdown runs
+without the precomputed hierarchy, so the engine does the grouping.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.DataLoader import read_master_data, top_combinations
+from tool_functions1.DataRegistry import registry
+from tool_functions1.DiskCache import DiskCache, cached_call
+from tool_functions1.ArrowStore import ArrowStore, arrow_available
+from tool_functions1.MasterIngest import load_master, load_master_aggregates
+from tool_functions1.PartitionStore import (
+    DEFAULT_COUNTRY, PartitionedStore, default_partition, master_sources, partitioning_enabled
+)
+from tool_functions1.QueryEngine import available_engines, results_match, use_engine
+from tool_functions1.SharedFrame import freeze_frame
+from tool_functions1.CombinationContext import build_combination_context
+from tool_functions1.MoleculePlot import plot_combination_market_breakdown_plotly, generate_growth_by_column_card
+from tool_functions1.MarketShare import plot_manufacturer_market_share
+from tool_functions1.Erosion import plot_market_erosion
+from tool_functions1.MoleculeATC4 import plotly_combinations_within_atc4_go
+
+
+def load_frame(country=DEFAULT_COUNTRY, release=None, log=print):
+    version, _ = registry.refresh()
+    if partitioning_enabled():
+        partitions = PartitionedStore()
+        catalog = partitions.ensure(master_sources(), version)
+        country, release = default_partition(catalog, country, release)
+        log(f"partitioned master: {country} {release}")
+        return freeze_frame(partitions.scan(catalog, country, release)), None, version
+    store = ArrowStore() if arrow_available() else None
+    cache = DiskCache()
+    df = load_master(store, version, lambda: cached_call(cache, version, read_master_data))
+    return freeze_frame(df), store, version
+
+
+def hot_calls(df, combo):
+    """
+    (tool, fn, args, kwargs) for the aggregations routed through the query engine.
+    """
+    ctx = build_combination_context(df, combo)
+    calls = [
+        ("breakdown", plot_combination_market_breakdown_plotly, (df,), dict(
+            selected_molecule=combo, use_market_filter=True, market_type="PRIVATE MARKET",
+            use_value=False, group_by_column="Manufacturer", context=ctx
+        )),
+        ("growth_card", generate_growth_by_column_card, (df,), dict(combo=combo, group_col="NFC3", context=ctx)),
+        ("market_share", plot_manufacturer_market_share, (df, combo), dict(context=ctx)),
+        ("erosion", plot_market_erosion, (df, combo), dict(context=ctx)),
+    ]
+    if ctx.atc["ATC4"] is not None:
+        calls.append(("atc4_breakdown", plotly_combinations_within_atc4_go, (df,), dict(atc4_name=ctx.atc["ATC4"], UseValue=False)))
+    return calls
+
+
+def timed(fn, args, kwargs, repeat):
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds.append(time.perf_counter() - t0)
+    return result, seconds
+
+
+def compare_engines(top_n=20, engines=None, repeat=3, country=DEFAULT_COUNTRY, release=None, log=print):
+    engines = engines or available_engines()
+    df, store, version = load_frame(country, release, log)
+    combos = top_combinations(load_master_aggregates(store, version, df), top_n)
+    log(f"{len(df):,} master rows, {len(combos)} combinations, engines: {', '.join(engines)}")
+
+    samples = []
+    for rank, combo in enumerate(combos, 1):
+        for tool, fn, args, kwargs in hot_calls(df, combo):
+            reference = None
+            for name in ["pandas"] + [e for e in engines if e != "pandas"]:
+                # the tools print their tables too; keep them out of the report
+                with use_engine(name), open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    try:
+                        result, seconds = timed(fn, args, kwargs, repeat)
+                        error = None
+                    except Exception as e:
+                        result, seconds, error = None, [np.nan], f"{type(e).__name__}: {e}"
+                if name == "pandas":
+                    reference = result
+                match = error is None and results_match(reference, result)
+                samples.append({"combo": combo, "tool": tool, "engine": name, "seconds": float(np.median(seconds)),
+                                "match": match, "error": error})
+                if not match:
+                    log(f"  ! {tool} on {name} differs from pandas for {combo}{f': {error}' if error else ''}")
+        log(f"[{rank}/{len(combos)}] {combo}")
+    return samples, summarize(samples)
+
+
+def summarize(samples):
+    frame = pd.DataFrame(samples)
+    frame["ms"] = frame["seconds"] * 1000
+    summary = frame.groupby(["tool", "engine"], sort=False).agg(
+        calls=("ms", "size"), median_ms=("ms", "median"), total_ms=("ms", "sum"),
+        mismatches=("match", lambda m: int((~m).sum())),
+    ).reset_index()
+    pandas_ms = summary[summary["engine"] == "pandas"].set_index("tool")["median_ms"]
+    summary["speedup"] = summary["tool"].map(pandas_ms) / summary["median_ms"]
+    return summary.round(2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and result comparison of the PharmAI query engines.")
+    parser.add_argument("--top", type=int, default=20, help="number of combinations (by 2024 value)")
+    parser.add_argument("--engine", action="append", help="engine to compare with pandas (repeatable; default: all installed)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per call; the median is reported")
+    parser.add_argument("--country", default=DEFAULT_COUNTRY, help="country when the master is partitioned")
+    parser.add_argument("--release", default=None, help="data release (default: the country's latest)")
+    parser.add_argument("--out", default=None, help="write raw samples and the summary as JSON")
+    opts = parser.parse_args()
+
+    samples, summary = compare_engines(opts.top, opts.engine, opts.repeat, opts.country, opts.release)
+    print(summary.to_string(index=False))
+    if opts.out:
+        with open(opts.out, "w") as f:
+            json.dump({"top": opts.top, "repeat": opts.repeat,
+                       "summary": summary.to_dict("records"), "samples": samples}, f, indent=1)
+    sys.exit(1 if summary["mismatches"].sum() else 0)
@@ -0,0 +1,252 @@
+"""
+Headless load test: N concurrent analyst sessions driving PharmAI2.py.
+
+    python loadtest.py --sessions 20 --rounds 2 --out loadtest.json
+
+Every session is a Streamlit AppTest in its own process: AppTest keeps
+global runtime state, so two of them cannot run in one process at once. The
+processes share the disk cache and the memory-mapped Arrow store, like
+several app workers on one box. Each session picks a molecule, opens every
+tab in order and performs the usual clicks there (radios, screener sort,
+forecast run, scenario grid, batch forecast with empirical uptake). Reports
+p50/p95/p99 rerun latency per tab and the peak session-process RSS seen
+while that tab was being served.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PharmAI2.py")
+RSS_INTERVAL = 0.05
+
+
+# ─── 1/ Process memory ──────────────────────────────────────────────────────────
+def current_rss_mb():
+    """
+    Resident set size of this process in MB (psutil when installed, else
+    /proc, else the peak from getrusage).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+class RssSampler(threading.Thread):
+    """
+    Samples RSS in the background and records, per tab, the highest value
+    seen while a step of that tab was running.
+    """
+
+    def __init__(self, interval=RSS_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.active = {}                 # session id -> tab label
+        self.peaks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def enter(self, session, tab):
+        with self._lock:
+            self.active[session] = tab
+        self._record(current_rss_mb())
+
+    def leave(self, session):
+        self._record(current_rss_mb())
+        with self._lock:
+            self.active.pop(session, None)
+
+    def _record(self, rss):
+        with self._lock:
+            for tab in set(self.active.values()):
+                self.peaks[tab] = max(self.peaks.get(tab, 0.0), rss)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self._record(current_rss_mb())
+
+    def stop(self):
+        self._stop.set()
+
+
+# ─── 2/ Click paths ─────────────────────────────────────────────────────────────
+def set_radio(key, index):
+    def act(at):
+        widget = at.radio(key=key)
+        widget.set_value(widget.options[min(index, len(widget.options) - 1)]).run()
+    return act
+
+
+def set_selectbox(key, index):
+    def act(at):
+        widget = at.selectbox(key=key)
+        widget.set_value(widget.options[min(index, len(widget.options) - 1)]).run()
+    return act
+
+
+def pick_batch_pairs(n):
+    def act(at):
+        widget = at.multiselect(key="batch_pairs")
+        widget.set_value(widget.options[:n]).run()
+    return act
+
+
+# Clicks made after opening a tab, matched on the tab label
+TAB_ACTIONS = {
+    "Exec Summary": [("fitted trend", set_radio("exec_projection", 1))],
+    "Graph + Table": [("total market", set_radio("plot_market", 1)), ("by value", set_radio("plot_metric", 1))],
+    "Opportunity Screener": [("sort by CAGR", set_selectbox("screen_sort", 2))],
+    "Erosion": [("5+ incumbents", set_radio("uptake_bucket", 3)), ("all classes", set_radio("uptake_scope", 1))],
+    "Forecast": [
+        ("run forecast", lambda at: at.button(key="run_forecast").click().run()),
+        ("scenario grid", set_radio("forecast_mode", 1)),
+    ],
+    "tab batch": [("pick pairs", pick_batch_pairs(3)), ("empirical uptake", set_radio("batch_penetration", 1))],
+}
+
+
+def click_path(at, molecule, labels):
+    """
+    (tab, action, callable) steps for one round of one session.
+    """
+    yield labels[0], "search molecule", lambda at: at.text_input(key="combo_query").input(molecule).run()
+    for label in labels:
+        def open_tab(at, label=label):
+            at.session_state["main_tabs"] = label
+            at.run()
+        yield label, "open", open_tab
+        for match, actions in TAB_ACTIONS.items():
+            if match in label:
+                for name, act in actions:
+                    yield label, name, act
+
+
+# ─── 3/ Sessions ────────────────────────────────────────────────────────────────
+def drive_session(session, rounds, molecules, sampler, timeout, rng):
+    samples = []
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    t0 = time.perf_counter()
+    sampler.enter(session, "startup")
+    at.run()
+    sampler.leave(session)
+    samples.append({"session": session, "tab": "startup", "action": "load", "seconds": time.perf_counter() - t0,
+                    "error": "; ".join(e.value for e in at.exception) or None})
+    labels = [tab.label for tab in at.tabs]
+
+    for _ in range(rounds):
+        molecule = rng.choice(molecules)
+        for tab, action, step in click_path(at, molecule, labels):
+            sampler.enter(session, tab)
+            t0 = time.perf_counter()
+            try:
+                step(at)
+                error = "; ".join(e.value for e in at.exception) or None
+            except Exception as e:  # widget missing, timeout, ...
+                error = f"{type(e).__name__}: {e}"
+            samples.append({"session": session, "tab": tab, "action": action,
+                            "seconds": time.perf_counter() - t0, "error": error})
+            sampler.leave(session)
+    return samples
+
+
+def run_session(session, rounds, molecules, timeout, seed):
+    """
+    Runs in a worker process; returns (samples, peak RSS per tab).
+    """
+    sampler = RssSampler()
+    sampler.start()
+    # the app prints its tables too; keep them out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        samples = drive_session(session, rounds, molecules, sampler, timeout, random.Random(seed + session))
+    sampler.stop()
+    return samples, sampler.peaks
+
+
+def summarize(samples, peaks):
+    frame = pd.DataFrame(samples)
+    rows = []
+    for tab, group in frame.groupby("tab", sort=False):
+        seconds = group["seconds"].to_numpy() * 1000
+        rows.append({
+            "Tab": tab,
+            "Steps": len(group),
+            "Errors": int(group["error"].notna().sum()),
+            "p50 (ms)": np.percentile(seconds, 50),
+            "p95 (ms)": np.percentile(seconds, 95),
+            "p99 (ms)": np.percentile(seconds, 99),
+            "Max (ms)": seconds.max(),
+            "Peak RSS (MB)": peaks.get(tab, np.nan),
+        })
+    return pd.DataFrame(rows).round(1)
+
+
+def warm_up(timeout):
+    """
+    One session before the measured ones: fills the disk cache and the Arrow
+    store every session process reads. Returns the molecule choices.
+    """
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        at.run()
+    return list(at.selectbox[0].options), current_rss_mb()
+
+
+def load_test(sessions=20, rounds=1, molecules=None, timeout=300, seed=0, log=print):
+    # AppTest runs the script as __main__, so even the warm-up stays out of this process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        options, rss = pool.submit(warm_up, timeout).result()
+    molecules = molecules or options
+    log(f"{sessions} sessions × {rounds} round(s) over {len(molecules)} molecules, warm session RSS {rss:.0f} MB")
+
+    t0 = time.perf_counter()
+    samples, peaks = [], {}
+    with ProcessPoolExecutor(max_workers=sessions, mp_context=context) as pool:
+        futures = [pool.submit(run_session, s, rounds, molecules, timeout, seed) for s in range(sessions)]
+        for future in futures:
+            session_samples, session_peaks = future.result()
+            samples.extend(session_samples)
+            for tab, rss in session_peaks.items():
+                peaks[tab] = max(peaks.get(tab, 0.0), rss)
+
+    wall = time.perf_counter() - t0
+    log(f"{len(samples)} steps in {wall:.1f}s, peak session RSS {max(peaks.values()):.0f} MB")
+    return samples, summarize(samples, peaks), wall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for PharmAI2.py.")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=1, help="click-path rounds per session")
+    parser.add_argument("--molecule", action="append", help="molecule to use (repeatable; default: top sellers)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per rerun")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write raw samples and the summary as JSON")
+    opts = parser.parse_args()
+
+    samples, summary, wall = load_test(opts.sessions, opts.rounds, opts.molecule, opts.timeout, opts.seed)
+    print(summary.to_string(index=False))
+    if opts.out:
+        with open(opts.out, "w") as f:
+            json.dump({"sessions": opts.sessions, "rounds": opts.rounds, "wall_seconds": wall,
+                       "summary": summary.to_dict("records"), "samples": samples}, f, indent=1)
+    sys.exit(1 if summary["Errors"].sum() else 0)
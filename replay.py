@@ -0,0 +1,253 @@
+"""
+Re-runs logged slow tool calls under cProfile.
+
+    python replay.py                                   every call in .cache/slow_calls.jsonl
+    python replay.py --fn plot_market_erosion --last 3
+    python replay.py --combo METFORMIN --dump profiles/  also writes .prof files (snakeviz, pstats)
+    python replay.py --list                            show what was logged, run nothing
+
+The app writes one line per tool call slower than PHARMAI_SLOW_SECONDS (see
+`tool_functions1.SlowLog`). Each call is rebuilt from its line: sources are
+loaded for the current dataset version (a warning is printed when the call
+was logged against another one), derived objects (combination context, ATC
+hierarchy, trend fits) are rebuilt from the master, and the function itself
+runs bypassing every cache, so the profile shows the real computation.
+"""
+import argparse
+import cProfile
+import importlib
+import inspect
+import io
+import logging
+import os
+import pstats
+import sys
+import time
+
+from tool_functions1.DataLoader import read_master_data, read_mohap_data, read_orange_book
+from tool_functions1.DataRegistry import registry
+from tool_functions1.DiskCache import DiskCache, cached_call, scoped_version
+from tool_functions1.SharedFrame import freeze_frame, freeze_frames
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, load_mapped
+from tool_functions1.MasterIngest import load_master
+from tool_functions1.PartitionStore import PartitionedStore, master_sources, partitioning_enabled
+from tool_functions1.SlowLog import DEFAULT_SLOW_LOG_PATH, decode_arg, read_slow_log
+from tool_functions1.AtcHierarchy import build_atc_hierarchy
+from tool_functions1.CombinationContext import build_combination_context
+from tool_functions1.OrangeBook import build_product_regulatory_table
+from tool_functions1.TrendForecast import build_trend_forecasts
+from tool_functions1.UptakeCurves import build_uptake_library
+from tool_functions1.FigureBudget import FigureBudget
+
+
+# ─── 1/ Rebuilding arguments ────────────────────────────────────────────────────
+class ReplaySources:
+    """
+    Sources and derived objects for the current dataset version, loaded the
+    way the app loads them (memory-mapped, frozen) and built on first use.
+    With a partitioned master, `partition` ("COUNTRY:RELEASE", from the
+    record) picks the country and release the call was made on.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or DiskCache()
+        self.store = ArrowStore() if arrow_available() else None
+        self.partitions = PartitionedStore() if partitioning_enabled() else None
+        self.version = registry.version()
+        self.partition = None
+        self._frames = {}
+
+    def _cached(self, fn, *args, **kwargs):
+        return cached_call(self.cache, scoped_version(self.version, self.partition), fn, *args, **kwargs)
+
+    def _cached_source(self, fn, *args, **kwargs):
+        # MOHAP and the Orange Book do not depend on the partition
+        return cached_call(self.cache, self.version, fn, *args, **kwargs)
+
+    def frame(self, name, partition=None):
+        if name not in ("master", "uptake_library"):
+            return self._source_frame(name)
+        key = (name, partition or self.partition)
+        if key not in self._frames:
+            self._frames[key] = self._master_frame(*key)
+        return self._frames[key]
+
+    def _master_frame(self, name, partition):
+        if name == "uptake_library":
+            return freeze_frame(self._cached(build_uptake_library, self.frame("master", partition)))
+        if partition and self.partitions is not None:
+            country, release = partition.split(":", 1)
+            catalog = self.partitions.ensure(master_sources(), self.version)
+            return freeze_frame(self.partitions.scan(catalog, country, release))
+        return freeze_frame(load_master(self.store, self.version, lambda: self._cached(read_master_data)))
+
+    def _source_frame(self, name):
+        if name not in self._frames:
+            if name == "mohap":
+                self._frames[name] = freeze_frame(load_mapped(
+                    self.store, "mohap", self.version, lambda: self._cached_source(read_mohap_data)
+                ))
+            elif name in ("ob_products", "ob_patents", "ob_exclusivity"):
+                names = ("ob_products", "ob_patents", "ob_exclusivity")
+                frames = freeze_frames(load_mapped(
+                    self.store, names, self.version, lambda: self._cached_source(read_orange_book)
+                ))
+                self._frames.update(zip(names, frames))
+            elif name == "ob_product_table":
+                self._frames[name] = freeze_frame(self._cached_source(
+                    build_product_regulatory_table, self.frame("ob_patents"), self.frame("ob_exclusivity")
+                ))
+            else:
+                raise ValueError(f"unknown source frame: {name}")
+        return self._frames[name]
+
+    def obj(self, kind, token):
+        master = self.frame("master")
+        if kind == "CombinationContext":
+            return build_combination_context(master, token["combination"])
+        if kind == "AtcHierarchy":
+            return self._cached(build_atc_hierarchy, master, end_year=token["atc_hierarchy"])
+        if kind == "TrendForecasts":
+            return self._cached(
+                build_trend_forecasts, master, by=token["trend_forecasts"], history=token["history"],
+                horizon=token["horizon"], damping=token["damping"], level=token["level"]
+            )
+        if kind == "FigureBudget":
+            return FigureBudget(**token)
+        raise ValueError(f"cannot rebuild a {kind}")
+
+    def resolve(self, kind, name, token):
+        return self.frame(name, token) if kind == "frame" else self.obj(name, token)
+
+
+def check_shapes(encoded, decoded):
+    """
+    A logged source with another shape than the current one was logged
+    against a different dataset; replaying it would profile a different call.
+    """
+    if isinstance(encoded, dict) and "$frame" in encoded and list(decoded.shape) != encoded["shape"]:
+        raise ValueError(
+            f"logged {encoded['$frame']} argument had shape {tuple(encoded['shape'])}, "
+            f"the current source has {decoded.shape}"
+        )
+
+
+def resolve_function(spec):
+    """
+    The undecorated function for "module:qualname" (no metrics, no cache).
+    """
+    module_name, qualname = spec.split(":")
+    obj = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    return inspect.unwrap(obj)
+
+
+def rebuild_call(record, sources):
+    fn = resolve_function(record["fn"])
+    args, kwargs = [], {}
+    for encoded in record["args"]:
+        value = decode_arg(encoded, sources.resolve)
+        check_shapes(encoded, value)
+        args.append(value)
+    for key, encoded in record["kwargs"].items():
+        value = decode_arg(encoded, sources.resolve)
+        check_shapes(encoded, value)
+        kwargs[key] = value
+    return fn, args, kwargs
+
+
+# ─── 2/ Selecting and profiling ─────────────────────────────────────────────────
+def select(records, fn=None, combo=None, last=None):
+    calls = [r for r in records if r.get("kind") == "call"]
+    if fn:
+        calls = [r for r in calls if fn in r["fn"]]
+    if combo:
+        combo = combo.strip().upper()
+        calls = [r for r in calls if r.get("context", {}).get("combo") == combo or combo in str(r["args"]) + str(r["kwargs"])]
+    return calls[-last:] if last else calls
+
+
+def describe(record):
+    ctx = record.get("context", {})
+    where = f"tab={ctx['tab']!r} combo={ctx['combo']!r}" if "tab" in ctx else "outside a tab"
+    status = f" raised {record['error']}" if record.get("error") else ""
+    return f"{record['time']} {record['fn']} {record['seconds']:.2f}s ({where}, version {record['version']}){status}"
+
+
+def profile_call(fn, args, kwargs, sort="cumulative", top=25, dump=None):
+    """
+    Runs one call under cProfile; returns (seconds, error, stats text).
+    """
+    profiler = cProfile.Profile()
+    error = None
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        profiler.disable()
+    seconds = time.perf_counter() - t0
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(top)
+    if dump:
+        profiler.dump_stats(dump)
+    return seconds, error, out.getvalue()
+
+
+def replay(path=DEFAULT_SLOW_LOG_PATH, fn=None, combo=None, last=None, sort="cumulative", top=25, dump_dir=None, log=print):
+    # Rendering tools (st.dataframe, ...) run in bare mode here; skip their per-call warnings
+    logging.disable(logging.WARNING)
+    calls = select(read_slow_log(path), fn, combo, last)
+    if not calls:
+        log("no matching calls in the log")
+        return 0
+    sources = ReplaySources()
+    if dump_dir:
+        os.makedirs(dump_dir, exist_ok=True)
+
+    failures = 0
+    for i, record in enumerate(calls, 1):
+        log(f"\n[{i}/{len(calls)}] {describe(record)}")
+        sources.partition = record.get("context", {}).get("partition")
+        if record["version"] != sources.version:
+            log(f"  ! logged against dataset {record['version']}, replaying on {sources.version}")
+        try:
+            call, args, kwargs = rebuild_call(record, sources)
+        except (ValueError, KeyError, AttributeError, ImportError) as e:
+            failures += 1
+            log(f"  ! cannot rebuild: {e}")
+            continue
+        dump = os.path.join(dump_dir, f"{i:03d}-{call.__name__}.prof") if dump_dir else None
+        seconds, error, stats = profile_call(call, args, kwargs, sort, top, dump)
+        log(f"  replayed in {seconds:.2f}s (logged {record['seconds']:.2f}s)" + (f", raised {error}" if error else ""))
+        log(stats)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay slow tool calls under the profiler.")
+    parser.add_argument("log", nargs="?", default=DEFAULT_SLOW_LOG_PATH, help="slow-call log (JSON lines)")
+    parser.add_argument("--fn", default=None, help="only calls whose function name contains this")
+    parser.add_argument("--combo", default=None, help="only calls for this combination")
+    parser.add_argument("--last", type=int, default=None, help="only the N most recent matching calls")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, ncalls, ...)")
+    parser.add_argument("--top", type=int, default=25, help="profile rows to print per call")
+    parser.add_argument("--dump", default=None, help="directory for .prof files, one per call")
+    parser.add_argument("--list", action="store_true", help="list logged calls and slow reruns without running them")
+    opts = parser.parse_args()
+
+    if opts.list:
+        records = read_slow_log(opts.log)
+        calls = select(records, opts.fn, opts.combo, opts.last)
+        for record in calls:
+            print(describe(record))
+        for record in records:
+            if record.get("kind") == "rerun":
+                ctx = record.get("context", {})
+                print(f"{record['time']} rerun {record['seconds']:.2f}s tab={ctx.get('tab')!r} combo={ctx.get('combo')!r}")
+        sys.exit(0)
+    sys.exit(1 if replay(opts.log, opts.fn, opts.combo, opts.last, opts.sort, opts.top, opts.dump) else 0)
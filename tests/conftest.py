@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+YEARS = range(2020, 2026)
+
+
+def _write_master(path, rows=60, seed=0):
+    records = []
+    for i in range(rows):
+        atc1 = "ABC"[(i + seed) % 3]
+        record = {
+            "Molecule": ["METFORMIN", "AMLODIPINE", "OMEPRAZOLE", "ROSUVASTATIN"][i % 4],
+            "Product": f"PROD{i % 9}", "Manufacturer": f"MANU {i % 5}",
+            "Market": "PRIVATE MARKET" if i % 2 else "LPO",
+            "ATC1": atc1, "ATC2": f"{atc1}01", "ATC3": f"{atc1}01X", "ATC4": f"{atc1}01X{i % 2}",
+            "NFC3": "ORAL SOLID", "Strength": f"{5 * (i % 3 + 1)}MG", "Pack": f"PACK {i % 4}",
+            "Retail Price": 10.5 + i, "Launch Year": 2010 + i % 10,
+        }
+        for year in YEARS:
+            record[f"{year} Units"] = 100 * i + year
+            record[f"{year} LC Value"] = 1000 * i + year
+        record["Molecule Combination Type"] = "MONO"
+        records.append(record)
+    pd.DataFrame(records).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def write_master():
+    """
+    Writes a small synthetic master CSV in the MasterData2025.csv layout:
+    `write_master(path, rows=60, seed=0)` → path.
+    """
+    return _write_master
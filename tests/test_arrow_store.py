@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+import pytest
+
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, load_mapped
+
+pytestmark = pytest.mark.skipif(not arrow_available(), reason="pyarrow not installed")
+
+
+def test_code_change_rebuilds_mapped_files(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return pd.DataFrame({"2024 Units": [1.0, 2.0]})
+
+    old, new = ArrowStore(str(tmp_path), code="old"), ArrowStore(str(tmp_path), code="new")
+    load_mapped(old, "mohap", "v1", build)
+    load_mapped(old, "mohap", "v1", build)
+    assert len(builds) == 1
+
+    assert new.open("mohap", "v1") is None
+    load_mapped(new, "mohap", "v1", build)
+    assert len(builds) == 2
+    assert os.listdir(tmp_path) == [os.path.basename(new.path("mohap", "v1"))]
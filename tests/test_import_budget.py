@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+# Seconds for importing tool_functions1 and resolving one tool, pandas and numpy already loaded
+IMPORT_BUDGET = float(os.environ.get("PHARMAI_IMPORT_BUDGET", "1.0"))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+import numpy, pandas
+t0 = time.perf_counter()
+import tool_functions1
+tool_functions1.generate_exec_summary_data
+print(json.dumps({
+    "seconds": time.perf_counter() - t0,
+    "plotly": sorted(m for m in sys.modules if m == "plotly" or m.startswith("plotly.")),
+    "modules": tool_functions1.loaded_modules(),
+}))
+"""
+
+
+def _probe():
+    # a fresh interpreter: this process may already have imported plotly or the tools
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_exec_summary_does_not_import_plotly():
+    result = _probe()
+    assert result["plotly"] == []
+    assert result["modules"] == ["AtcHierarchy", "Metrics", "SummaryGen"]
+
+
+def test_import_stays_within_budget():
+    assert _probe()["seconds"] < IMPORT_BUDGET
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, pa, table_to_frame
+from tool_functions1.DataLoader import read_master_data
+from tool_functions1.MasterIngest import load_master
+from tool_functions1.SharedFrame import freeze_frame
+
+pytestmark = pytest.mark.skipif(not arrow_available(), reason="pyarrow not installed")
+
+
+def test_chunked_ingest_matches_read_master_data(tmp_path, write_master):
+    path = write_master(tmp_path / "master.csv", rows=50)
+    store = ArrowStore(str(tmp_path / "arrow"))
+    master = load_master(store, "v1", build=None, path=path, chunk_rows=7, min_bytes=0)
+    pd.testing.assert_frame_equal(master, read_master_data(path), check_dtype=False)
+
+
+def test_chunked_ingest_maps_numeric_columns_without_a_copy(tmp_path, write_master):
+    path = write_master(tmp_path / "master.csv", rows=50)
+    store = ArrowStore(str(tmp_path / "arrow"))
+    load_master(store, "v1", build=None, path=path, chunk_rows=7, min_bytes=0)
+
+    table = pa.ipc.open_file(pa.memory_map(store.path("master", "v1"), "r")).read_all()
+    assert all(table.column(c).num_chunks == 1 for c in table.column_names)
+    frozen = freeze_frame(table_to_frame(table))
+    for column in ("2024 Units", "2024 LC Value", "Retail Price"):
+        chunk = table.column(column).chunk(0)
+        mapped = np.frombuffer(chunk.buffers()[1], dtype=chunk.type.to_pandas_dtype())
+        assert np.shares_memory(frozen[column].to_numpy(), mapped)
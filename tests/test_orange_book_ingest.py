@@ -0,0 +1,105 @@
+import pandas as pd
+
+from tool_functions1.OrangeBook import build_product_regulatory_table
+from tool_functions1.OrangeBookIngest import (
+    RECORD_KEYS, apply_diff, diff_table, ingest_release, patch_product_table, read_store, touched_products
+)
+
+PRODUCTS = pd.DataFrame({
+    "Ingredient": ["METFORMIN", "AMLODIPINE", "OMEPRAZOLE"],
+    "Appl_Type": ["N", "N", "N"], "Appl_No": ["020610", "018613", "019810"], "Product_No": ["001", "001", "002"],
+    "Trade_Name": ["GLUCO", "NORVA", "PRILO"],
+})
+
+OLD_PATENTS = pd.DataFrame({
+    "Appl_Type": ["N"] * 5,
+    "Appl_No": ["020610", "020610", "018613", "019810", "019810"],
+    "Product_No": ["001", "001", "001", "002", "002"],
+    "Patent_No": ["7625884", "8000001", "7560445", "9000001", "9000001"],
+    "Patent_Expire_Date_Text": ["Aug 24, 2026", "Jan 1, 2028", "Feb 1, 2027", "Mar 3, 2029", "Mar 3, 2029"],
+    "Patent_Use_Code": ["U-141", "", "U-986", "", ""],
+    "Delist_Flag": ["", "", "", "", ""],
+})
+
+# 8000001 dropped, 7560445 extended, 9100001 new; 9100001 is listed twice (the last one wins)
+NEW_PATENTS = pd.DataFrame({
+    "Appl_Type": ["N"] * 5,
+    "Appl_No": ["020610", "018613", "019810", "019810", "019810"],
+    "Product_No": ["001", "001", "002", "002", "002"],
+    "Patent_No": ["7625884", "7560445", "9000001", "9100001", "9100001"],
+    "Patent_Expire_Date_Text": ["Aug 24, 2026", "Feb 1, 2030", "Mar 3, 2029", "Apr 4, 2031", "May 5, 2032"],
+    "Patent_Use_Code": ["U-141", "U-986", "", "U-2", "U-2"],
+    "Delist_Flag": ["", "", "", "", "Y"],
+})
+
+OLD_EXCLUSIVITY = pd.DataFrame({
+    "Appl_Type": ["N", "N"], "Appl_No": ["020610", "018613"], "Product_No": ["001", "001"],
+    "Exclusivity_Code": ["RTO", "D-193"], "Exclusivity_Date": ["Jul 13, 2026", "Jun 28, 2027"],
+})
+
+# 018613 loses its exclusivity, 019810 gets one
+NEW_EXCLUSIVITY = pd.DataFrame({
+    "Appl_Type": ["N", "N"], "Appl_No": ["020610", "019810"], "Product_No": ["001", "002"],
+    "Exclusivity_Code": ["RTO", "NCE"], "Exclusivity_Date": ["Jul 13, 2026", "Sep 9, 2030"],
+})
+
+
+def _keyed(df, keys):
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def _write_release(path, products, patents, exclusivity):
+    path.mkdir()
+    for frame, filename in [(products, "products.txt"), (patents, "patent.txt"), (exclusivity, "exclusivity.txt")]:
+        frame.to_csv(path / filename, sep="~", index=False)
+    return str(path)
+
+
+def _store_paths(path):
+    return {name: str(path / f"OB{name}.csv") for name in RECORD_KEYS}
+
+
+def _read_stored(paths):
+    # as read_orange_book reads them
+    return pd.read_csv(paths["patents"]), pd.read_csv(paths["exclusivity"])
+
+
+def test_diff_table_splits_added_removed_and_changed():
+    keys = RECORD_KEYS["patents"]
+    old = OLD_PATENTS.fillna("")
+    diff = diff_table(old, NEW_PATENTS, keys)
+
+    assert diff["added"][["Patent_No", "Patent_Expire_Date_Text"]].values.tolist() == [["9100001", "May 5, 2032"]]
+    assert diff["removed"]["Patent_No"].tolist() == ["8000001"]
+    assert diff["changed"][["Patent_No", "Patent_Expire_Date_Text"]].values.tolist() == [["7560445", "Feb 1, 2030"]]
+    assert set(diff["removed"].columns) == set(old.columns)
+
+    updated = apply_diff(old, diff, keys)
+    expected = NEW_PATENTS.drop_duplicates(subset=keys, keep="last")
+    pd.testing.assert_frame_equal(_keyed(updated, keys), _keyed(expected, keys))
+
+
+def test_diff_against_a_store_with_no_file_adds_everything(tmp_path):
+    store = read_store(_store_paths(tmp_path))
+    keys = RECORD_KEYS["exclusivity"]
+    diff = diff_table(store["exclusivity"], NEW_EXCLUSIVITY, keys)
+
+    assert len(diff["added"]) == len(NEW_EXCLUSIVITY)
+    assert diff["removed"].empty and diff["changed"].empty
+    pd.testing.assert_frame_equal(
+        _keyed(apply_diff(store["exclusivity"], diff, keys), keys), _keyed(NEW_EXCLUSIVITY, keys)
+    )
+
+
+def test_patched_product_table_matches_a_full_rebuild(tmp_path):
+    paths = _store_paths(tmp_path)
+    _write_release(tmp_path / "previous", PRODUCTS, OLD_PATENTS, OLD_EXCLUSIVITY)
+    ingest_release(str(tmp_path / "previous"), store_paths=paths, log=lambda *_: None)
+    previous = build_product_regulatory_table(*_read_stored(paths))
+
+    release = _write_release(tmp_path / "release", PRODUCTS, NEW_PATENTS, NEW_EXCLUSIVITY)
+    diffs = ingest_release(release, store_paths=paths, log=lambda *_: None)
+    patents, exclusivity = _read_stored(paths)
+
+    patched = patch_product_table(previous, patents, exclusivity, touched_products(diffs))
+    pd.testing.assert_frame_equal(patched, build_product_regulatory_table(patents, exclusivity))
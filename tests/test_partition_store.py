@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from tool_functions1.DataLoader import read_master_data
+from tool_functions1.PartitionStore import MasterSource, PartitionedStore, partitioning_enabled
+
+pytestmark = pytest.mark.skipif(not partitioning_enabled("UAE:2025=x"), reason="pyarrow.dataset not installed")
+
+
+@pytest.fixture
+def sources(tmp_path, write_master):
+    return [
+        MasterSource("UAE", "2025", write_master(tmp_path / "uae.csv")),
+        MasterSource("KSA", "2025", write_master(tmp_path / "ksa.csv", rows=45, seed=1)),
+    ]
+
+
+@pytest.mark.parametrize("by_atc1", [True, False])
+def test_atc1_scan_matches_with_and_without_atc1_partitions(tmp_path, sources, by_atc1):
+    store = PartitionedStore(str(tmp_path / f"parts-{by_atc1}"), by_atc1=by_atc1)
+    catalog = store.ensure(sources, "v1", chunk_rows=16)
+
+    expected = read_master_data(sources[0].path)
+    expected = expected[expected["ATC1"] == "B"].reset_index(drop=True)
+    scanned = store.scan(catalog, "UAE", "2025", atc1="B")
+
+    assert len(scanned) == len(expected) > 0
+    pd.testing.assert_frame_equal(scanned, expected, check_dtype=False)
+
+
+def test_unsplit_partitions_are_kept_for_any_atc1(tmp_path, sources):
+    catalog = PartitionedStore(str(tmp_path / "parts"), by_atc1=False).ensure(sources, "v1", chunk_rows=16)
+    assert [p["atc1"] for p in catalog.select("UAE", "2025", atc1=["B"])] == [None]
+
+
+def test_code_change_rebuilds_the_store(tmp_path, sources):
+    root = str(tmp_path / "parts")
+    old = PartitionedStore(root, code="old")
+    old.ensure(sources, "v1", chunk_rows=16)
+
+    new = PartitionedStore(root, code="new")
+    assert new.catalog("v1") is None
+    new.ensure(sources, "v1", chunk_rows=16)
+    assert old.catalog("v1") is None and new.catalog("v1") is not None
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, pa, table_to_frame
+from tool_functions1.SharedFrame import freeze_frame
+
+pytestmark = pytest.mark.skipif(not arrow_available(), reason="pyarrow not installed")
+
+
+def _mapped_table(tmp_path):
+    df = pd.DataFrame({
+        "2024 Units": np.arange(100, dtype="float64"),
+        "2024 LC Value": np.linspace(0, 1, 100),
+        "Rank": np.arange(100, dtype="int64"),
+        "Manufacturer": [f"M{i % 7}" for i in range(100)],
+    })
+    df.attrs["dataset"] = "master"
+    path = ArrowStore(str(tmp_path)).write("master", "v1", df)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _arrow_values(table, column):
+    chunk = table.column(column).chunk(0)
+    return np.frombuffer(chunk.buffers()[1], dtype=chunk.type.to_pandas_dtype())
+
+
+def test_frozen_mapped_columns_share_the_arrow_buffers(tmp_path):
+    table = _mapped_table(tmp_path)
+    frozen = freeze_frame(table_to_frame(table))
+
+    for column in ("2024 Units", "2024 LC Value", "Rank"):
+        assert np.shares_memory(frozen[column].to_numpy(), _arrow_values(table, column))
+
+    # pandas must not consolidate (copy) the blocks on later reads either
+    frozen.groupby("Manufacturer")[["2024 Units", "2024 LC Value"]].sum()
+    frozen.describe()
+    assert np.shares_memory(frozen["2024 Units"].to_numpy(), _arrow_values(table, "2024 Units"))
+
+
+def test_frozen_frame_is_read_only(tmp_path):
+    frozen = freeze_frame(table_to_frame(_mapped_table(tmp_path)))
+    with pytest.raises(ValueError):
+        frozen["2024 Units"] = 0
+    with pytest.raises(ValueError):
+        frozen["2024 Units"].to_numpy()[0] = 1.0
@@ -0,0 +1,148 @@
+import contextlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.DiskCache import code_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401  (registers pa.ipc)
+except ImportError:  # optional: without pyarrow every process reads the CSVs
+    pa = None
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "arrow")
+
+
+def arrow_available():
+    return pa is not None
+
+
+# ─── 1/ pandas ⇄ Arrow with zero-copy reads ─────────────────────────────────────
+def _to_arrow_column(series):
+    """
+    Numeric columns keep NaN as a value (no validity bitmap), so they map
+    back to numpy without a copy; text columns become Arrow strings.
+    """
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return pa.array(series.to_numpy(), from_pandas=False)
+    if series.map(lambda v: isinstance(v, (list, tuple, np.ndarray))).any():
+        return pa.array(series.map(lambda v: list(v) if isinstance(v, (list, tuple, np.ndarray)) else None), from_pandas=True)
+    return pa.array(series.map(lambda v: v if isinstance(v, str) else (None if pd.isna(v) else str(v))), type=pa.string())
+
+
+def frame_to_table(df):
+    columns = {str(c): _to_arrow_column(df[c]) for c in df.columns}
+    return pa.table(columns, metadata={b"dataset": str(df.attrs.get("dataset", "")).encode()})
+
+
+def table_to_frame(table):
+    """
+    Numeric columns stay views of the table's buffers (read-only numpy),
+    text columns become pyarrow-backed strings over the same buffers.
+    """
+    df = table.to_pandas(
+        split_blocks=True,
+        self_destruct=False,
+        types_mapper={pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}.get,
+    )
+    # list columns (e.g. Orange Book ingredient lists) come back as arrays
+    for col, field in zip(df.columns, table.schema):
+        if pa.types.is_list(field.type):
+            df[col] = df[col].map(lambda v: list(v) if v is not None else v)
+    dataset = (table.schema.metadata or {}).get(b"dataset", b"").decode()
+    if dataset:
+        df.attrs["dataset"] = dataset
+    return df
+
+
+# ─── 2/ Memory-mapped store ─────────────────────────────────────────────────────
+class ArrowStore:
+    """
+    Loaded source frames as uncompressed Arrow IPC files, one per source and
+    dataset version. Every worker process memory-maps the same file, so the
+    column data lives once in the OS page cache and opening it is a map, not a
+    parse. Files are written atomically (temp file + rename), so concurrent
+    workers never see a partial table. File names carry the code version
+    (`DiskCache.code_version`) as well as the dataset version, so a deploy
+    that changes the loaders or normalization rebuilds the files.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_PATH, code=None):
+        self.root = root
+        self.code = code or code_version(__name__)
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name, version):
+        return os.path.join(self.root, f"{name}-{version}-{self.code}.arrow")
+
+    def write(self, name, version, df):
+        path = self.path(name, version)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        table = frame_to_table(df)
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+
+    @contextlib.contextmanager
+    def writer(self, name, version, schema):
+        """
+        Streams record batches into `name` for `version` (`writer.write_table`
+        per chunk). The file only appears, atomically, once the block exits
+        without an error.
+        """
+        path = self.path(name, version)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                yield writer
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, path)
+
+    def open(self, name, version):
+        """
+        The stored frame, memory-mapped, or None when it has not been written.
+        """
+        path = self.path(name, version)
+        if not os.path.exists(path):
+            return None
+        source = pa.memory_map(path, "r")
+        return table_to_frame(pa.ipc.open_file(source).read_all())
+
+    def evict_stale(self, version):
+        """
+        Deletes files written for other dataset or code versions. Processes
+        that still map them keep their pages until they exit.
+        """
+        removed = 0
+        for entry in os.listdir(self.root):
+            if entry.endswith(".arrow") and not entry.endswith(f"-{version}-{self.code}.arrow"):
+                os.remove(os.path.join(self.root, entry))
+                removed += 1
+        return removed
+
+
+def load_mapped(store, names, version, build):
+    """
+    Memory-mapped frame(s) for `names` (one name, or a tuple of names when
+    `build()` returns a tuple of frames), built and stored on first use.
+    Without pyarrow (or a store) returns `build()` unchanged.
+    """
+    if store is None or not arrow_available():
+        return build()
+    single = isinstance(names, str)
+    names = (names,) if single else tuple(names)
+
+    frames = [store.open(name, version) for name in names]
+    if any(frame is None for frame in frames):
+        built = build()
+        for name, frame in zip(names, (built,) if single else built):
+            store.write(name, version, frame)
+        store.evict_stale(version)
+        frames = [store.open(name, version) for name in names]
+    return frames[0] if single else tuple(frames)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# ─── Levels, top to bottom ──────────────────────────────────────────────────────
+LEVELS = ["ATC1", "ATC2", "ATC3", "ATC4", "Molecule Combination"]
+CAGR_START_YEARS = ["2021", "2022", "2023"]
+
+
+def _year_columns(df):
+    years = sorted({c.split()[0] for c in df.columns if c.endswith(" Units") and c.split()[0].isdigit()})
+    return [f"{y} Units" for y in years] + [f"{y} LC Value" for y in years if f"{y} LC Value" in df.columns]
+
+
+def flexible_cagr(frame, kind, end_year="2024", start_years=CAGR_START_YEARS):
+    """
+    Vectorized CAGR (%) per row: from the first start year with a positive
+    total to `end_year`, 0 when there is none (same rule as the exec summary).
+    `kind` is "Units" or "LC Value".
+    """
+    suffix = f" {kind}"
+    end = frame[f"{end_year}{suffix}"].to_numpy(dtype=float)
+    out = np.zeros(len(frame))
+    done = np.zeros(len(frame), dtype=bool)
+    for y in start_years:
+        start = frame[f"{y}{suffix}"].to_numpy(dtype=float)
+        hit = ~done & (start > 0)
+        ok = hit & (end > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[ok] = ((end[ok] / start[ok]) ** (1 / (int(end_year) - int(y))) - 1) * 100
+        done |= hit
+    return pd.Series(out, index=frame.index)
+
+
+def _aggregate(df, keys, value_cols, end_year):
+    g = df.groupby(keys, sort=True)
+    nodes = g[value_cols].sum()
+    nodes["Units CAGR (%)"] = flexible_cagr(nodes, "Units", end_year)
+    nodes["Value CAGR (%)"] = flexible_cagr(nodes, "LC Value", end_year)
+    nodes["Combinations"] = g["Molecule Combination"].nunique()
+    nodes["Competitors"] = g["Manufacturer"].nunique()
+    return nodes
+
+
+# ─── Precomputed tree ───────────────────────────────────────────────────────────
+class AtcHierarchy:
+    """
+    ATC1 → ATC2 → ATC3 → ATC4 → combination rollups, built once per dataset.
+
+    `totals[level]` holds one row per code (yearly Units / LC Value, unit and
+    value CAGR, combination and manufacturer counts) for class-level lookups;
+    `tree[level]` holds the same metrics keyed by (parent code, code), so
+    expanding a node is a single index lookup over its children.
+    """
+    levels = LEVELS
+
+    def __init__(self, totals, tree, end_year):
+        self.totals = totals
+        self.tree = tree
+        self.end_year = end_year
+
+    def cache_token(self):
+        return {"atc_hierarchy": self.end_year, "nodes": [len(self.totals[lvl]) for lvl in LEVELS]}
+
+    def node(self, level, code):
+        """
+        Metrics row for one code at `level`, or None when it does not exist.
+        """
+        frame = self.totals[level]
+        if code not in frame.index:
+            return None
+        return frame.loc[code]
+
+    def children(self, level, code):
+        """
+        Child nodes of `code` (one row per child code at the next level).
+        """
+        child_level = LEVELS[LEVELS.index(level) + 1]
+        frame = self.tree[child_level]
+        try:
+            # Sorted MultiIndex: a binary search, then a slice of the children
+            return frame.loc[code]
+        except KeyError:
+            return frame.iloc[0:0].droplevel(0)
+
+    def roots(self):
+        return self.totals[LEVELS[0]]
+
+    def parents(self, level):
+        """
+        Series mapping each code at `level` to its parent code.
+        """
+        pairs = self.tree[level].index.to_frame(index=False).drop_duplicates(level)
+        return pairs.set_index(level)[LEVELS[LEVELS.index(level) - 1]]
+
+
+def build_atc_hierarchy(df, end_year="2024"):
+    """
+    One grouped pass per level over the master frame; every later lookup is
+    served from the result.
+    """
+    value_cols = _year_columns(df)
+    data = df[LEVELS + ["Manufacturer"] + value_cols].copy()
+    for col in value_cols:
+        data[col] = pd.to_numeric(data[col], errors="coerce").fillna(0)
+
+    totals, tree = {}, {}
+    for i, level in enumerate(LEVELS):
+        totals[level] = _aggregate(data, level, value_cols, end_year)
+        if i > 0:
+            tree[level] = _aggregate(data, [LEVELS[i - 1], level], value_cols, end_year)
+    return AtcHierarchy(totals, tree, end_year)
+
+
+def format_atc_nodes(nodes, end_year="2024"):
+    """
+    Display table for a set of nodes, biggest first.
+    """
+    cols = [f"{end_year} Units", f"{end_year} LC Value", "Units CAGR (%)", "Value CAGR (%)", "Combinations", "Competitors"]
+    table = nodes[cols].sort_values(f"{end_year} LC Value", ascending=False)
+    total = table[f"{end_year} LC Value"].sum()
+    table.insert(2, "Share (%)", table[f"{end_year} LC Value"] / (total or 1) * 100)
+    table = table.rename(columns={f"{end_year} LC Value": f"{end_year} Value (AED)"})
+    return table.round(1).astype({"Combinations": int, "Competitors": int})
+
+
+def class_totals(df, level, code, hierarchy=None):
+    """
+    Yearly totals plus combination / manufacturer counts for one code at
+    `level`, from the hierarchy when given, otherwise by filtering `df`.
+    """
+    if hierarchy is not None:
+        return hierarchy.node(level, code)
+    sub = df[df[level] == code]
+    if sub.empty:
+        return None
+    totals = sub[_year_columns(sub)].apply(pd.to_numeric, errors="coerce").sum()
+    totals["Combinations"] = sub["Molecule Combination"].nunique()
+    totals["Competitors"] = sub["Manufacturer"].nunique()
+    return totals
@@ -0,0 +1,81 @@
+import pandas as pd
+
+ATC_LEVELS = ["ATC1", "ATC2", "ATC3", "ATC4"]
+
+
+class CombinationContext:
+    """
+    Everything the tabs need about one selected combination, built once per
+    selection instead of every tool re-filtering and re-coercing the master.
+
+    `rows` is the typed slice (numeric Units / Value columns, normalized
+    Market), `atc` the combination's first code per ATC level, `atc4_rows`
+    the slice of its ATC4 class, and `manufacturers` / `products` / `packs`
+    the yearly aggregates at those grains. Consumers must treat every frame
+    as read-only and `.copy()` before adding columns.
+    """
+
+    def __init__(self, combo, rows, atc, atc4_rows, manufacturers, products, packs, product_molecules):
+        self.combo = combo
+        self.rows = rows
+        self.atc = atc
+        self.atc4_rows = atc4_rows
+        self.manufacturers = manufacturers
+        self.products = products
+        self.packs = packs
+        self.product_molecules = product_molecules
+
+    @property
+    def empty(self):
+        return self.rows.empty
+
+    def product_names(self):
+        """
+        Products of the combination, in master order.
+        """
+        return self.rows["Product"].drop_duplicates().tolist()
+
+    def cache_token(self):
+        return {"combination": self.combo, "rows": len(self.rows)}
+
+
+def _typed(frame):
+    frame = frame.copy()
+    for col in frame.columns:
+        if "Value" in col or "Units" in col:
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0)
+    frame["Market"] = frame["Market"].astype(str).str.strip().str.upper()
+    return frame
+
+
+def build_combination_context(df, combo):
+    """
+    One pass over the master for the combination and one for its ATC4 class;
+    everything else is grouped from those slices.
+    """
+    combo = combo.strip().upper()
+    rows = _typed(df[df["Molecule Combination"] == combo])
+
+    atc = {}
+    for level in ATC_LEVELS:
+        codes = rows[level].dropna().unique() if level in rows.columns else []
+        atc[level] = codes[0] if len(codes) else None
+
+    atc4_rows = _typed(df[df["ATC4"] == atc["ATC4"]]) if atc["ATC4"] is not None else rows.iloc[0:0]
+
+    year_cols = [c for c in rows.columns if c.endswith(" Units") or c.endswith(" LC Value")]
+    manufacturers = rows.groupby("Manufacturer")[year_cols].sum()
+    products = rows.groupby(["Product", "Manufacturer"])[year_cols].sum()
+    packs = rows.groupby(["Product", "Pack", "Retail Price"])[year_cols].sum()
+
+    # Molecules of every product in the combination (for shared-molecule notes)
+    product_molecules = (
+        df.loc[df["Product"].isin(rows["Product"].unique()), ["Product", "Molecule"]]
+          .dropna()
+          .drop_duplicates()
+          .groupby("Product")["Molecule"]
+          .apply(list)
+          .to_dict()
+    )
+
+    return CombinationContext(combo, rows, atc, atc4_rows, manufacturers, products, packs, product_molecules)
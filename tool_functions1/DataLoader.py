@@ -0,0 +1,123 @@
+import pandas as pd
+
+from tool_functions1.combinations import create_combination_column
+from tool_functions1.DataRegistry import registry
+
+# ─── Source files ───────────────────────────────────────────────────────────────
+MASTER_PATH          = "MasterData2025.csv"
+MOHAP_PATH           = "PriceListMOHAP.csv"
+OB_PRODUCTS_PATH     = "OBproducts.csv"
+OB_PATENTS_PATH      = "OBpatents.csv"
+OB_EXCLUSIVITY_PATH  = "OBexclusivity.csv"
+
+registry.register("master", MASTER_PATH)
+registry.register("mohap", MOHAP_PATH)
+registry.register("ob_products", OB_PRODUCTS_PATH)
+registry.register("ob_patents", OB_PATENTS_PATH)
+registry.register("ob_exclusivity", OB_EXCLUSIVITY_PATH)
+
+
+def clean_columns(df):
+    # Clean column names early to avoid hidden '\n' or trailing spaces
+    df.columns = df.columns.str.replace("\n", " ", regex=False).str.strip()
+    return df
+
+
+# ─── Loaders (plain pandas, no Streamlit) ───────────────────────────────────────
+def normalize_master(df, combination_map=None):
+    """
+    Cleans raw master rows: upper-cased molecule and product names, the
+    combination columns, numeric value and unit columns. Chunked ingest
+    applies it per chunk with a `combination_map` built over the whole file.
+    """
+    df = clean_columns(df)
+
+    # Normalize molecule and product columns BEFORE creating combination column
+    df["Molecule"] = df["Molecule"].astype(str).str.strip().str.upper()
+    df["Product"] = df["Product"].astype(str).str.strip().str.upper()
+
+    # Create 'Molecule Combination' and 'Molecule Combination Type'
+    df = create_combination_column(df, combination_map)
+
+    # Final clean of numeric columns
+    for col in df.columns:
+        if "Value" in col or "Units" in col:
+            df[col] = pd.to_numeric(
+                df[col].astype(str).str.replace(",", "").str.strip(),
+                errors="coerce"
+            )
+    return df
+
+
+def read_master_data(path=MASTER_PATH):
+    df = normalize_master(pd.read_csv(path))
+    df.attrs["dataset"] = "master"
+    return df
+
+
+def read_mohap_data(path=MOHAP_PATH):
+    mohap_df = clean_columns(pd.read_csv(path))
+    mohap_df.attrs["dataset"] = "mohap"
+    return mohap_df
+
+
+def clean_ob_products(ob_products):
+    ob_products.columns = ob_products.columns.str.strip()
+    ob_products["Ingredient"] = ob_products["Ingredient"].astype(str).str.upper().str.strip()
+    ob_products["Ingredient_List"] = ob_products["Ingredient"].str.split(";")
+    ob_products["Ingredient_Formatted"] = ob_products["Ingredient_List"].apply(lambda x: " +".join(x))
+    ob_products["Ingredient_Formatted_Clean"] = ob_products["Ingredient_Formatted"].str.strip().str.upper()
+    return ob_products
+
+
+def read_orange_book(
+    products_path=OB_PRODUCTS_PATH,
+    patents_path=OB_PATENTS_PATH,
+    exclusivity_path=OB_EXCLUSIVITY_PATH
+):
+    """
+    Returns (products, patents, exclusivity) with the product ingredient
+    columns already cleaned for lookups.
+    """
+    ob_products  = clean_ob_products(pd.read_csv(products_path))
+    ob_patents   = pd.read_csv(patents_path)
+    ob_exclusive = pd.read_csv(exclusivity_path)
+    ob_products.attrs["dataset"] = "ob_products"
+    ob_patents.attrs["dataset"] = "ob_patents"
+    ob_exclusive.attrs["dataset"] = "ob_exclusivity"
+    return ob_products, ob_patents, ob_exclusive
+
+
+# ─── Derived lookups ────────────────────────────────────────────────────────────
+def compute_top_products(df):
+    """
+    { combo: product } for the top-selling product (2024 units) of each combination.
+    """
+    combo_prod_sales = (
+        df.groupby(["Molecule Combination", "Product"])["2024 Units"]
+          .sum()
+    )
+    # for each combo, pick the (combo,product) with max units
+    top_pairs = combo_prod_sales.groupby(level=0).idxmax().tolist()
+    return { combo: prod for combo, prod in top_pairs }
+
+
+def top_combinations(df, n=50, value_col="2024 LC Value"):
+    """
+    The `n` combinations with the highest 2024 value, biggest first.
+    """
+    return (
+        df.groupby("Molecule Combination")[value_col]
+          .sum()
+          .sort_values(ascending=False)
+          .head(n)
+          .index
+          .tolist()
+    )
+
+
+def dataset_version():
+    """
+    Current dataset version; include it in every cache key.
+    """
+    return registry.refresh()[0]
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DatasetRegistry:
+    """
+    Tracks every source file the app reads and fingerprints it (size, mtime,
+    content hash). The combined `version()` goes into every cache key, so
+    replacing a CSV invalidates loaders and downstream results without a restart.
+
+    Content hashes are only recomputed when size or mtime change, so calling
+    `refresh()` on every rerun costs one `os.stat` per file.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._hashes = {}        # path -> (size, mtime_ns, sha256)
+        self._version = None
+        self._last_prints = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        with self._lock:
+            self._paths[name] = path
+            self._version = None
+
+    def names(self):
+        return list(self._paths)
+
+    def path(self, name):
+        return self._paths[name]
+
+    def on_change(self, callback):
+        """
+        Registers `callback(old_version, new_version, changed_names)`, called
+        from `refresh()` whenever a source file changes.
+        """
+        self._listeners.append(callback)
+
+    def fingerprint(self, name):
+        path = self._paths[name]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return {"path": path, "size": None, "mtime_ns": None, "sha256": None}
+
+        cached = self._hashes.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            sha = cached[2]
+        else:
+            sha = file_sha256(path)
+            self._hashes[path] = (st.st_size, st.st_mtime_ns, sha)
+        return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+
+    def fingerprints(self):
+        return {name: self.fingerprint(name) for name in sorted(self._paths)}
+
+    def _compute_version(self, fingerprints):
+        h = hashlib.sha256()
+        for name, fp in fingerprints.items():
+            h.update(f"{name}={fp['sha256'] or 'missing'};".encode())
+        return h.hexdigest()[:16]
+
+    def refresh(self):
+        """
+        Re-fingerprints all sources and returns `(version, changed_names)`.
+        Listeners are notified when the version moves.
+        """
+        with self._lock:
+            old_prints = self._last_prints
+            prints = self.fingerprints()
+            new_version = self._compute_version(prints)
+            old_version = self._version
+            self._version = new_version
+            self._last_prints = prints
+
+        changed = [
+            name for name, fp in prints.items()
+            if old_prints and old_prints.get(name, {}).get("sha256") != fp["sha256"]
+        ]
+        if old_version is not None and old_version != new_version:
+            for callback in self._listeners:
+                callback(old_version, new_version, changed)
+        return new_version, changed
+
+    def version(self):
+        if self._version is None:
+            self.refresh()
+        return self._version
+
+
+# Process-wide registry; loaders register their source files on import
+registry = DatasetRegistry()
@@ -37,18 +37,30 @@ def forecast_molecule_product(
     df: pd.DataFrame,
     molecule_name: str,
     product_name: str,
-    growth_rate: float = 0.10
+    growth_rate: float = 0.10,
+    context=None,
+    uptake=None,
+    penetration=None
 ) -> pd.DataFrame:
     """
     Forecasts Y1–Y3 units and revenue based on competitor-adjusted Y1 penetration.
+    With a combination `context`, only the molecule's own rows are used.
+    `penetration` (fraction) overrides the competitor rule; `uptake` (Y1–Y3
+    share fractions, e.g. from `empirical_uptake`, whose first value is the
+    entry year) replaces it entirely: year k is uptake[k] of a market growing
+    at `growth_rate`.
     """
     mol = molecule_name.strip().upper()
     prod = product_name.strip().upper()
 
-    df = df.copy()
-    df = create_combination_column(df)
-    df["Molecule Combination"] = df["Molecule Combination"].str.upper()
-    df["Product"] = df["Product"].str.upper()
+    if context is not None:
+        df = context.rows
+    else:
+        # Combination labels from the two columns they depend on; only the molecule's rows are copied
+        combos = create_combination_column(df[["Molecule", "Product"]])["Molecule Combination"].str.upper()
+        df = df[combos == mol].copy()
+        df["Molecule Combination"] = combos[combos == mol]
+        df["Product"] = df["Product"].str.upper()
 
     # Subset product-molecule
     psub = df[(df["Molecule Combination"] == mol) & (df["Product"] == prod)].copy()
@@ -66,14 +78,15 @@ def forecast_molecule_product(
     total_mol_2024_units = mol_df["2024 Units"].sum()
     total_mol_2024_value = mol_df["2024 LC Value"].sum()
 
-    # Competitor-based penetration logic
+    # Competitor-based penetration logic (unless the caller set one)
     num_competitors = mol_df["Manufacturer"].nunique()
-    if num_competitors == 1:
-        penetration = 0.20
-    elif 2 <= num_competitors <= 4:
-        penetration = 0.10
-    else:
-        penetration = 0.05
+    if penetration is None:
+        if num_competitors == 1:
+            penetration = 0.20
+        elif 2 <= num_competitors <= 4:
+            penetration = 0.10
+        else:
+            penetration = 0.05
 
     # Pack-level aggregation
     packs = (
@@ -86,9 +99,14 @@ def forecast_molecule_product(
     packs["Pack Share"] = packs["Pack_Units"] / (total_prod_units or 1)
 
     # Forecast logic
-    packs["Y1 Units"] = packs["Pack Share"] * total_mol_2024_units * penetration
-    packs["Y2 Units"] = packs["Y1 Units"] * (1 + growth_rate)
-    packs["Y3 Units"] = packs["Y2 Units"] * (1 + growth_rate)
+    if uptake is None:
+        packs["Y1 Units"] = packs["Pack Share"] * total_mol_2024_units * penetration
+        packs["Y2 Units"] = packs["Y1 Units"] * (1 + growth_rate)
+        packs["Y3 Units"] = packs["Y2 Units"] * (1 + growth_rate)
+    else:
+        penetration = uptake[0]
+        for k, y in enumerate(("Y1", "Y2", "Y3")):
+            packs[f"{y} Units"] = packs["Pack Share"] * total_mol_2024_units * (1 + growth_rate) ** k * uptake[k]
 
     # Price logic
     packs["CIF Price"] = (packs["Retail Price"] / 1.4) * 0.4
@@ -116,9 +134,14 @@ def forecast_molecule_product_fmt(
     df: pd.DataFrame,
     molecule_name: str,
     product_name: str,
-    growth_rate: float = 0.2
+    growth_rate: float = 0.2,
+    context=None,
+    uptake=None,
+    penetration=None
 ) -> pd.DataFrame:
-    raw = forecast_molecule_product(df, molecule_name, product_name, growth_rate=growth_rate)
+    raw = forecast_molecule_product(
+        df, molecule_name, product_name, growth_rate=growth_rate, context=context, uptake=uptake, penetration=penetration
+    )
     fmt = raw.copy()
 
     fmt["Total 2024 Units"] = fmt["Total 2024 Units"].apply(human_fmt)
@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from tool_functions1.Metrics import METRICS
+from tool_functions1.SharedFrame import FrozenFrame
+
+DEFAULT_CACHE_PATH = os.environ.get("PHARMAI_CACHE_PATH", os.path.join(".cache", "pharmai_cache.sqlite"))
+# Build or git revision; unset = a digest of the sources, taken at first use
+CODE_VERSION = os.environ.get("PHARMAI_CODE_VERSION", "")
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ─── 1/ Cache keys ──────────────────────────────────────────────────────────────
+def _key_token(value):
+    """
+    JSON-able stand-in for an argument. Shared loader frames (FrozenFrame,
+    tagged with `attrs["dataset"]`) are keyed by name and shape instead of
+    content; slices and copies keep the tag but are hashed like any frame.
+    Derived objects (e.g. the ATC hierarchy) provide their own `cache_token()`.
+    """
+    token = getattr(value, "cache_token", None)
+    if callable(token):
+        return {"$token": _key_token(token())}
+    if isinstance(value, pd.DataFrame):
+        tag = value.attrs.get("dataset")
+        if tag and isinstance(value, FrozenFrame):
+            return {"$frame": tag, "shape": list(value.shape)}
+        return {"$frame_hash": int(pd.util.hash_pandas_object(value, index=True).sum())}
+    if isinstance(value, pd.Series):
+        return {"$series_hash": int(pd.util.hash_pandas_object(value, index=True).sum())}
+    if isinstance(value, dict):
+        return {str(k): _key_token(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple, set)):
+        items = sorted(value, key=repr) if isinstance(value, set) else value
+        return [_key_token(v) for v in items]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def _file_digest(path, digest):
+    with open(path, "rb") as f:
+        digest.update(f.read())
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(module_name):
+    """
+    Version of the code behind results of functions in `module_name`:
+    PHARMAI_CODE_VERSION when set, otherwise a digest of every
+    tool_functions1 source file plus the module's own source. Results and
+    pickled objects (AtcHierarchy, TrendForecasts, ...) from older code
+    are then misses, even though the cache file outlives deploys.
+    """
+    if CODE_VERSION:
+        return CODE_VERSION
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(PACKAGE_DIR)):
+        if name.endswith(".py"):
+            _file_digest(os.path.join(PACKAGE_DIR, name), digest)
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    if path and os.path.dirname(os.path.abspath(path)) != PACKAGE_DIR:
+        try:
+            _file_digest(path, digest)
+        except OSError:
+            pass
+    return digest.hexdigest()[:16]
+
+
+def key_prefix(fn):
+    """
+    Prefix shared by every key of `fn` under the current code.
+    """
+    return f"{fn.__module__}.{fn.__qualname__}@{code_version(fn.__module__)}:"
+
+
+def call_key(fn, args=(), kwargs=None):
+    """
+    Stable key for `fn(*args, **kwargs)` under the current code (`key_prefix`):
+    arguments are bound to the signature (defaults applied), so positional
+    and keyword calls share one entry.
+    """
+    kwargs = kwargs or {}
+    try:
+        bound = inspect.signature(fn).bind(*args, **kwargs)
+        bound.apply_defaults()
+        payload = dict(bound.arguments)
+    except (TypeError, ValueError):
+        payload = {"args": list(args), "kwargs": kwargs}
+    digest = hashlib.sha256(
+        json.dumps(_key_token(payload), sort_keys=True, default=repr).encode()
+    ).hexdigest()
+    return f"{key_prefix(fn)}{digest}"
+
+
+# ─── 2/ Shared SQLite store ─────────────────────────────────────────────────────
+class DiskCache:
+    """
+    Pickled results in a local SQLite file, shared by every worker process on
+    the box. WAL mode lets readers proceed while one process writes; each entry
+    records the dataset version it was computed from.
+    """
+
+    layer = "disk"
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        con = self._conn()
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        con.commit()
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=self.timeout)
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get(self, key, version):
+        """
+        Returns (hit, value). Entries from another dataset version are misses.
+        """
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+        except sqlite3.Error:
+            return False, None
+        if row is None:
+            return False, None
+        try:
+            return True, pickle.loads(row[0])
+        except Exception:
+            return False, None
+
+    def set(self, key, version, value):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        try:
+            con = self._conn()
+            con.execute(
+                "INSERT OR REPLACE INTO cache (key, version, value, created) VALUES (?, ?, ?, ?)",
+                (key, version, sqlite3.Binary(blob), time.time())
+            )
+            con.commit()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def keys_like(self, prefix, version=None):
+        """
+        Keys starting with `prefix` (optionally only for one dataset version).
+        """
+        sql, params = "SELECT key FROM cache WHERE substr(key, 1, ?) = ?", [len(prefix), prefix]
+        if version is not None:
+            sql += " AND version = ?"
+            params.append(version)
+        try:
+            return [row[0] for row in self._conn().execute(sql, params)]
+        except sqlite3.Error:
+            return []
+
+    def evict_stale(self, version):
+        """
+        Drops every entry computed from a different dataset version (scoped
+        entries of this version are kept, see `scoped_version`).
+        """
+        try:
+            con = self._conn()
+            cur = con.execute(
+                "DELETE FROM cache WHERE version != ? AND substr(version, 1, ?) != ?",
+                (version, len(version) + 1, f"{version}:")
+            )
+            con.commit()
+            return cur.rowcount
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache"
+        ).fetchone()
+        return {"entries": row[0], "bytes": row[1], "path": self.path}
+
+
+def scoped_version(version, scope=None):
+    """
+    Cache version for results computed from one slice of a dataset version
+    (e.g. one country and release of the partitioned master). Scoped
+    entries survive `evict_stale(version)` for their own dataset version.
+    """
+    return f"{version}:{scope}" if scope else version
+
+
+def same_dataset(entry_version, version):
+    return entry_version == version or entry_version.startswith(f"{version}:")
+
+
+def cached_call(cache, version, fn, *args, **kwargs):
+    """
+    Returns `fn(*args, **kwargs)` from the shared cache when present for this
+    dataset version, otherwise computes and stores it. Errors are not cached.
+    """
+    key = call_key(fn, args, kwargs)
+    layer = getattr(cache, "layer", "disk")
+    with METRICS.timer("pharmai_cache_seconds", layer=layer, name=fn.__name__):
+        hit, value = cache.get(key, version)
+        METRICS.inc("pharmai_cache_requests_total", layer=layer, result="hit" if hit else "miss", name=fn.__name__)
+        if hit:
+            return value
+        value = fn(*args, **kwargs)
+        cache.set(key, version, value)
+        return value
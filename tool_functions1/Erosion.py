@@ -2,28 +2,42 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 
-def plot_market_erosion(df, molecule):
-    df = df.copy()
-    df["Molecule"] = df["Molecule"].astype(str).str.strip().str.upper()
-    df["Molecule Combination"] = df.groupby("Product")["Molecule"].transform(
-        lambda x: " + ".join(sorted(x.unique()))
-    )
+from tool_functions1.QueryEngine import current_engine
+
+def plot_market_erosion(df, molecule, context=None):
+    if context is not None:
+        # Typed molecule and ATC4 slices, already built for this selection
+        mol_df = context.rows
+        if mol_df.empty:
+            return None, None
+        atc4_code = context.atc["ATC4"]
+        atc4_df = context.atc4_rows
+    else:
+        molecules = df["Molecule"].astype(str).str.strip().str.upper()
+        combos = molecules.groupby(df["Product"]).transform(lambda x: " + ".join(sorted(x.unique())))
 
-    for col in df.columns:
-        if "Units" in col:
-            df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+        def typed_slice(mask):
+            # Only the rows in use are copied and cleaned
+            part = df[mask].copy()
+            part["Molecule"] = molecules[mask]
+            part["Molecule Combination"] = combos[mask]
+            for col in part.columns:
+                if "Units" in col:
+                    part[col] = pd.to_numeric(part[col].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+            return part
 
-    mol_df = df[df["Molecule Combination"].str.upper() == molecule.upper()].copy()
-    if mol_df.empty:
-        return None, None
+        mol_df = typed_slice(combos.str.upper() == molecule.upper())
+        if mol_df.empty:
+            return None, None
 
-    atc4_code = mol_df["ATC4"].dropna().unique()[0]
-    atc4_df = df[df["ATC4"] == atc4_code].copy()
+        atc4_code = mol_df["ATC4"].dropna().unique()[0]
+        atc4_df = typed_slice(df["ATC4"] == atc4_code)
 
     years = [2020, 2021, 2022, 2023, 2024]
     total_units_by_year = {y: mol_df[f"{y} Units"].sum() for y in years}
 
-    manufacturer_totals = mol_df.groupby("Manufacturer")[["2021 Units", "2024 Units"]].sum()
+    engine = current_engine()
+    manufacturer_totals = engine.group_sum(mol_df, "Manufacturer", ["2021 Units", "2024 Units"])
     top_manufacturer = manufacturer_totals["2024 Units"].idxmax()
     top_2021 = manufacturer_totals.loc[top_manufacturer, "2021 Units"]
     top_2024 = manufacturer_totals.loc[top_manufacturer, "2024 Units"]
@@ -37,23 +51,25 @@ def plot_market_erosion(df, molecule):
     avg_21_shares = []
     avg_24_shares = []
 
+    # Two grouped passes over the ATC4 class instead of a slice and two groupbys per combination
+    pair_totals = engine.group_sum(atc4_df, ["Molecule Combination", "Manufacturer"], ["2021 Units", "2024 Units"])
+    combo_totals = engine.group_sum(atc4_df, "Molecule Combination", ["2021 Units", "2024 Units"])
+
     for combo in atc4_df["Molecule Combination"].dropna().unique():
-        temp_df = atc4_df[atc4_df["Molecule Combination"] == combo]
-        manufacturers = temp_df["Manufacturer"].nunique()
-        total_2024 = temp_df["2024 Units"].sum()
-        top_2024_share = (
-            temp_df.groupby("Manufacturer")["2024 Units"].sum().max() / total_2024
-            if total_2024 > 0 else 1
-        )
+        try:
+            mfg_totals = pair_totals.loc[combo]
+        except KeyError:                # no row of this combination names a manufacturer
+            continue
+        manufacturers = len(mfg_totals)
+        total_21 = combo_totals.loc[combo, "2021 Units"]
+        total_24 = combo_totals.loc[combo, "2024 Units"]
+        top_2024_share = mfg_totals["2024 Units"].max() / total_24 if total_24 > 0 else 1
         if manufacturers <= 1 or top_2024_share >= 0.99:
             continue
 
-        mfg_totals = temp_df.groupby("Manufacturer")[["2021 Units", "2024 Units"]].sum()
         top_manuf = mfg_totals["2024 Units"].idxmax()
         top_21 = mfg_totals.loc[top_manuf, "2021 Units"]
         top_24 = mfg_totals.loc[top_manuf, "2024 Units"]
-        total_21 = temp_df["2021 Units"].sum()
-        total_24 = temp_df["2024 Units"].sum()
         if total_21 > 0 and total_24 > 0:
             share_2021 = top_21 / total_21
             share_2024 = top_24 / total_24
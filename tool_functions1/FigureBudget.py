@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+# Defaults, overridable per deployment
+MAX_SERIES  = int(os.environ.get("PHARMAI_MAX_SERIES", 12))
+WEBGL_ABOVE = int(os.environ.get("PHARMAI_WEBGL_ABOVE", 25))
+
+
+class FigureBudget:
+    """
+    Caps what a figure ships to the browser: at most `max_series` named
+    series (the tail is folded into one "Other" series), WebGL scatter traces
+    once the data has more than `webgl_above` series before folding, and one
+    hovertemplate per trace type stored in the layout template instead of
+    per-point strings. `max_series=None` disables folding.
+    """
+
+    def __init__(self, max_series=MAX_SERIES, webgl_above=WEBGL_ABOVE, other_label="Other"):
+        self.max_series = max_series
+        self.webgl_above = webgl_above
+        self.other_label = other_label
+
+    def cache_token(self):
+        return {"max_series": self.max_series, "webgl_above": self.webgl_above, "other_label": self.other_label}
+
+    def fold(self, frame, by):
+        """
+        Keeps the `max_series` rows with the largest `by` (in their original
+        order) and sums the rest into an `other_label` row.
+        Returns (frame, number of folded rows).
+        """
+        if self.max_series is None or len(frame) <= self.max_series:
+            return frame, 0
+        keep = frame[by].nlargest(self.max_series).index
+        head = frame[frame.index.isin(keep)]
+        tail = frame[~frame.index.isin(keep)]
+        other = tail.sum(numeric_only=True).to_frame(self.other_label).T
+        return pd.concat([head, other]), len(tail)
+
+    def scatter(self, n_series):
+        """
+        Scatter trace class for data with `n_series` series, counted before `fold`.
+        """
+        import plotly.graph_objects as go
+        return go.Scattergl if n_series > self.webgl_above else go.Scatter
+
+
+def share_hovertemplate(fig, trace_type, hovertemplate):
+    """
+    Stores `hovertemplate` once in the figure's layout template for every
+    trace of `trace_type`; traces then leave their own hovertemplate unset.
+    """
+    import plotly.graph_objects as go
+
+    template = fig.layout.template
+    defaults = list(template.data[trace_type]) or [getattr(go, trace_type.capitalize())()]
+    for trace in defaults:
+        trace.hovertemplate = hovertemplate
+    template.data[trace_type] = defaults
+    fig.update_layout(template=template)
+    return fig
@@ -1,8 +1,14 @@
 import pandas as pd
 import plotly.graph_objects as go
 
-def plot_manufacturer_market_share(df, selected_molecule, market_type="PRIVATE MARKET"):
-    df = df.copy()
+from tool_functions1.FigureBudget import FigureBudget, share_hovertemplate
+from tool_functions1.QueryEngine import current_engine
+
+def plot_manufacturer_market_share(df, selected_molecule, market_type="PRIVATE MARKET", context=None, budget=None):
+    if context is not None:
+        df = context.rows.copy()
+    else:
+        df = df[df["Molecule Combination"].astype(str).str.upper().str.strip() == selected_molecule.strip().upper()].copy()
     df.columns = df.columns.str.replace("\n", " ", regex=False).str.strip()
     df["Molecule Combination"] = df["Molecule Combination"].astype(str).str.upper().str.strip()
     selected_molecule = selected_molecule.strip().upper()
@@ -18,23 +24,24 @@ def plot_manufacturer_market_share(df, selected_molecule, market_type="PRIVATE M
     years = ["2020", "2021", "2022", "2023", "2024"]
     unit_cols = [f"{y} Units" for y in years]
 
-    grouped = mol_df.groupby("Manufacturer")[unit_cols].sum()
+    grouped = current_engine().group_sum(mol_df, "Manufacturer", unit_cols)
     grouped = grouped[grouped.sum(axis=1) > 0]
 
-    # Calculate total per year for share
+    # Calculate total per year for share (before folding the tail)
     total_units = grouped.sum(axis=0)
 
+    budget = budget or FigureBudget()
+    trace = budget.scatter(len(grouped))
+    grouped, _ = budget.fold(grouped, by=unit_cols[-1])
+    shares = (grouped / total_units * 100).round(2)
+
     fig = go.Figure()
-    for mfr in grouped.index:
-        shares = (grouped.loc[mfr] / total_units * 100).round(2)
-        fig.add_trace(go.Scatter(
+    for mfr in shares.index:
+        fig.add_trace(trace(
             x=years,
-            y=shares.values,
+            y=shares.loc[mfr].values,
             mode="lines+markers",
-            name=mfr,
-            hovertemplate=f"Manufacturer: {mfr}<br>" +
-                          "Year: %{x}<br>" +
-                          "Market Share: %{y}%<extra></extra>"
+            name=mfr
         ))
 
     fig.update_layout(
@@ -45,5 +52,9 @@ def plot_manufacturer_market_share(df, selected_molecule, market_type="PRIVATE M
         height=500,
         legend_title="Manufacturer"
     )
+    share_hovertemplate(
+        fig, trace.__name__.lower(),
+        "Manufacturer: %{fullData.name}<br>Year: %{x}<br>Market Share: %{y}%<extra></extra>"
+    )
 
     return fig
\ No newline at end of file
@@ -0,0 +1,194 @@
+import os
+
+import pandas as pd
+
+from tool_functions1.ArrowStore import arrow_available, frame_to_table, load_mapped, pa
+from tool_functions1.DataLoader import MASTER_PATH, clean_columns, normalize_master
+from tool_functions1.combinations import combination_name
+
+CHUNK_ROWS = int(os.environ.get("PHARMAI_INGEST_CHUNK_ROWS", "250000"))
+# Master files at least this large are streamed into the Arrow store chunk by chunk (0 = always)
+CHUNKED_MIN_BYTES = int(float(os.environ.get("PHARMAI_CHUNKED_INGEST_MB", "256")) * 1024 * 1024)
+
+AGGREGATE_KEYS = ["Molecule Combination", "Product"]
+STAGING_NAME = "master-chunks"
+
+
+def measure_columns(df):
+    return [c for c in df.columns if "Value" in c or "Units" in c]
+
+
+# ─── 1/ Column kinds ────────────────────────────────────────────────────────────
+def _kind(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    return "string"
+
+
+def _widen(seen, kind):
+    """
+    The dtype a single `read_csv` of the whole file would have picked: ints
+    with a missing value somewhere become floats, anything mixed is text.
+    """
+    if seen is None or seen == kind:
+        return kind
+    if {seen, kind} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+ARROW_TYPES = {"bool": "bool_", "int": "int64", "float": "float64", "string": "string"}
+PANDAS_TYPES = {"bool": "bool", "int": "int64", "float": "float64"}
+
+
+# ─── 2/ Incremental aggregates ──────────────────────────────────────────────────
+class MasterAggregates:
+    """
+    Units and value totals per (combination, product), summed chunk by chunk.
+    Partial sums are folded together every `compact_every` chunks, so memory
+    grows with the number of products, not rows. Enough for the top-product
+    map and the top-combination ranking (`compute_top_products`,
+    `top_combinations` take it in place of the master).
+    """
+
+    def __init__(self, compact_every=16):
+        self.compact_every = compact_every
+        self.rows = 0
+        self._parts = []
+
+    def add(self, chunk):
+        self._parts.append(chunk.groupby(AGGREGATE_KEYS, sort=False)[measure_columns(chunk)].sum())
+        self.rows += len(chunk)
+        if len(self._parts) >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        self._parts = [pd.concat(self._parts).groupby(level=list(range(len(AGGREGATE_KEYS))), sort=False).sum()]
+
+    def result(self):
+        self._compact()
+        totals = self._parts[0].sort_index().reset_index()
+        totals.attrs["dataset"] = "master_aggregates"
+        return totals
+
+
+def aggregate_master(df):
+    aggregates = MasterAggregates()
+    aggregates.add(df)
+    return aggregates.result()
+
+
+# ─── 3/ Two-pass chunked ingest ─────────────────────────────────────────────────
+def scan_master(path=MASTER_PATH, chunk_rows=CHUNK_ROWS):
+    """
+    Pass 1: the product → combination map (a product's molecules can be
+    spread over every chunk) and each column's final kind.
+    """
+    molecules, kinds = {}, {}
+    for raw in pd.read_csv(path, chunksize=chunk_rows):
+        chunk = normalize_master(raw)           # chunk-local combinations: only the kinds are kept
+        for product, names in chunk.groupby("Product")["Molecule"].unique().items():
+            molecules.setdefault(product, set()).update(names)
+        for col in chunk.columns:
+            kinds[col] = _widen(kinds.get(col), _kind(chunk[col].dtype))
+    kinds["Molecule Combination"] = kinds["Molecule Combination Type"] = "string"
+    return {product: combination_name(names) for product, names in molecules.items()}, kinds
+
+
+def arrow_schema(kinds, dataset="master"):
+    return pa.schema(
+        [(col, getattr(pa, ARROW_TYPES[kind])()) for col, kind in kinds.items()],
+        metadata={b"dataset": dataset.encode()},
+    )
+
+
+def iter_master_chunks(path, combination_map, kinds, chunk_rows=CHUNK_ROWS):
+    """
+    Pass 2: normalized chunks of `path`, each with exactly the `kinds`
+    columns and dtypes (columns the file lacks come back empty).
+    """
+    # Text columns stay text in every chunk, even where one chunk holds only digits
+    raw_columns = pd.read_csv(path, nrows=0).columns
+    text = {raw: str for raw, col in zip(raw_columns, clean_columns(pd.DataFrame(columns=raw_columns)).columns)
+            if kinds.get(col) == "string"}
+    numeric = {col: PANDAS_TYPES[kind] for col, kind in kinds.items() if kind in PANDAS_TYPES}
+    for raw in pd.read_csv(path, chunksize=chunk_rows, dtype=text):
+        yield normalize_master(raw, combination_map).reindex(columns=list(kinds)).astype(numeric)
+
+
+def ingest_master(store, version, path=MASTER_PATH, chunk_rows=CHUNK_ROWS, log=None):
+    """
+    Streams the master CSV into the Arrow store without holding all of it:
+    pass 1 scans (`scan_master`), pass 2 normalizes each chunk exactly as
+    `read_master_data` does, appends it to a staging file as one record
+    batch and adds it to the aggregates, stored as "master_aggregates".
+    Parsing and normalizing never hold more than a chunk plus the
+    aggregates. The staged batches are then compacted into the "master"
+    file as one batch (`compact_master`), so workers map every column
+    without a copy. Returns the row count.
+    """
+    combination_map, kinds = scan_master(path, chunk_rows)
+    schema = arrow_schema(kinds)
+    aggregates = MasterAggregates()
+    with store.writer(STAGING_NAME, version, schema) as writer:
+        for i, chunk in enumerate(iter_master_chunks(path, combination_map, kinds, chunk_rows), 1):
+            writer.write_table(frame_to_table(chunk).cast(schema))
+            aggregates.add(chunk)
+            if log:
+                log(f"ingested chunk {i} ({aggregates.rows:,} rows)")
+    compact_master(store, version)
+    store.write("master_aggregates", version, aggregates.result())
+    return aggregates.rows
+
+
+def compact_master(store, version):
+    """
+    Rewrites the staged chunk batches as the "master" file with a single
+    record batch. A multi-batch file opens with every column split in
+    chunks, which pandas joins into new arrays: a private copy of all the
+    numbers in each worker. The staged file is read memory-mapped, so the
+    one contiguous copy made here is the only full-size allocation.
+    """
+    staged = store.path(STAGING_NAME, version)
+    table = pa.ipc.open_file(pa.memory_map(staged, "r")).read_all().combine_chunks()
+    with store.writer("master", version, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(len(table), 1))
+    del table
+    os.remove(staged)
+
+
+# ─── 4/ Loading ─────────────────────────────────────────────────────────────────
+def load_master(store, version, build, path=MASTER_PATH, chunk_rows=CHUNK_ROWS, min_bytes=CHUNKED_MIN_BYTES):
+    """
+    The memory-mapped master for `version`. Files of at least `min_bytes`
+    are ingested chunk by chunk (`ingest_master`); smaller ones, or any file
+    without pyarrow, go through `load_mapped(..., build)` as before. Either
+    way the file holds one record batch, so numeric columns stay views of
+    the mapped pages in every worker.
+    """
+    if store is None or not arrow_available() or os.path.getsize(path) < min_bytes:
+        return load_mapped(store, "master", version, build)
+    master = store.open("master", version)
+    if master is None:
+        ingest_master(store, version, path, chunk_rows)
+        store.evict_stale(version)
+        master = store.open("master", version)
+    return master
+
+
+def load_master_aggregates(store, version, master):
+    """
+    Per (combination, product) totals: read back from the store when the
+    ingest wrote them, otherwise summed from `master` (and stored).
+    """
+    if store is None or not arrow_available():
+        return aggregate_master(master)
+    aggregates = store.open("master_aggregates", version)
+    if aggregates is None:
+        store.write("master_aggregates", version, aggregate_master(master))
+        aggregates = store.open("master_aggregates", version)
+    return aggregates
@@ -0,0 +1,342 @@
+import atexit
+import contextlib
+import functools
+import json
+import glob
+import os
+import threading
+import time
+
+# One file per worker process: a shared file would hold whichever worker wrote last
+DEFAULT_METRICS_PATH = os.environ.get("PHARMAI_METRICS_PATH", os.path.join(".cache", "metrics-{pid}.prom"))
+WRITE_INTERVAL = 15.0
+
+# Seconds; wide enough for a cache hit (ms) and a cold screener build (tens of s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "pharmai_calls_total": "Calls per instrumented function (kind = tool | loader).",
+    "pharmai_errors_total": "Calls that raised.",
+    "pharmai_latency_seconds": "Wall time per instrumented call.",
+    "pharmai_rows_scanned_total": "Rows of the input frame (or combination slice) handed to each call.",
+    "pharmai_cache_requests_total": "Cache lookups per layer (disk | tiered | response) and result (hit | miss).",
+    "pharmai_cache_seconds": "Wall time of cached calls, compute included on a miss.",
+    "pharmai_result_cache_requests_total": "In-process result cache lookups (hit | miss).",
+    "pharmai_result_cache_evictions_total": "In-process result cache evictions by reason (entries, bytes, ttl, stale, replaced, too_large).",
+    "pharmai_result_cache_entries": "Results held in the in-process cache.",
+    "pharmai_result_cache_bytes": "Accounted bytes held in the in-process cache.",
+    "pharmai_loaded_rows": "Rows in each loaded source or derived table.",
+    "pharmai_loaded_bytes": "In-memory size of each loaded source or derived table.",
+    "pharmai_rerun_seconds": "Streamlit script reruns by open tab.",
+    "pharmai_requests_total": "API requests by endpoint and status.",
+    "pharmai_request_seconds": "API request latency by endpoint.",
+    "pharmai_engine_seconds": "Aggregation time per query engine and operation (compare mode).",
+    "pharmai_engine_mismatches_total": "Aggregations whose result differed from the pandas reference.",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def rows_scanned(args, kwargs):
+    """
+    Rows a tool call works over: the combination slice when a context is
+    passed, otherwise the first frame argument.
+    """
+    context = kwargs.get("context")
+    if context is not None and hasattr(context, "rows"):
+        return len(context.rows)
+    for value in list(args) + list(kwargs.values()):
+        shape = getattr(value, "shape", None)
+        if isinstance(shape, tuple) and len(shape) == 2:
+            return shape[0]
+    return 0
+
+
+def _frame_bytes(frame):
+    usage = frame.memory_usage(index=True, deep=False)   # per column for a frame, a number for a series
+    return int(usage.sum() if hasattr(usage, "sum") else usage)
+
+
+def data_size(value):
+    """
+    (rows, bytes) of a frame, series or tuple of frames; (None, None) otherwise.
+    """
+    frames = value if isinstance(value, tuple) else (value,)
+    if not frames or not all(hasattr(f, "memory_usage") and hasattr(f, "shape") for f in frames):
+        return None, None
+    return sum(f.shape[0] for f in frames), sum(_frame_bytes(f) for f in frames)
+
+
+# ─── 1/ In-process registry ─────────────────────────────────────────────────────
+class Metrics:
+    """
+    Counters, gauges and histograms for one process, keyed by metric name and
+    labels. Updates take one lock and touch a dict, so instrumenting hot paths
+    costs microseconds. `to_prometheus()` renders the text exposition format,
+    `snapshot()` the same data as JSON.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}           # (name, labels) -> [bucket counts..., sum, count]
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def on_call(self, callback):
+        """
+        Registers `callback(kind, name, fn, args, kwargs, seconds, error)`,
+        called after every instrumented call (e.g. the slow-call log).
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def inc(self, metric, value=1, /, **labels):
+        key = (metric, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, metric, value, /, **labels):
+        with self._lock:
+            self._gauges[(metric, _label_key(labels))] = value
+
+    def observe(self, metric, value, /, **labels):
+        key = (metric, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, metric, /, **labels):
+        """
+        Observes the wall time of the `with` block into histogram `metric`.
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - t0, **labels)
+
+    def instrument(self, fn, kind="tool", name=None):
+        """
+        Wraps `fn` to count calls, errors and rows scanned and to time each
+        call. The wrapper keeps `fn`'s module, name and signature, so cache
+        keys built from it do not change.
+        """
+        if getattr(fn, "__metrics_wrapped__", False):
+            return fn
+        name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            error = None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+                self.inc("pharmai_errors_total", kind=kind, name=name)
+                raise
+            finally:
+                seconds = time.perf_counter() - t0
+                self.inc("pharmai_calls_total", kind=kind, name=name)
+                self.observe("pharmai_latency_seconds", seconds, kind=kind, name=name)
+                rows = rows_scanned(args, kwargs)
+                if rows:
+                    self.inc("pharmai_rows_scanned_total", rows, kind=kind, name=name)
+                for callback in self._listeners:
+                    callback(kind, name, fn, args, kwargs, seconds, error)
+
+        wrapper.__metrics_wrapped__ = True
+        return wrapper
+
+    def record_size(self, source, value):
+        rows, size = data_size(value)
+        if rows is not None:
+            self.set("pharmai_loaded_rows", rows, source=source)
+            self.set("pharmai_loaded_bytes", size, source=source)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    # ─── Export ─────────────────────────────────────────────────────────────────
+    def _copy(self):
+        with self._lock:
+            return dict(self._counters), dict(self._gauges), {k: list(v) for k, v in self._histograms.items()}
+
+    def snapshot(self):
+        counters, gauges, histograms = self._copy()
+        hist_rows = []
+        for (name, key), hist in sorted(histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, hist):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = hist[-1]
+            hist_rows.append({"name": name, "labels": dict(key), "buckets": buckets, "sum": hist[-2], "count": hist[-1]})
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "counters": [{"name": n, "labels": dict(k), "value": v} for (n, k), v in sorted(counters.items())],
+            "gauges": [{"name": n, "labels": dict(k), "value": v} for (n, k), v in sorted(gauges.items())],
+            "histograms": hist_rows,
+        }
+
+    def to_prometheus(self, const_labels=None):
+        """
+        Text exposition format; `const_labels` are added to every series
+        (e.g. the pid, so per-process files never repeat a series).
+        """
+        counters, gauges, histograms = self._copy()
+        lines, described = [], set()
+        const = tuple(sorted((k, str(v)) for k, v in (const_labels or {}).items()))
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for (name, key), value in sorted(series.items()):
+                header(name, kind)
+                lines.append(f"{name}{_format_labels(key + const)} {_number(value)}")
+        for (name, key), hist in sorted(histograms.items()):
+            header(name, "histogram")
+            key = key + const
+            cumulative = 0
+            for bound, count in zip(self.buckets, hist):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist[-1]}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_number(hist[-2])}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        """
+        Writes the current values atomically: JSON for a `.json` path,
+        Prometheus text otherwise. `{pid}` in the path is filled in, so each
+        worker process keeps its own file; the series in it then carry a
+        `pid` label too.
+        """
+        template = path or DEFAULT_METRICS_PATH
+        path = template.format(pid=os.getpid())
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        const = {"pid": os.getpid()} if "{pid}" in template else None
+        body = json.dumps(self.snapshot(), indent=1) if path.endswith(".json") else self.to_prometheus(const)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        return path
+
+
+METRICS = Metrics()
+
+
+# ─── 2/ Periodic file export ────────────────────────────────────────────────────
+class MetricsWriter(threading.Thread):
+    """
+    Rewrites the metrics file every `interval` seconds for a textfile scraper.
+    """
+
+    def __init__(self, metrics=METRICS, path=None, interval=WRITE_INTERVAL):
+        super().__init__(daemon=True, name="pharmai-metrics")
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.metrics.write(self.path)
+            except OSError:
+                pass                     # a full or read-only disk must not take the app down
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.metrics.write(self.path)
+        except OSError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def prune_metrics_files(path=None):
+    """
+    Deletes the per-process files (`{pid}` in the path) of processes that
+    are gone, so a scraper does not keep reading a dead worker's last values.
+    """
+    template = path or DEFAULT_METRICS_PATH
+    if "{pid}" not in template:
+        return 0
+    prefix, suffix = template.split("{pid}", 1)
+    removed = 0
+    for candidate in glob.glob(glob.escape(prefix) + "*" + glob.escape(suffix)):
+        pid = candidate[len(prefix):len(candidate) - len(suffix)]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            try:
+                os.remove(candidate)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def start_metrics_writer(path=None, interval=WRITE_INTERVAL, metrics=METRICS):
+    """
+    Starts the process's writer thread, or returns the one already running.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            prune_metrics_files(path)
+            _writer = MetricsWriter(metrics, path, interval)
+            _writer.start()
+            atexit.register(_writer.stop)   # final values from short-lived processes too
+        return _writer
@@ -15,34 +15,31 @@ def format_registered_products_by_company(molecule_name: str, mohap_df: pd.DataF
     """
     molecule_name_clean = clean_ingredient_string(molecule_name)
 
-    # Normalize columns in‐place
-    mohap_df["Ingredient"]       = mohap_df["Ingredient"].astype(str)
-    mohap_df["Ingredient_clean"] = mohap_df["Ingredient"].apply(clean_ingredient_string)
-    mohap_df["Trade Name"]       = mohap_df["Trade Name"].astype(str).str.strip()
-    mohap_df["Form"]             = (
-        mohap_df["Form"]
+    # find matches (the shared MOHAP frame is read-only: only the matches are normalized)
+    ingredient_clean = mohap_df["Ingredient"].astype(str).apply(clean_ingredient_string)
+    matched = mohap_df[ingredient_clean.str.contains(molecule_name_clean, na=False)].copy()
+
+    matched["Ingredient"]       = matched["Ingredient"].astype(str)
+    matched["Trade Name"]       = matched["Trade Name"].astype(str).str.strip()
+    matched["Form"]             = (
+        matched["Form"]
         .astype(str)
         .str.replace(r"\s+", " ", regex=True)
         .str.strip()
     )
-    mohap_df["Strength"]         = mohap_df["Strength"].astype(str).str.strip()
-    mohap_df["Company"]          = (
-        mohap_df["Company"]
+    matched["Strength"]         = matched["Strength"].astype(str).str.strip()
+    matched["Company"]          = (
+        matched["Company"]
         .astype(str)
         .str.replace(r"\s+", " ", regex=True)
         .str.strip()
     )
-    mohap_df["Agent"]            = (
-        mohap_df["Agent"]
+    matched["Agent"]            = (
+        matched["Agent"]
         .astype(str)
         .str.replace(r"\s+", " ", regex=True)
         .str.strip()
     )
-
-    # find matches
-    matched = mohap_df[
-        mohap_df["Ingredient_clean"].str.contains(molecule_name_clean, na=False)
-    ]
     if matched.empty:
         st.warning(f"❌ No registered MOHAP products found for: **{molecule_name}**")
         return
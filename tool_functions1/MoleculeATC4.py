@@ -1,7 +1,15 @@
 import pandas as pd
 import plotly.graph_objects as go
 
-def plotly_combinations_within_atc4_go(df, atc4_name, UseValue=True, years=None):
+from tool_functions1.FigureBudget import FigureBudget, share_hovertemplate
+from tool_functions1.QueryEngine import current_engine
+
+def plotly_combinations_within_atc4_go(df, atc4_name, UseValue=True, years=None, hierarchy=None, budget=None):
+    """
+    Stacked yearly breakdown of the combinations in one ATC4 class. With a
+    precomputed `hierarchy` the per-combination totals are a node lookup;
+    otherwise only the ATC4 slice of `df` is copied and grouped.
+    """
     def compute_cagr_safe(series, end_year, start_years=["2021", "2022", "2023"]):
         for y in start_years:
             start = series.get(f"{y} Units", 0) if not UseValue else series.get(f"{y} LC Value", 0)
@@ -16,25 +24,33 @@ def plotly_combinations_within_atc4_go(df, atc4_name, UseValue=True, years=None)
     metric_label = "Value (AED)" if UseValue else "Units"
     end_year = years[-1]
 
-    df = df.copy()
-    df.columns = df.columns.str.replace("\n", " ", regex=False).str.strip()
-
     unit_cols  = [f"{y} Units"    for y in years]
     value_cols = [f"{y} LC Value" for y in years]
     metric_cols = value_cols if UseValue else unit_cols
 
-    df_f = df[df["ATC4"] == atc4_name].copy()
-    if df_f.empty:
-        return None, None
-
-    for c in unit_cols + value_cols:
-        df_f[c] = pd.to_numeric(df_f[c], errors="coerce").fillna(0)
-
-    # Count unique competitors per combination
-    competitor_counts = df_f.groupby("Molecule Combination")["Manufacturer"].nunique()
-
-    grp_units  = df_f.groupby("Molecule Combination")[unit_cols].sum()
-    grp_values = df_f.groupby("Molecule Combination")[value_cols].sum()
+    if hierarchy is not None:
+        grp = hierarchy.children("ATC4", atc4_name)
+        if grp.empty:
+            return None, None
+        competitor_counts = grp["Competitors"]
+        grp_units  = grp[unit_cols]
+        grp_values = grp[value_cols]
+    else:
+        df_f = df[df["ATC4"] == atc4_name].copy()
+        if df_f.empty:
+            return None, None
+        df_f.columns = df_f.columns.str.replace("\n", " ", regex=False).str.strip()
+
+        for c in unit_cols + value_cols:
+            df_f[c] = pd.to_numeric(df_f[c], errors="coerce").fillna(0)
+
+        # Count unique competitors per combination
+        engine = current_engine()
+        competitor_counts = engine.group_nunique(df_f, "Molecule Combination", "Manufacturer")
+
+        grp        = engine.group_sum(df_f, "Molecule Combination", unit_cols + value_cols)
+        grp_units  = grp[unit_cols]
+        grp_values = grp[value_cols]
     grp_metric = grp_values if UseValue else grp_units
 
     total_units  = grp_units.sum()
@@ -45,42 +61,30 @@ def plotly_combinations_within_atc4_go(df, atc4_name, UseValue=True, years=None)
     pct_share = grp_metric.divide(total_metric, axis=1) * 100
     pct_share = pct_share.fillna(0).round(1)
 
-    fig = go.Figure()
-    for combo in grp_metric.index:
-        y_raw = [grp_metric.at[combo, col] for col in metric_cols]
-        y_pct = [pct_share.at[combo, col] for col in metric_cols]
-        x_years = [c.split()[0] for c in metric_cols]
+    # Figure: tail combinations folded into "Other", hover text shared by every trace
+    budget = budget or FigureBudget()
+    both = grp_units.join(grp_values)
+    both, n_folded = budget.fold(both, by=metric_cols[-1])
+    shown_metric = both[metric_cols]
+    shown_pct = (shown_metric.divide(total_metric, axis=1) * 100).fillna(0).round(1)
+    x_years = [c.split()[0] for c in metric_cols]
 
-        series_u = grp_units.loc[combo]
-        series_v = grp_values.loc[combo]
+    fig = go.Figure()
+    for combo in both.index:
+        series_u = both.loc[combo, unit_cols]
+        series_v = both.loc[combo, value_cols]
         u_cagr = compute_cagr_safe(series_u, end_year)
         v_cagr = compute_cagr_safe(series_v, end_year)
+        if n_folded and combo == budget.other_label:
+            competitors = f"{n_folded} combinations"
+        else:
+            competitors = competitor_counts.get(combo, 0)
 
         fig.add_trace(go.Bar(
             name=combo,
             x=x_years,
-            y=y_raw,
-            customdata=[
-                [
-                    series_u.get(f"{years[0]} Units", 0),
-                    series_u.get(f"{end_year} Units", 0),
-                    series_v.get(f"{years[0]} LC Value", 0),
-                    series_v.get(f"{end_year} LC Value", 0),
-                    y_pct[i],
-                    u_cagr,
-                    v_cagr,
-                    competitor_counts.get(combo, 0)
-                ]
-                for i in range(len(metric_cols))
-            ],
-            hovertemplate=(
-                "<b>%{fullData.name}</b><br>"
-                f"{metric_label}: " + "%{y:,.0f}<br>"
-                "Market Share: %{customdata[4]:.1f}%<br>"
-                "Unit CAGR: %{customdata[5]:.1f}%<br>"
-                "Value CAGR: %{customdata[6]:.1f}%<br>"
-                "Competitors: %{customdata[7]}<extra></extra>"
-            )
+            y=shown_metric.loc[combo].values,
+            customdata=[[shown_pct.at[combo, col], u_cagr, v_cagr, competitors] for col in metric_cols]
         ))
 
     fig.update_layout(
@@ -92,6 +96,15 @@ def plotly_combinations_within_atc4_go(df, atc4_name, UseValue=True, years=None)
         height=600,
         width=1000
     )
+    share_hovertemplate(
+        fig, "bar",
+        "<b>%{fullData.name}</b><br>"
+        f"{metric_label}: " + "%{y:,.0f}<br>"
+        "Market Share: %{customdata[0]:.1f}%<br>"
+        "Unit CAGR: %{customdata[1]:.1f}%<br>"
+        "Value CAGR: %{customdata[2]:.1f}%<br>"
+        "Competitors: %{customdata[3]}<extra></extra>"
+    )
 
     # Summary table
     rows = []
@@ -1,5 +1,7 @@
 import pandas as pd
-import plotly.graph_objects as go
+
+from tool_functions1.FigureBudget import FigureBudget, share_hovertemplate
+from tool_functions1.QueryEngine import current_engine
 
 def compute_cagr_dynamic(start_values: list, end: float, years: list) -> float:
     try:
@@ -17,10 +19,18 @@ def plot_combination_market_breakdown_plotly(
     use_market_filter=True,
     market_type="PRIVATE MARKET",
     use_value=False,
-    group_by_column="Manufacturer"
+    group_by_column="Manufacturer",
+    context=None,
+    budget=None
 ):
+    import plotly.graph_objects as go  # deferred: growth cards in this module don't need plotly
+
     selected_molecule = selected_molecule.strip().upper()
-    df = df.copy()
+    # Only the molecule's own rows are cleaned (and copied)
+    if context is not None:
+        df = context.rows.copy()
+    else:
+        df = df[df["Molecule Combination"].str.upper() == selected_molecule].copy()
     df["Market"] = df["Market"].astype(str).str.strip().str.upper()
 
     # --- Clean & numericize ---
@@ -64,8 +74,9 @@ def plot_combination_market_breakdown_plotly(
     )
 
     # --- Aggregate data ---
-    grouped_units = mol_df.groupby(group_by_column)[col_units].sum()
-    grouped_values = mol_df.groupby(group_by_column)[col_value].sum()
+    grouped = current_engine().group_sum(mol_df, group_by_column, col_units + col_value)
+    grouped_units = grouped[col_units]
+    grouped_values = grouped[col_value]
 
     # filter and sort
     grouped_units = grouped_units[grouped_units.sum(axis=1) > 0]
@@ -78,30 +89,39 @@ def plot_combination_market_breakdown_plotly(
     grouped_units = grouped_units.loc[exporters]
     grouped_values = grouped_values.loc[exporters]
 
-    # --- Plotly figure ---
+    # --- Plotly figure (tail folded into "Other", one shared hovertemplate) ---
+    budget = budget or FigureBudget()
     fig = go.Figure()
     total_vals = grouped_values.sum(axis=0).values
     total_units = grouped_units.sum(axis=0).values
 
-    for grp in exporters:
-        y_vals = grouped_values.loc[grp].values if use_value else grouped_units.loc[grp].values
+    both = grouped_units.join(grouped_values)
+    both, n_folded = budget.fold(both, by="2024 LC Value" if use_value else "2024 Units")
+    fig_units, fig_values = both[col_units], both[col_value]
+    if n_folded:
+        product_map = {**product_map, budget.other_label: f"{n_folded} more {group_by_column.lower()}s"}
+
+    cagr_years = [2021, 2022, 2023, 2024]
+    unit_cagr = fig_units.apply(
+        lambda r: round(compute_cagr_dynamic([r[f"{y} Units"] for y in cagr_years[:-1]], r["2024 Units"], cagr_years), 1), axis=1
+    )
+    value_cagr = fig_values.apply(
+        lambda r: round(compute_cagr_dynamic([r[f"{y} LC Value"] for y in cagr_years[:-1]], r["2024 LC Value"], cagr_years), 1), axis=1
+    )
+
+    for grp in both.index:
+        u_vals = fig_units.loc[grp].values
+        v_vals = fig_values.loc[grp].values
+        y_vals = v_vals if use_value else u_vals
         shares = (y_vals / (total_vals if use_value else total_units) * 100).round(1)
-        hover = [
-            f"Year: {years[i]}<br>"
-            f"{group_by_column}: {grp}<br>"
-            f"Product: {product_map.get(grp, '')}<br>"
-            f"Units: {grouped_units.loc[grp, f'{years[i]} Units']:,}<br>"
-            f"Value: {grouped_values.loc[grp, f'{years[i]} LC Value']:,}<br>"
-            f"Market Share: {shares[i]:.1f}%<br>"
-            f"Units CAGR: {round(compute_cagr_dynamic([grouped_units.loc[grp, f'{y} Units'] for y in [2021, 2022, 2023]], grouped_units.loc[grp, '2024 Units'], [2021, 2022, 2023, 2024]), 1):.1f}%<br>"
-            f"Value CAGR: {round(compute_cagr_dynamic([grouped_values.loc[grp, f'{y} LC Value'] for y in [2021, 2022, 2023]], grouped_values.loc[grp, '2024 LC Value'], [2021, 2022, 2023, 2024]), 1):.1f}%<extra></extra>"
-            for i in range(len(years))
-        ]
         fig.add_trace(go.Bar(
             name=str(grp),
             x=years,
             y=y_vals,
-            hovertemplate=hover
+            customdata=[
+                [product_map.get(grp, ''), u_vals[i], v_vals[i], shares[i], unit_cagr[grp], value_cagr[grp]]
+                for i in range(len(years))
+            ]
         ))
 
     fig.update_layout(
@@ -113,6 +133,17 @@ def plot_combination_market_breakdown_plotly(
         height=600,
         template="plotly_white"
     )
+    share_hovertemplate(
+        fig, "bar",
+        "Year: %{x}<br>"
+        f"{group_by_column}: " + "%{fullData.name}<br>"
+        "Product: %{customdata[0]}<br>"
+        "Units: %{customdata[1]:,}<br>"
+        "Value: %{customdata[2]:,}<br>"
+        "Market Share: %{customdata[3]:.1f}%<br>"
+        "Units CAGR: %{customdata[4]:.1f}%<br>"
+        "Value CAGR: %{customdata[5]:.1f}%<extra></extra>"
+    )
 
     # Add annotation for total 2024 value
     total_2024_value = grouped_values["2024 LC Value"].sum()
@@ -151,12 +182,15 @@ def plot_combination_market_breakdown_plotly(
 
     return fig, summary_df
 
-def generate_growth_by_column_card(df, combo, group_col, start_year=2021, end_year=2024):
+def generate_growth_by_column_card(df, combo, group_col, start_year=2021, end_year=2024, context=None):
     """
     Generates a mini growth summary card by NFC3 or Strength for a given molecule combination.
     """
     # Filter to selected molecule
-    mol_df = df[df["Molecule Combination"].str.upper() == combo.upper()].copy()
+    if context is not None:
+        mol_df = context.rows.copy()
+    else:
+        mol_df = df[df["Molecule Combination"].str.upper() == combo.upper()].copy()
 
     # Clean and parse values
     for year in [start_year, end_year]:
@@ -167,13 +201,10 @@ def generate_growth_by_column_card(df, combo, group_col, start_year=2021, end_ye
             ).fillna(0)
 
     # Compute aggregates
-    grouped = (
-        mol_df.groupby(group_col)[
-            [f"{start_year} Units", f"{end_year} Units", f"{start_year} LC Value", f"{end_year} LC Value"]
-        ]
-        .sum()
-        .reset_index()
-    )
+    grouped = current_engine().group_sum(
+        mol_df, group_col,
+        [f"{start_year} Units", f"{end_year} Units", f"{start_year} LC Value", f"{end_year} LC Value"],
+    ).reset_index()
 
     total_2024_value = grouped[f"{end_year} LC Value"].sum()
     grouped["Value %"] = grouped[f"{end_year} LC Value"] / (total_2024_value or 1) * 100
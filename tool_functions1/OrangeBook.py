@@ -1,73 +1,118 @@
 import pandas as pd
 import streamlit as st
 
-def display_patent_summary(products_df, patents_df, exclusivity_df, ingredient_name):
+OB_KEYS = ["Appl_No", "Product_No"]
+OB_DATE_FORMAT = "%b %d, %Y"   # e.g. "Aug 24, 2026"
+
+
+def parse_ob_dates(series):
+    """
+    Parses Orange Book text dates with the fixed FDA format (no per-value inference).
+    """
+    return pd.to_datetime(series, format=OB_DATE_FORMAT, errors="coerce")
+
+
+def _sorted_unique(values):
+    return sorted(set(v for v in values if pd.notna(v)))
+
+
+def build_product_regulatory_table(patents_df, exclusivity_df):
+    """
+    One row per NDA product (Appl_No, Product_No) with its patent and
+    exclusivity lists, min/max expiry dates, and use-code / delist flags.
+
+    Each source is aggregated on its own and the two results are joined 1:1,
+    so products with many patents and exclusivity codes never build the
+    patents × exclusivities cartesian join.
+    """
+    pat = patents_df[OB_KEYS + ["Patent_No", "Patent_Expire_Date_Text", "Patent_Use_Code", "Delist_Flag"]].copy()
+    pat["Patent_Date"] = parse_ob_dates(pat["Patent_Expire_Date_Text"])
+    pat["Has_Use_Code"] = pat["Patent_Use_Code"].notna()
+    pat["Delisted"] = pat["Delist_Flag"].astype(str).str.strip().str.upper() == "Y"
+    pat_agg = pat.groupby(OB_KEYS).agg(
+        Patents=("Patent_No", _sorted_unique),
+        Patent_Dates=("Patent_Date", _sorted_unique),
+        Patent_Min=("Patent_Date", "min"),
+        Patent_Max=("Patent_Date", "max"),
+        Use_Codes=("Patent_Use_Code", _sorted_unique),
+        Has_Use_Code=("Has_Use_Code", "any"),
+        Any_Delisted=("Delisted", "any"),
+    )
+
+    exc = exclusivity_df[OB_KEYS + ["Exclusivity_Code", "Exclusivity_Date"]].copy()
+    exc["Exclusivity_Date"] = parse_ob_dates(exc["Exclusivity_Date"])
+    exc_agg = exc.groupby(OB_KEYS).agg(
+        Exclusivities=("Exclusivity_Code", _sorted_unique),
+        Exclusivity_Dates=("Exclusivity_Date", _sorted_unique),
+        Exclusivity_Min=("Exclusivity_Date", "min"),
+        Exclusivity_Max=("Exclusivity_Date", "max"),
+    )
+
+    table = pat_agg.join(exc_agg, how="outer")
+    for col in ["Patents", "Patent_Dates", "Use_Codes", "Exclusivities", "Exclusivity_Dates"]:
+        table[col] = table[col].apply(lambda v: v if isinstance(v, list) else [])
+    for col in ["Has_Use_Code", "Any_Delisted"]:
+        table[col] = table[col].eq(True)
+    table.attrs["dataset"] = "ob_product_table"
+    return table
+
+
+def _fmt_dates(dates):
+    return ", ".join(d.date().isoformat() for d in dates) if dates else "None"
+
+
+def display_patent_summary(products_df, product_table, ingredient_name):
     ingredient_name = ingredient_name.strip().upper()
 
     # Use the cleaned combination field
     df_match = products_df[
         (products_df["Ingredient_Formatted_Clean"] == ingredient_name) &
         (products_df["Appl_Type"] == "N")
-    ].copy()
+    ]
 
     if df_match.empty:
         st.warning(f"❌ No NDA (originator) products found for: `{ingredient_name}`")
         return
 
-    # Merge with patents and exclusivity
-    merged = pd.merge(df_match, patents_df, how="left", on=["Appl_No", "Product_No"])
-    merged = pd.merge(merged, exclusivity_df, how="left", on=["Appl_No", "Product_No"])
-
-    # Convert dates
-    merged["Patent_Expire_Date_Text"] = pd.to_datetime(merged["Patent_Expire_Date_Text"], errors="coerce")
-    merged["Exclusivity_Expire_Date_Text"] = pd.to_datetime(merged["Exclusivity_Date"], errors="coerce")
+    # 1:1 lookup into the pre-aggregated per-product table
+    merged = df_match.join(product_table, on=OB_KEYS, how="left")
+    merged = merged.drop_duplicates(subset=OB_KEYS + ["Trade_Name", "DF;Route", "Applicant", "Strength"])
 
     # Sort for display
-    merged = merged.sort_values(by=["Appl_No", "Product_No"])
+    merged = merged.sort_values(by=OB_KEYS)
 
     st.markdown(f"## 🧪 Orange Book NDA Products for: `{ingredient_name}`")
     st.markdown("=" * 60)
 
-    grouped = merged.groupby(["Appl_No", "Product_No", "Trade_Name", "DF;Route", "Applicant", "Strength"])
-
-    all_patent_dates = []
-    all_exclusivity_dates = []
-
-    for (appl_no, prod_no, trade_name, route, applicant, strength), group in grouped:
-        patent_dates = sorted(group["Patent_Expire_Date_Text"].dropna().unique())
-        exclusivity_dates = sorted(group["Exclusivity_Expire_Date_Text"].dropna().unique())
-
-        all_patent_dates.extend(patent_dates)
-        all_exclusivity_dates.extend(exclusivity_dates)
-
-        patent_str = ", ".join(d.date().isoformat() for d in patent_dates) if patent_dates else "None"
-        exclusivity_str = ", ".join(d.date().isoformat() for d in exclusivity_dates) if exclusivity_dates else "None"
+    for row in merged.to_dict("records"):
+        patent_dates = row["Patent_Dates"] if isinstance(row["Patent_Dates"], list) else []
+        exclusivity_dates = row["Exclusivity_Dates"] if isinstance(row["Exclusivity_Dates"], list) else []
 
         st.markdown(f"---")
-        st.markdown(f"### 💊 Product: `{trade_name}`")
-        st.markdown(f"- 📦 **Dosage Form/Route**: `{route}`")
-        st.markdown(f"- 🧪 **Strength**: `{strength}`")
-        st.markdown(f"- 🏢 **Applicant**: `{applicant}`")
-        st.markdown(f"- 🧾 **Appl No / Product No**: `{appl_no} / {prod_no}`")
-        st.markdown(f"- 🗓️ **Patent Expiry Dates**: `{patent_str}`")
-        st.markdown(f"- 🎖️ **Exclusivity Expiry Dates**: `{exclusivity_str}`")
+        st.markdown(f"### 💊 Product: `{row['Trade_Name']}`")
+        st.markdown(f"- 📦 **Dosage Form/Route**: `{row['DF;Route']}`")
+        st.markdown(f"- 🧪 **Strength**: `{row['Strength']}`")
+        st.markdown(f"- 🏢 **Applicant**: `{row['Applicant']}`")
+        st.markdown(f"- 🧾 **Appl No / Product No**: `{row['Appl_No']} / {row['Product_No']}`")
+        st.markdown(f"- 🗓️ **Patent Expiry Dates**: `{_fmt_dates(patent_dates)}`")
+        st.markdown(f"- 🎖️ **Exclusivity Expiry Dates**: `{_fmt_dates(exclusivity_dates)}`")
 
     # --- Molecule-level Expiry Summary ---
     st.markdown("---")
     st.subheader("📅 Molecule-Level Expiry Summary")
 
-    if all_patent_dates:
-        earliest_patent = min(all_patent_dates).date()
-        latest_patent = max(all_patent_dates).date()
+    if merged["Patent_Min"].notna().any():
+        earliest_patent = merged["Patent_Min"].min().date()
+        latest_patent = merged["Patent_Max"].max().date()
         st.markdown(f"- 🗓️ **Earliest Patent Expiry**: `{earliest_patent}`")
         st.markdown(f"- 🗓️ **Latest Patent Expiry**: `{latest_patent}`")
     else:
         st.markdown("- 🗓️ **Patent Expiry**: `None`")
 
-    if all_exclusivity_dates:
-        earliest_excl = min(all_exclusivity_dates).date()
-        latest_excl = max(all_exclusivity_dates).date()
+    if merged["Exclusivity_Min"].notna().any():
+        earliest_excl = merged["Exclusivity_Min"].min().date()
+        latest_excl = merged["Exclusivity_Max"].max().date()
         st.markdown(f"- 🎖️ **Earliest Exclusivity Expiry**: `{earliest_excl}`")
         st.markdown(f"- 🎖️ **Latest Exclusivity Expiry**: `{latest_excl}`")
     else:
-        st.markdown("- 🎖️ **Exclusivity Expiry**: `None`")
\ No newline at end of file
+        st.markdown("- 🎖️ **Exclusivity Expiry**: `None`")
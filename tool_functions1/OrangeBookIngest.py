@@ -0,0 +1,291 @@
+"""
+Native FDA Orange Book ingestion with incremental monthly updates.
+
+Reads the FDA's tilde-delimited products.txt / patent.txt / exclusivity.txt
+(loose files or the EOB zip), diffs the release against the current store
+(OBproducts.csv / OBpatents.csv / OBexclusivity.csv) by record key, and applies
+only the added, removed and changed records. The per-product regulatory table
+is patched for the touched products only and seeded into the shared cache.
+
+    python -m tool_functions1.OrangeBookIngest path/to/EOBZIP_2025_10.zip
+    python -m tool_functions1.OrangeBookIngest path/to/release_dir --dry-run --report ob_diff.csv
+"""
+import argparse
+import io
+import os
+import zipfile
+
+import pandas as pd
+
+from tool_functions1.DataLoader import OB_PRODUCTS_PATH, OB_PATENTS_PATH, OB_EXCLUSIVITY_PATH
+
+# ─── 1/ Release layout ──────────────────────────────────────────────────────────
+FDA_FILES = {
+    "products":    "products.txt",
+    "patents":     "patent.txt",
+    "exclusivity": "exclusivity.txt",
+}
+
+STORE_PATHS = {
+    "products":    OB_PRODUCTS_PATH,
+    "patents":     OB_PATENTS_PATH,
+    "exclusivity": OB_EXCLUSIVITY_PATH,
+}
+
+# Record keys: a patent is listed once per use code, an exclusivity once per code
+RECORD_KEYS = {
+    "products":    ["Appl_Type", "Appl_No", "Product_No"],
+    "patents":     ["Appl_Type", "Appl_No", "Product_No", "Patent_No", "Patent_Use_Code"],
+    "exclusivity": ["Appl_Type", "Appl_No", "Product_No", "Exclusivity_Code"],
+}
+
+PRODUCT_KEYS = ["Appl_No", "Product_No"]
+
+
+def _normalize(df):
+    """
+    All-text frame with trimmed values and '' for blanks, so keys compare
+    exactly (zero-padded Appl_No / Product_No stay as in the FDA files).
+    """
+    df = df.copy()
+    df.columns = df.columns.str.replace("\ufeff", "", regex=False).str.strip()
+    for col in df.columns:
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    return df
+
+
+def _read_fda_table(buffer):
+    return _normalize(pd.read_csv(buffer, sep="~", dtype=str, keep_default_na=False, encoding="utf-8-sig"))
+
+
+def read_fda_release(source):
+    """
+    Reads an FDA Orange Book release (zip file or directory with the .txt files).
+    Returns {"products": df, "patents": df, "exclusivity": df}.
+    """
+    tables = {}
+    if os.path.isdir(source):
+        for name, filename in FDA_FILES.items():
+            tables[name] = _read_fda_table(os.path.join(source, filename))
+        return tables
+
+    with zipfile.ZipFile(source) as zf:
+        members = {os.path.basename(m).lower(): m for m in zf.namelist()}
+        for name, filename in FDA_FILES.items():
+            if filename not in members:
+                raise FileNotFoundError(f"{filename} not found in {source}")
+            with zf.open(members[filename]) as f:
+                tables[name] = _read_fda_table(io.TextIOWrapper(f, encoding="utf-8-sig"))
+    return tables
+
+
+def read_store(paths=None):
+    """
+    Current store as all-text frames (empty frames when a file does not exist yet).
+    """
+    paths = paths or STORE_PATHS
+    tables = {}
+    for name, path in paths.items():
+        if os.path.exists(path):
+            tables[name] = _normalize(pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig"))
+        else:
+            tables[name] = pd.DataFrame(columns=RECORD_KEYS[name])
+    return tables
+
+
+# ─── 2/ Keyed diff ──────────────────────────────────────────────────────────────
+def diff_table(old, new, keys):
+    """
+    Returns {"added", "removed", "changed"} frames between two versions of a
+    table, matching records on `keys`. `changed` holds the new values.
+    """
+    old = old.drop_duplicates(subset=keys, keep="last")
+    new = new.drop_duplicates(subset=keys, keep="last")
+    value_cols = [c for c in new.columns if c not in keys and c in old.columns]
+
+    merged = old.merge(new, on=keys, how="outer", suffixes=("_old", ""), indicator=True)
+    added = merged[merged["_merge"] == "right_only"]
+    removed = merged[merged["_merge"] == "left_only"]
+    both = merged[merged["_merge"] == "both"]
+
+    if value_cols:
+        differs = pd.Series(False, index=both.index)
+        for col in value_cols:
+            differs |= both[col].fillna("") != both[f"{col}_old"].fillna("")
+        changed = both[differs]
+    else:
+        changed = both.iloc[0:0]
+
+    removed = removed[keys + [f"{c}_old" for c in value_cols]].rename(columns=lambda c: c[:-4] if c.endswith("_old") else c)
+    return {
+        "added":   added[new.columns].reset_index(drop=True),
+        "removed": removed.reset_index(drop=True),
+        "changed": changed[new.columns].reset_index(drop=True),
+    }
+
+
+def diff_release(store, release):
+    return {name: diff_table(store[name], release[name], RECORD_KEYS[name]) for name in RECORD_KEYS}
+
+
+def apply_diff(old, diff, keys):
+    """
+    Applies a keyed diff to a table: drops removed and changed records, then
+    appends added and changed ones. Duplicate keys in `old` collapse to the
+    last record, as in `diff_table`.
+    """
+    old = old.drop_duplicates(subset=keys, keep="last")
+    drop = pd.concat([diff["removed"][keys], diff["changed"][keys]], ignore_index=True)
+    if not drop.empty:
+        marker = drop.drop_duplicates().assign(_drop=True)
+        old = old.merge(marker, on=keys, how="left")
+        old = old[old["_drop"].isna()].drop(columns="_drop")
+    parts = [old, diff["added"], diff["changed"]]
+    return pd.concat([p for p in parts if not p.empty], ignore_index=True)
+
+
+def touched_products(diffs):
+    """
+    (Appl_No, Product_No) pairs whose patents or exclusivities changed.
+    """
+    frames = [
+        part[PRODUCT_KEYS]
+        for name in ("patents", "exclusivity")
+        for part in diffs[name].values()
+        if not part.empty
+    ]
+    if not frames:
+        return pd.DataFrame(columns=PRODUCT_KEYS)
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def diff_summary(diffs):
+    return pd.DataFrame([
+        {"table": name, "added": len(d["added"]), "removed": len(d["removed"]), "changed": len(d["changed"])}
+        for name, d in diffs.items()
+    ])
+
+
+def diff_report(diffs):
+    """
+    Long-format report of every changed record, tagged with table and change type.
+    """
+    rows = []
+    for name, d in diffs.items():
+        for change, frame in d.items():
+            if not frame.empty:
+                rows.append(frame.assign(table=name, change=change))
+    if not rows:
+        return pd.DataFrame(columns=["table", "change"])
+    report = pd.concat(rows, ignore_index=True)
+    return report[["table", "change"] + [c for c in report.columns if c not in ("table", "change")]]
+
+
+# ─── 3/ Store update ────────────────────────────────────────────────────────────
+def _write_atomic(df, path):
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def patch_product_table(table, patents, exclusivity, touched):
+    """
+    Rebuilds the per-product regulatory rows for `touched` products only and
+    splices them into an existing table from `build_product_regulatory_table`.
+    """
+    from tool_functions1.OrangeBook import build_product_regulatory_table
+
+    if touched.empty:
+        return table
+    touched_idx = pd.MultiIndex.from_frame(touched.astype({c: table.index.get_level_values(c).dtype for c in PRODUCT_KEYS}))
+    keep = table[~table.index.isin(touched_idx)]
+
+    def _subset(df):
+        idx = pd.MultiIndex.from_frame(df[PRODUCT_KEYS])
+        return df[idx.isin(touched_idx)]
+
+    fresh = build_product_regulatory_table(_subset(patents), _subset(exclusivity))
+    patched = pd.concat([keep, fresh]).sort_index()
+    patched.attrs["dataset"] = "ob_product_table"
+    return patched
+
+
+def ingest_release(source, store_paths=None, dry_run=False, cache=None, log=print):
+    """
+    Diffs an FDA release against the store and applies it incrementally.
+    Returns the per-table diffs. Nothing is written when there are no changes
+    or with `dry_run=True`.
+    """
+    store_paths = store_paths or STORE_PATHS
+    release = read_fda_release(source)
+    store = read_store(store_paths)
+    diffs = diff_release(store, release)
+    log(diff_summary(diffs).to_string(index=False))
+
+    if dry_run or all(len(part) == 0 for d in diffs.values() for part in d.values()):
+        return diffs
+
+    if cache is not None:
+        from tool_functions1.DataRegistry import registry
+        old_version = registry.version()
+
+    for name, path in store_paths.items():
+        if any(len(part) for part in diffs[name].values()):
+            updated = apply_diff(store[name], diffs[name], RECORD_KEYS[name])
+            # Keep the release's column order so the CSVs stay FDA-shaped
+            cols = list(release[name].columns) + [c for c in updated.columns if c not in release[name].columns]
+            _write_atomic(updated[cols], path)
+            log(f"updated {path} ({len(updated)} rows)")
+
+    if cache is not None:
+        _seed_product_table(cache, diffs, old_version, log)
+    return diffs
+
+
+def _seed_product_table(cache, diffs, old_version, log):
+    """
+    Patches the cached per-product table from the previous dataset version and
+    stores it under the new version, so workers skip the full rebuild.
+    """
+    from tool_functions1.DataLoader import read_orange_book
+    from tool_functions1.DataRegistry import registry
+    from tool_functions1.DiskCache import call_key, key_prefix
+    from tool_functions1.OrangeBook import build_product_regulatory_table
+    from tool_functions1.SharedFrame import freeze_frames
+
+    new_version, _ = registry.refresh()
+    # Frozen like the app's sources, so the entry is stored under the key the app looks up
+    products, patents, exclusivity = freeze_frames(read_orange_book())
+    key = call_key(build_product_regulatory_table, (patents, exclusivity))
+
+    # Previous table: the cached entry for this function (same code) from the old version
+    previous = None
+    for candidate in cache.keys_like(key_prefix(build_product_regulatory_table), old_version):
+        hit, previous = cache.get(candidate, old_version)
+        if hit:
+            break
+
+    touched = touched_products(diffs)
+    if previous is not None:
+        table = patch_product_table(previous, patents, exclusivity, touched)
+        log(f"patched product table for {len(touched)} products")
+    else:
+        table = build_product_regulatory_table(patents, exclusivity)
+        log("no cached product table for the previous version, rebuilt in full")
+    cache.set(key, new_version, table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest an FDA Orange Book release into the local store.")
+    parser.add_argument("source", help="EOB zip file or folder with products.txt, patent.txt, exclusivity.txt")
+    parser.add_argument("--dry-run", action="store_true", help="only print the diff")
+    parser.add_argument("--report", default=None, help="write every added/removed/changed record to this CSV")
+    parser.add_argument("--no-cache", action="store_true", help="do not seed the shared disk cache")
+    opts = parser.parse_args()
+
+    from tool_functions1.DiskCache import DiskCache
+
+    diffs = ingest_release(opts.source, dry_run=opts.dry_run, cache=None if opts.no_cache or opts.dry_run else DiskCache())
+    if opts.report:
+        diff_report(diffs).to_csv(opts.report, index=False)
+        print(f"wrote {opts.report}")
@@ -15,87 +15,143 @@ def compute_cagr(start, end, years=4):
     except:
         return 0
 
-def generate_combination_first_clean_summary(df, molecule_name):
+PRODUCT_KEYS = ["Molecule Combination", "Product", "Manufacturer", "Molecule Combination Type"]
+PACK_KEYS = PRODUCT_KEYS + ["Pack", "Retail Price", "NFC3"]
+
+
+def _share(part, whole):
+    return part / whole.where(whole != 0) * 100
+
+
+def build_pack_breakdown(df, molecule_name, context=None):
+    """
+    Combination → product → pack tables for one molecule, from a single
+    grouped pass at pack level that is then rolled up.
+
+    Returns {"molecule", "cagr", "combinations", "products", "packs"} or None
+    when the molecule has no rows.
+    """
     molecule_name = molecule_name.strip().upper()
-    mol_df = df[df["Molecule Combination"].str.upper() == molecule_name].copy()
+    if context is not None:
+        mol_df = context.rows.copy()
+    else:
+        mol_df = df[df["Molecule Combination"].str.upper() == molecule_name].copy()
     if mol_df.empty:
-        st.warning(f"No data found for molecule: {molecule_name}")
-        return
+        return None
 
     for col in ["2021 Units", "2024 Units", "2021 LC Value", "2024 LC Value", "Retail Price"]:
         if col in mol_df.columns:
             mol_df[col] = pd.to_numeric(mol_df[col], errors='coerce').fillna(0)
 
+    market = mol_df["Market"].astype(str).str.strip().str.upper()
     mol_df["Pack Value 2024"] = mol_df["Retail Price"] * mol_df["2024 Units"]
-    mol_df["Pack Value 2021"] = mol_df["Retail Price"] * mol_df["2021 Units"]
+    mol_df["LPO Units"] = mol_df["2024 Units"].where(market == "LPO", 0)
+    mol_df["Private Units"] = mol_df["2024 Units"].where(market == "PRIVATE MARKET", 0)
 
+    # Mono vs. combo CAGR header
     mono_mask = mol_df["Molecule Combination Type"].str.upper() == "MONO"
-    combi_mask = ~mono_mask
-
-    def _agg_cagr(df_, col_21, col_24):
-        return compute_cagr(df_[col_21].sum(), df_[col_24].sum())
-
-    mono_units_cagr = _agg_cagr(mol_df[mono_mask], "2021 Units", "2024 Units")
-    combi_units_cagr = _agg_cagr(mol_df[combi_mask], "2021 Units", "2024 Units")
-    mono_value_cagr = _agg_cagr(mol_df[mono_mask], "2021 LC Value", "2024 LC Value")
-    combi_value_cagr = _agg_cagr(mol_df[combi_mask], "2021 LC Value", "2024 LC Value")
+    cagr = {}
+    for label, part in (("Mono", mol_df[mono_mask]), ("Combo", mol_df[~mono_mask])):
+        cagr[label] = {
+            "units": compute_cagr(part["2021 Units"].sum(), part["2024 Units"].sum()),
+            "value": compute_cagr(part["2021 LC Value"].sum(), part["2024 LC Value"].sum()),
+        }
+
+    sums = ["2021 Units", "2024 Units", "2021 LC Value", "2024 LC Value", "Pack Value 2024", "LPO Units", "Private Units"]
+    packs = mol_df.groupby(PACK_KEYS, dropna=False)[sums].sum()
+    products = packs.groupby(level=PRODUCT_KEYS, dropna=False).sum()
+    combos = products.groupby(level="Molecule Combination").sum()
+
+    total_units = combos["2024 Units"].sum()
+    total_value = combos["Pack Value 2024"].sum()
+
+    combo_table = pd.DataFrame({
+        "Units Share (%)": combos["2024 Units"] / (total_units or 1) * 100,
+        "Value Share (%)": combos["Pack Value 2024"] / (total_value or 1) * 100,
+        "Units CAGR (%)": [compute_cagr(a, b) for a, b in zip(combos["2021 Units"], combos["2024 Units"])],
+        "Value CAGR (%)": [compute_cagr(a, b) for a, b in zip(combos["2021 LC Value"], combos["2024 LC Value"])],
+        "Competitors": mol_df.groupby("Molecule Combination")["Manufacturer"].nunique(),
+    })
+
+    if context is not None:
+        product_molecules = context.product_molecules
+    else:
+        product_molecules = (
+            df.loc[df["Product"].isin(mol_df["Product"].unique()), ["Product", "Molecule"]]
+              .dropna().drop_duplicates().groupby("Product")["Molecule"].apply(list).to_dict()
+        )
+
+    def shared_note(product):
+        shared = [m for m in product_molecules.get(product, []) if m.upper() != molecule_name]
+        return ", ".join(shared) if shared else "Mono-molecule Product"
+
+    product_table = pd.DataFrame({
+        "Units 2024": products["2024 Units"],
+        "Value 2024 (AED)": products["Pack Value 2024"],
+        "Units Share (%)": products["2024 Units"] / (total_units or 1) * 100,
+        "Value Share (%)": products["Pack Value 2024"] / (total_value or 1) * 100,
+        "LPO (%)": _share(products["LPO Units"], products["2024 Units"]).fillna(0),
+        "Private (%)": _share(products["Private Units"], products["2024 Units"]).fillna(0),
+        "Packs": packs.groupby(level=PRODUCT_KEYS, dropna=False).size(),
+    }).reset_index()
+    product_table["Shared Molecule(s)"] = product_table["Product"].map(shared_note)
+    product_table = product_table.sort_values("Units 2024", ascending=False).reset_index(drop=True)
+
+    product_units = products["2024 Units"].reindex(packs.index.droplevel(["Pack", "Retail Price", "NFC3"])).to_numpy()
+    pack_table = pd.DataFrame({
+        "Units 2024": packs["2024 Units"],
+        "% of Product": packs["2024 Units"] / pd.Series(product_units, index=packs.index).replace(0, 1) * 100,
+        "LPO (%)": _share(packs["LPO Units"], packs["2024 Units"]).fillna(0),
+        "Private (%)": _share(packs["Private Units"], packs["2024 Units"]).fillna(0),
+    }).reset_index()
+    pack_table["NFC3"] = pack_table["NFC3"].fillna("NFC3: Unknown")
+
+    return {
+        "molecule": molecule_name,
+        "cagr": cagr,
+        "combinations": combo_table.round(2),
+        "products": product_table.round(2),
+        "packs": pack_table.round(2),
+    }
+
+
+def render_pack_breakdown(breakdown, page_size=25, key="packs"):
+    """
+    Renders a `build_pack_breakdown` result as a few bounded tables: the
+    product table is paginated and pack detail is shown for one product.
+    """
+    if breakdown is None:
+        st.warning("No data found for this molecule.")
+        return
 
-    st.markdown(f"## 📦 Product & Pack Breakdown for `{molecule_name}`")
+    cagr = breakdown["cagr"]
+    st.markdown(f"## 📦 Product & Pack Breakdown for `{breakdown['molecule']}`")
     st.markdown(f"### 📈 Mono vs. Combo CAGR (2021 → 2024)")
-    st.markdown(f"- **Mono**: Units CAGR = `{safe_fmt(mono_units_cagr)}%`, Value CAGR = `{safe_fmt(mono_value_cagr)}%`")
-    st.markdown(f"- **Combo**: Units CAGR = `{safe_fmt(combi_units_cagr)}%`, Value CAGR = `{safe_fmt(combi_value_cagr)}%`")
-
-    total_units = mol_df["2024 Units"].sum()
-    total_value = mol_df["Pack Value 2024"].sum()
-    
-    for combo, combo_df in mol_df.groupby("Molecule Combination"):
-        combo_units = combo_df["2024 Units"].sum()
-        combo_value = combo_df["Pack Value 2024"].sum()
-        unit_pct = combo_units / (total_units or 1) * 100
-        value_pct = combo_value / (total_value or 1) * 100
-
-        units_cagr = compute_cagr(combo_df["2021 Units"].sum(), combo_df["2024 Units"].sum())
-        value_cagr = compute_cagr(combo_df["2021 LC Value"].sum(), combo_df["2024 LC Value"].sum())
-
-        st.markdown(f"---\n### 🔗 Combination: `{combo}`")
-        st.markdown(f"- 💊 Units Share: `{safe_fmt(unit_pct)}%`, 💰 Value Share: `{safe_fmt(value_pct)}%`")
-        st.markdown(f"- 🚀 CAGR: Units = `{safe_fmt(units_cagr)}%`, Value = `{safe_fmt(value_cagr)}%`")
-        st.markdown(f"- 🏭 Competitors: `{combo_df['Manufacturer'].nunique()}`")
-
-        for (product, manufacturer, combo_type), prod_df in combo_df.groupby(["Product", "Manufacturer", "Molecule Combination Type"]):
-            prod_units = prod_df["2024 Units"].sum()
-            prod_value = prod_df["Pack Value 2024"].sum()
-            prod_unit_pct = prod_units / (total_units or 1) * 100
-            prod_value_pct = prod_value / (total_value or 1) * 100
-
-            st.markdown(f"#### 📌 Product: `{product}` by `{manufacturer}` ({combo_type})")
-            st.markdown(f"- 📦 Units: `{safe_fmt(prod_units, '{:,.0f}')}`, 💰 Value: AED `{safe_fmt(prod_value, '{:,.0f}')}`")
-            st.markdown(f"- 🌍 Share of Molecule: `{safe_fmt(prod_unit_pct)}%` units, `{safe_fmt(prod_value_pct)}%` value")
-
-            lpo_units = prod_df[prod_df["Market"] == "LPO"]["2024 Units"].sum()
-            private_units = prod_df[prod_df["Market"] == "PRIVATE MARKET"]["2024 Units"].sum()
-            lpo_pct = lpo_units / (prod_units or 1) * 100
-            private_pct = private_units / (prod_units or 1) * 100
-            st.markdown(f"- 🏪 Market Split: LPO = `{safe_fmt(lpo_pct)}%`, Private = `{safe_fmt(private_pct)}%`")
-
-            shared_molecules = df[df["Product"] == product]["Molecule"].dropna().unique().tolist()
-            shared_molecules = [m for m in shared_molecules if m.upper() != molecule_name]
-            shared_note = ", ".join(shared_molecules) if shared_molecules else "Mono-molecule Product"
-            st.markdown(f"- 🔄 Shared Molecule(s): {shared_note}")
-
-            total_prod_units = prod_df["2024 Units"].sum()
-
-            for (pack, price, nfc3), pack_df in prod_df.groupby(["Pack", "Retail Price", "NFC3"]):
-                pack_units = pack_df["2024 Units"].sum()
-                lpo_pack_units = pack_df[pack_df["Market"] == "LPO"]["2024 Units"].sum()
-                private_pack_units = pack_df[pack_df["Market"] == "PRIVATE MARKET"]["2024 Units"].sum()
-                
-                lpo_pack_pct = lpo_pack_units / (pack_units or 1) * 100
-                private_pack_pct = private_pack_units / (pack_units or 1) * 100
-                within_product_pct = pack_units / (total_prod_units or 1) * 100
-
-                st.markdown(
-                    f"• `{pack}` — AED `{safe_fmt(price)}` — {safe_fmt(pack_units, '{:,.0f}')} units "
-                    f"(**{safe_fmt(within_product_pct)}% of product**) | "
-                    f"LPO: `{safe_fmt(lpo_pack_pct)}%`, Private: `{safe_fmt(private_pack_pct)}%` — {nfc3 or 'NFC3: Unknown'}"
-                )
\ No newline at end of file
+    st.markdown(f"- **Mono**: Units CAGR = `{safe_fmt(cagr['Mono']['units'])}%`, Value CAGR = `{safe_fmt(cagr['Mono']['value'])}%`")
+    st.markdown(f"- **Combo**: Units CAGR = `{safe_fmt(cagr['Combo']['units'])}%`, Value CAGR = `{safe_fmt(cagr['Combo']['value'])}%`")
+    st.dataframe(breakdown["combinations"], use_container_width=True)
+
+    products = breakdown["products"]
+    n_pages = max(1, -(-len(products) // page_size))
+    st.markdown(f"### 📌 Products ({len(products):,})")
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, key=f"{key}_page") if n_pages > 1 else 1
+    page_rows = products.iloc[(page - 1) * page_size: page * page_size]
+    st.dataframe(page_rows, use_container_width=True, hide_index=True)
+    if n_pages > 1:
+        st.caption(f"Page {page} of {n_pages}")
+
+    labels = [f"{r.Product} — {r.Manufacturer}" for r in page_rows[["Product", "Manufacturer"]].itertuples()]
+    choice = st.selectbox("📦 Pack detail for:", labels, key=f"{key}_product")
+    if choice is not None:
+        row = page_rows.iloc[labels.index(choice)]
+        packs = breakdown["packs"]
+        mask = (packs["Product"] == row["Product"]) & (packs["Manufacturer"] == row["Manufacturer"])
+        st.dataframe(
+            packs.loc[mask, ["Pack", "Retail Price", "NFC3", "Units 2024", "% of Product", "LPO (%)", "Private (%)"]],
+            use_container_width=True,
+            hide_index=True
+        )
+
+
+def generate_combination_first_clean_summary(df, molecule_name, context=None):
+    render_pack_breakdown(build_pack_breakdown(df, molecule_name, context=context))
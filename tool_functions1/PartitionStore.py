@@ -0,0 +1,298 @@
+import json
+import os
+import shutil
+from collections import namedtuple
+from urllib.parse import quote
+
+import pandas as pd
+
+from tool_functions1.ArrowStore import arrow_available, frame_to_table, pa, table_to_frame
+from tool_functions1.DataLoader import MASTER_PATH
+from tool_functions1.DataRegistry import registry
+from tool_functions1.DiskCache import code_version
+from tool_functions1.MasterIngest import CHUNK_ROWS, _widen, arrow_schema, iter_master_chunks, scan_master
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # optional, like the Arrow store itself
+    pc = ds = None
+
+DEFAULT_PARTITION_ROOT = os.path.join(".cache", "partitions")
+# "COUNTRY:RELEASE=path;..."; unset = the single UAE file, unpartitioned
+SOURCES_SPEC = os.environ.get("PHARMAI_MASTER_SOURCES", "")
+PARTITION_ATC1 = os.environ.get("PHARMAI_PARTITION_ATC1", "1") != "0"
+DEFAULT_COUNTRY = os.environ.get("PHARMAI_COUNTRY", "UAE")
+
+ROW_COLUMN = "__row"            # master order across partitions; never leaves the store
+NULL_PART = "__null__"
+
+MasterSource = namedtuple("MasterSource", ["country", "release", "path"])
+
+
+# ─── 1/ Sources ─────────────────────────────────────────────────────────────────
+def parse_sources(spec):
+    """
+    "UAE:2025=MasterData2025.csv;KSA:2025=MasterDataKSA2025.csv" → sources.
+    """
+    sources = []
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        key, _, path = item.partition("=")
+        country, _, release = key.partition(":")
+        if not (country and release and path):
+            raise ValueError(f"bad master source {item!r}; expected COUNTRY:RELEASE=path")
+        sources.append(MasterSource(country.strip().upper(), release.strip(), path.strip()))
+    return sources
+
+
+def master_sources(spec=SOURCES_SPEC):
+    return parse_sources(spec) if spec else [MasterSource("UAE", "2025", MASTER_PATH)]
+
+
+def partitioning_enabled(spec=SOURCES_SPEC):
+    return bool(spec) and arrow_available() and ds is not None
+
+
+def register_sources(sources):
+    """
+    Fingerprints every source file, so a new release invalidates caches like
+    an edited MasterData2025.csv does.
+    """
+    for source in sources:
+        if source.path != MASTER_PATH:
+            registry.register(f"master:{source.country}:{source.release}", source.path)
+
+
+def partition_key(country, release):
+    return f"{country}:{release}"
+
+
+def default_partition(catalog, country=DEFAULT_COUNTRY, release=None):
+    """
+    (country, release) to serve when none is chosen: `country` (or the first
+    one in the catalog) at its latest release.
+    """
+    countries = catalog.countries()
+    country = country if country in countries else countries[0]
+    releases = catalog.releases(country)
+    return country, release if release in releases else releases[0]
+
+
+register_sources(master_sources())
+
+
+# ─── 2/ Catalog ─────────────────────────────────────────────────────────────────
+class Catalog:
+    """
+    The partitions written for one dataset version: country, release, ATC1,
+    file, rows, bytes and the combinations inside. `select` prunes by those
+    before any file is opened.
+    """
+
+    def __init__(self, root, entries):
+        self.root = root
+        self.columns = entries["columns"]
+        self.partitions = entries["partitions"]
+
+    @classmethod
+    def load(cls, root):
+        with open(os.path.join(root, "catalog.json"), encoding="utf-8") as f:
+            return cls(root, json.load(f))
+
+    def countries(self):
+        return sorted({p["country"] for p in self.partitions})
+
+    def releases(self, country):
+        """
+        Releases of `country`, latest first.
+        """
+        return sorted({p["release"] for p in self.partitions if p["country"] == country}, reverse=True)
+
+    def select(self, country=None, release=None, atc1=None, combinations=None, atc4=None):
+        """
+        Partitions that can hold matching rows: country, release and ATC1
+        must match, and the partition must list one of `combinations` or one
+        of the `atc4` classes when either is given. Partitions written without
+        an ATC1 split (`atc1` None) hold every class; the scan filters those.
+        """
+        chosen = []
+        for part in self.partitions:
+            if country is not None and part["country"] != country:
+                continue
+            if release is not None and part["release"] != release:
+                continue
+            if atc1 is not None and part["atc1"] is not None and part["atc1"] not in atc1:
+                continue
+            if (combinations or atc4) and not (
+                set(combinations or ()) & set(part["combinations"]) or set(atc4 or ()) & set(part["atc4"])
+            ):
+                continue
+            chosen.append(part)
+        return chosen
+
+    def summary(self):
+        frame = pd.DataFrame(self.partitions).drop(columns=["combinations", "atc4", "path"])
+        return frame.groupby(["country", "release"], as_index=False)[["rows", "bytes"]].sum()
+
+
+# ─── 3/ Partitioned store ───────────────────────────────────────────────────────
+class PartitionedStore:
+    """
+    Master rows from every country and release as Arrow IPC files, one per
+    country / release / ATC1 (`by_atc1=False`: one per country and release),
+    under `<root>/<version>-<code>/` (code as in `ArrowStore`, so changed
+    ingest or normalization code rebuilds it), plus a `catalog.json`. Built chunk by chunk
+    (two passes per source, as `MasterIngest` does) into a temp directory
+    that is renamed into place, so workers never see half a store.
+
+    `scan` reads only the partitions the catalog selects and pushes the
+    remaining ATC / combination filters into the Arrow scan, so a UAE view
+    never opens or materializes Saudi or Kuwaiti rows.
+    """
+
+    def __init__(self, root=DEFAULT_PARTITION_ROOT, by_atc1=PARTITION_ATC1, code=None):
+        self.root = root
+        self.by_atc1 = by_atc1
+        self.code = code or code_version(__name__)
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.root, f"{version}-{self.code}")
+
+    def catalog(self, version):
+        """
+        The catalog for `version`, or None when it has not been built.
+        """
+        try:
+            return Catalog.load(self.path(version))
+        except FileNotFoundError:
+            return None
+
+    def _partition_path(self, source, atc1):
+        parts = [f"country={quote(source.country, safe='')}", f"release={quote(source.release, safe='')}"]
+        if self.by_atc1:
+            parts.append(f"atc1={quote(atc1, safe='')}")
+        return os.path.join(*parts, "part.arrow")
+
+    def build(self, sources, version, chunk_rows=CHUNK_ROWS, log=None):
+        scans = [scan_master(source.path, chunk_rows) for source in sources]
+        kinds = {}
+        for _, source_kinds in scans:
+            for col, kind in source_kinds.items():
+                kinds[col] = _widen(kinds.get(col), kind)
+        for col, kind in kinds.items():
+            if any(col not in source_kinds for _, source_kinds in scans):
+                kinds[col] = _widen(kind, "float") if kind in ("int", "bool") else kind
+        schema = arrow_schema({**kinds, ROW_COLUMN: "int"})
+
+        tmp = f"{self.path(version)}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        partitions, writers, row = {}, {}, 0
+        try:
+            for source, (combination_map, _) in zip(sources, scans):
+                for chunk in iter_master_chunks(source.path, combination_map, kinds, chunk_rows):
+                    chunk[ROW_COLUMN] = range(row, row + len(chunk))
+                    row += len(chunk)
+                    groups = chunk.groupby(chunk["ATC1"].fillna(NULL_PART), sort=False) if self.by_atc1 else [(None, chunk)]
+                    for atc1, rows in groups:
+                        key = (source.country, source.release, atc1)
+                        if key not in writers:
+                            rel = self._partition_path(source, atc1 or "")
+                            os.makedirs(os.path.dirname(os.path.join(tmp, rel)), exist_ok=True)
+                            sink = pa.OSFile(os.path.join(tmp, rel), "wb")
+                            writers[key] = (sink, pa.ipc.new_file(sink, schema))
+                            partitions[key] = {"country": source.country, "release": source.release, "atc1": atc1,
+                                               "path": rel, "rows": 0, "combinations": set(), "atc4": set()}
+                        writers[key][1].write_table(frame_to_table(rows).cast(schema))
+                        partitions[key]["rows"] += len(rows)
+                        partitions[key]["combinations"].update(rows["Molecule Combination"].dropna().unique())
+                        partitions[key]["atc4"].update(rows["ATC4"].dropna().unique())
+                if log:
+                    log(f"partitioned {source.country} {source.release} ({row:,} rows so far)")
+            for sink, writer in writers.values():
+                writer.close()
+                sink.close()
+            writers = {}
+
+            for part in partitions.values():
+                part["bytes"] = os.path.getsize(os.path.join(tmp, part["path"]))
+                part["combinations"] = sorted(part["combinations"])
+                part["atc4"] = sorted(part["atc4"])
+            with open(os.path.join(tmp, "catalog.json"), "w", encoding="utf-8") as f:
+                json.dump({"version": version, "columns": list(kinds),
+                           "partitions": list(partitions.values())}, f)
+            try:
+                os.replace(tmp, self.path(version))
+            except OSError:      # another worker finished first: theirs is identical
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            for sink, writer in writers.values():
+                sink.close()
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return self.catalog(version)
+
+    def ensure(self, sources, version, chunk_rows=CHUNK_ROWS):
+        """
+        The catalog for `version`, building the store first if needed.
+        """
+        catalog = self.catalog(version)
+        if catalog is None:
+            catalog = self.build(sources, version, chunk_rows)
+            self.evict_stale(version)
+        return catalog
+
+    def evict_stale(self, version):
+        removed = 0
+        current = os.path.basename(self.path(version))
+        for entry in os.listdir(self.root):
+            if entry != current and not entry.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def scan(self, catalog, country=None, release=None, atc1=None, combinations=None, atc4=None, columns=None):
+        """
+        Master rows for the filters, in master order: rows of `combinations`
+        or of the `atc4` classes, within `atc1`. The catalog prunes whole files
+        first; the row filters are then evaluated inside the Arrow scan, batch
+        by batch, so only matching rows are materialized. An unfiltered
+        country + release scan is tagged as that partition's master.
+        """
+        atc1 = [atc1] if isinstance(atc1, str) else atc1
+        combinations = [combinations] if isinstance(combinations, str) else combinations
+        atc4 = [atc4] if isinstance(atc4, str) else atc4
+        parts = catalog.select(country, release, atc1, combinations, atc4)
+        wanted = list(columns or catalog.columns)
+        if not parts:
+            return pd.DataFrame(columns=wanted)
+
+        expr = None
+        for field, values in (("Molecule Combination", combinations), ("ATC4", atc4)):
+            if values:
+                clause = ds.field(field).isin(list(values))
+                expr = clause if expr is None else expr | clause
+        if atc1:
+            clause = ds.field("ATC1").isin(list(atc1))
+            expr = clause if expr is None else expr & clause
+        dataset = ds.dataset([os.path.join(catalog.root, p["path"]) for p in parts], format="ipc")
+        table = dataset.to_table(filter=expr, columns=wanted + [ROW_COLUMN])
+        table = table.take(pc.sort_indices(table[ROW_COLUMN])).drop_columns([ROW_COLUMN])
+
+        frame = table_to_frame(table.replace_schema_metadata(None))
+        if not (atc1 or combinations or atc4 or columns) and country is not None and release is not None:
+            frame.attrs["dataset"] = "master"
+            frame.attrs["partition"] = partition_key(country, release)
+        return frame
+
+    def scan_combination(self, catalog, country, release, combo):
+        """
+        Rows `build_combination_context` needs for `combo`: the combination and
+        the rest of its ATC4 class (same ATC1 partition). The combination's
+        ATC4 comes from a one-column scan first.
+        """
+        combo = combo.strip().upper()
+        atc4 = self.scan(catalog, country, release, combinations=combo, columns=["ATC4"])["ATC4"].dropna().unique().tolist()
+        if not atc4:
+            return self.scan(catalog, country, release, combinations=combo)
+        return self.scan(catalog, country, release, combinations=combo, atc4=atc4[:1])
@@ -0,0 +1,268 @@
+import contextlib
+import contextvars
+import importlib.util
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.Metrics import METRICS
+
+ENGINE = os.environ.get("PHARMAI_QUERY_ENGINE", "pandas")
+# 1 = run every aggregation on pandas too, record both latencies and any mismatch, serve pandas
+COMPARE = os.environ.get("PHARMAI_QUERY_ENGINE_COMPARE", "0") == "1"
+RTOL = 1e-9
+
+# Engine picked for the current thread / context (`use_engine`), else ENGINE
+_current = contextvars.ContextVar("pharmai_query_engine", default=None)
+
+
+def _keys(by):
+    return [by] if isinstance(by, str) else list(by)
+
+
+def _sorted_result(frame, keys):
+    """
+    Keys as index, sorted, like `DataFrame.groupby(by)` returns them.
+    """
+    frame = frame.set_index(keys if len(keys) > 1 else keys[0])
+    return frame.sort_index()
+
+
+# ─── 1/ Backends ────────────────────────────────────────────────────────────────
+class PandasEngine:
+    """
+    Reference backend: plain `groupby`. Every other engine must return the
+    same frames (index = the group keys, sorted; rows with a missing key
+    dropped; sums of empty groups are 0).
+    """
+
+    name = "pandas"
+
+    def group_sum(self, frame, by, columns):
+        return frame.groupby(by)[list(columns)].sum()
+
+    def group_nunique(self, frame, by, column):
+        return frame.groupby(by)[column].nunique()
+
+
+class ArrowEngine:
+    """
+    pyarrow.compute hash aggregation, multi-threaded. Frames loaded from the
+    Arrow store convert back to Arrow without copying their string columns.
+    """
+
+    name = "arrow"
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        self.pa, self.pc = pa, pc
+
+    def _table(self, frame, keys, columns):
+        table = self.pa.Table.from_pandas(frame[keys + columns], preserve_index=False)
+        for key in keys:
+            table = table.filter(self.pc.is_valid(table[key]))
+        return table
+
+    def group_sum(self, frame, by, columns):
+        keys, columns = _keys(by), list(columns)
+        table = self._table(frame, keys, columns)
+        options = self.pc.ScalarAggregateOptions(min_count=0)
+        out = table.group_by(keys, use_threads=True).aggregate([(c, "sum", options) for c in columns])
+        result = out.to_pandas().rename(columns={f"{c}_sum": c for c in columns})
+        return _sorted_result(result, keys)[columns]
+
+    def group_nunique(self, frame, by, column):
+        keys = _keys(by)
+        table = self._table(frame, keys, [column])
+        out = table.group_by(keys, use_threads=True).aggregate([(column, "count_distinct")])
+        result = out.to_pandas().rename(columns={f"{column}_count_distinct": column})
+        return _sorted_result(result, keys)[column]
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class DuckDBEngine:
+    """
+    DuckDB over the frame's Arrow buffers (optional dependency).
+    """
+
+    name = "duckdb"
+
+    def __init__(self):
+        import duckdb
+        self._connection = duckdb.connect()
+        self._lock = threading.Lock()
+
+    def _query(self, frame, keys, select):
+        sql = (
+            f"SELECT {', '.join(map(_quote, keys))}, {select} FROM data "
+            f"WHERE {' AND '.join(_quote(k) + ' IS NOT NULL' for k in keys)} "
+            f"GROUP BY {', '.join(map(_quote, keys))}"
+        )
+        with self._lock:
+            cursor = self._connection.cursor()    # one cursor per query: safe across threads
+        cursor.register("data", frame)
+        try:
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def group_sum(self, frame, by, columns):
+        keys, columns = _keys(by), list(columns)
+        select = ", ".join(f"COALESCE(SUM({_quote(c)}), 0) AS {_quote(c)}" for c in columns)
+        return _sorted_result(self._query(frame[keys + columns], keys, select), keys)[columns]
+
+    def group_nunique(self, frame, by, column):
+        keys = _keys(by)
+        select = f"COUNT(DISTINCT {_quote(column)}) AS {_quote(column)}"
+        return _sorted_result(self._query(frame[keys + [column]], keys, select), keys)[column]
+
+
+class PolarsEngine:
+    """
+    Polars lazy group-by (optional dependency).
+    """
+
+    name = "polars"
+
+    def __init__(self):
+        import polars
+        self.pl = polars
+
+    def _frame(self, frame, keys, columns):
+        return self.pl.from_pandas(frame[keys + columns]).lazy().drop_nulls(keys)
+
+    def group_sum(self, frame, by, columns):
+        pl, keys, columns = self.pl, _keys(by), list(columns)
+        out = self._frame(frame, keys, columns).group_by(keys).agg([pl.col(c).sum() for c in columns]).collect()
+        return _sorted_result(out.to_pandas(), keys)[columns]
+
+    def group_nunique(self, frame, by, column):
+        pl, keys = self.pl, _keys(by)
+        out = self._frame(frame, keys, [column]).group_by(keys).agg(pl.col(column).drop_nulls().n_unique()).collect()
+        return _sorted_result(out.to_pandas(), keys)[column]
+
+
+ENGINES = {"pandas": PandasEngine, "arrow": ArrowEngine, "duckdb": DuckDBEngine, "polars": PolarsEngine}
+REQUIRES = {"arrow": "pyarrow", "duckdb": "duckdb", "polars": "polars"}
+
+
+def available_engines():
+    return [name for name in ENGINES if name not in REQUIRES or importlib.util.find_spec(REQUIRES[name])]
+
+
+# ─── 2/ Comparing against the reference ─────────────────────────────────────────
+def results_match(a, b, rtol=RTOL):
+    """
+    True when two results agree: frames and series by index and values
+    (numbers within `rtol`, dtypes ignored), figures by their JSON, containers
+    item by item.
+    """
+    if isinstance(a, (pd.DataFrame, pd.Series)) or isinstance(b, (pd.DataFrame, pd.Series)):
+        if type(a) is not type(b):
+            return False
+        options = dict(check_dtype=False, check_index_type=False, check_names=False, rtol=rtol, atol=0)
+        try:
+            if isinstance(a, pd.DataFrame):
+                pd.testing.assert_frame_equal(a, b, check_column_type=False, **options)
+            else:
+                pd.testing.assert_series_equal(a, b, **options)
+        except AssertionError:
+            return False
+        return True
+    if hasattr(a, "to_plotly_json") and hasattr(b, "to_plotly_json"):
+        return results_match(a.to_plotly_json(), b.to_plotly_json(), rtol)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(results_match(a[k], b[k], rtol) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(results_match(x, y, rtol) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        if a.shape != b.shape:
+            return False
+        if a.dtype.kind in "fiub" and b.dtype.kind in "fiub":
+            return bool(np.allclose(a, b, rtol=rtol, atol=0, equal_nan=True))
+        return results_match(a.tolist(), b.tolist(), rtol)
+    if isinstance(a, (int, float, np.number)) and isinstance(b, (int, float, np.number)) \
+            and not isinstance(a, bool) and not isinstance(b, bool):
+        return bool(np.isclose(a, b, rtol=rtol, atol=0, equal_nan=True))
+    return a == b
+
+
+class CompareEngine:
+    """
+    Runs every aggregation on the reference engine and on `candidate`,
+    records both latencies (`pharmai_engine_seconds`) and counts results that
+    differ (`pharmai_engine_mismatches_total`). Returns the reference result,
+    so comparing never changes what users see.
+    """
+
+    def __init__(self, candidate, reference=None, rtol=RTOL):
+        self.candidate = candidate
+        self.reference = reference or PandasEngine()
+        self.rtol = rtol
+        self.name = f"compare:{candidate.name}"
+
+    def _run(self, op, *args):
+        results = []
+        for engine in (self.reference, self.candidate):
+            t0 = time.perf_counter()
+            results.append(getattr(engine, op)(*args))
+            METRICS.observe("pharmai_engine_seconds", time.perf_counter() - t0, engine=engine.name, op=op)
+        if not results_match(results[0], results[1], self.rtol):
+            METRICS.inc("pharmai_engine_mismatches_total", engine=self.candidate.name, op=op)
+        return results[0]
+
+    def group_sum(self, frame, by, columns):
+        return self._run("group_sum", frame, by, columns)
+
+    def group_nunique(self, frame, by, column):
+        return self._run("group_nunique", frame, by, column)
+
+
+# ─── 3/ Selection ───────────────────────────────────────────────────────────────
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name=None, compare=None):
+    """
+    The engine called `name` (default PHARMAI_QUERY_ENGINE), wrapped in a
+    CompareEngine when `compare` (default PHARMAI_QUERY_ENGINE_COMPARE) and
+    the engine is not pandas. One instance per process and setting.
+    """
+    name = (name or ENGINE).lower()
+    compare = COMPARE if compare is None else compare
+    if name not in ENGINES:
+        raise ValueError(f"unknown query engine {name!r}; expected one of {tuple(ENGINES)}")
+    if name not in available_engines():
+        raise ImportError(f"query engine {name!r} needs the {REQUIRES[name]!r} package")
+    key = (name, compare and name != "pandas")
+    with _engines_lock:
+        if key not in _engines:
+            engine = ENGINES[name]()
+            _engines[key] = CompareEngine(engine) if key[1] else engine
+        return _engines[key]
+
+
+def current_engine():
+    """
+    Engine for aggregations in tool functions: the one set by `use_engine`
+    in this context, else the configured default.
+    """
+    return _current.get() or get_engine()
+
+
+@contextlib.contextmanager
+def use_engine(name, compare=False):
+    token = _current.set(get_engine(name, compare))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
@@ -0,0 +1,221 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.DiskCache import DiskCache, same_dataset
+from tool_functions1.Metrics import METRICS
+
+MAX_ENTRIES = int(os.environ.get("PHARMAI_MEMORY_CACHE_ENTRIES", "2048"))
+MAX_BYTES = int(float(os.environ.get("PHARMAI_MEMORY_CACHE_MB", "512")) * 1024 * 1024)
+TTL_SECONDS = float(os.environ.get("PHARMAI_MEMORY_CACHE_TTL", "0")) or None     # 0 = no expiry
+POLICY = os.environ.get("PHARMAI_MEMORY_CACHE_POLICY", "lru")
+POLICIES = ("lru", "lfu")
+
+
+# ─── 1/ Entry sizes ─────────────────────────────────────────────────────────────
+def estimate_size(value, _depth=0):
+    """
+    Approximate bytes held by a cached result: frames by `memory_usage(deep=True)`,
+    figures by their JSON size (what Streamlit ships to the browser), arrays
+    by `nbytes`, containers and plain objects by summing their parts.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, "to_plotly_json") and hasattr(value, "to_json"):
+        return len(value.to_json())
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if _depth > 4:                      # deep nesting: fall back to the pickled size
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v, _depth + 1) for v in value)
+    if hasattr(value, "__dict__"):      # e.g. TrendForecasts, AtcHierarchy: their tables
+        return sys.getsizeof(value) + estimate_size(vars(value), _depth + 1)
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "version", "size", "created", "used", "hits")
+
+    def __init__(self, value, version, size):
+        self.value = value
+        self.version = version
+        self.size = size
+        self.created = self.used = time.monotonic()
+        self.hits = 0
+
+
+# ─── 2/ Bounded in-process cache ────────────────────────────────────────────────
+class MemoryCache:
+    """
+    Tool results held in this process, bounded by entry count and accounted
+    bytes, with an optional TTL. When full it evicts the least recently used
+    (`policy="lru"`) or least frequently used (`"lfu"`, ties by age) entries.
+    Results larger than `max_bytes` are not kept.
+
+    Same `get` / `set` / `evict_stale` interface as DiskCache. Values are
+    shared by every caller, so treat them as read-only (as the app does:
+    figures and tables are only rendered).
+    """
+
+    layer = "memory"
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS, policy=POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown eviction policy {policy!r}; expected one of {POLICIES}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self._entries = OrderedDict()   # oldest use first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.evictions = {}             # reason -> count
+
+    def _drop(self, key, reason):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        self.evictions[reason] = self.evictions.get(reason, 0) + 1
+        METRICS.inc("pharmai_result_cache_evictions_total", reason=reason)
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def _victim(self):
+        if self.policy == "lru":
+            return next(iter(self._entries))
+        # LFU: fewest hits, then least recently used; a scan is cheap at these sizes
+        return min(self._entries.items(), key=lambda kv: (kv[1].hits, kv[1].used))[0]
+
+    def _publish(self):
+        METRICS.set("pharmai_result_cache_entries", len(self._entries))
+        METRICS.set("pharmai_result_cache_bytes", self._bytes)
+
+    def get(self, key, version):
+        """
+        Returns (hit, value). Expired entries and entries from another dataset
+        version are misses (and are dropped).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.version != version or self._expired(entry, now)):
+                self._drop(key, "stale" if entry.version != version else "ttl")
+                self._publish()
+                entry = None
+            if entry is None:
+                self.misses += 1
+                METRICS.inc("pharmai_result_cache_requests_total", result="miss")
+                return False, None
+            entry.hits += 1
+            entry.used = now
+            self._entries.move_to_end(key)
+            self.hits += 1
+        METRICS.inc("pharmai_result_cache_requests_total", result="hit")
+        return True, entry.value
+
+    def set(self, key, version, value):
+        size = estimate_size(value)      # outside the lock: figure JSON takes a few ms
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, "replaced")
+            if size > self.max_bytes:
+                self.evictions["too_large"] = self.evictions.get("too_large", 0) + 1
+                METRICS.inc("pharmai_result_cache_evictions_total", reason="too_large")
+                self._publish()
+                return False
+            now = time.monotonic()
+            if self.ttl is not None:
+                for old in [k for k, e in self._entries.items() if self._expired(e, now)]:
+                    self._drop(old, "ttl")
+            while self._entries and (len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes):
+                self._drop(self._victim(), "bytes" if len(self._entries) < self.max_entries else "entries")
+            self._entries[key] = _Entry(value, version, size)
+            self._bytes += size
+            self._publish()
+        return True
+
+    def evict_stale(self, version):
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if not same_dataset(e.version, version)]
+            for key in stale:
+                self._drop(key, "stale")
+            self._publish()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._publish()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "layer": self.layer, "policy": self.policy, "ttl": self.ttl,
+                "entries": len(self._entries), "max_entries": self.max_entries,
+                "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else None,
+                "evictions": dict(self.evictions),
+            }
+
+
+# ─── 3/ Memory in front of disk ─────────────────────────────────────────────────
+class TieredCache:
+    """
+    MemoryCache in front of the shared DiskCache: hits in this process skip
+    SQLite and unpickling; disk hits are promoted to memory; new results go
+    to both, so other workers still find them on disk.
+    """
+
+    layer = "tiered"
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else MemoryCache()
+        self.disk = disk if disk is not None else DiskCache()
+
+    @property
+    def path(self):
+        return self.disk.path
+
+    def get(self, key, version):
+        hit, value = self.memory.get(key, version)
+        if hit:
+            return True, value
+        hit, value = self.disk.get(key, version)
+        if hit:
+            self.memory.set(key, version, value)
+        return hit, value
+
+    def set(self, key, version, value):
+        self.memory.set(key, version, value)
+        return self.disk.set(key, version, value)
+
+    def keys_like(self, prefix, version=None):
+        return self.disk.keys_like(prefix, version)
+
+    def evict_stale(self, version):
+        self.memory.evict_stale(version)
+        return self.disk.evict_stale(version)
+
+    def stats(self):
+        stats = self.disk.stats()
+        stats["memory"] = self.memory.stats()
+        return stats
@@ -0,0 +1,102 @@
+import numpy as np
+
+from tool_functions1.DetailedForecast import forecast_molecule_product
+
+YEARS = ("Y1", "Y2", "Y3")
+SCENARIO_METRICS = ["Total", "Y1", "Y2", "Y3"]
+
+
+# ─── 1/ Grid computation ────────────────────────────────────────────────────────
+def forecast_scenario_grid(df, molecule_name, product_name, penetrations, growth_rates, context=None):
+    """
+    Y1–Y3 revenue for every (penetration, growth) pair in one broadcast.
+
+    Revenue is linear in penetration and compounds with growth, so a single
+    forecast at 100% penetration and 0% growth gives the per-point base:
+    revenue[k, i, j] = base × penetrations[i] × (1 + growth_rates[j]) ** k.
+    """
+    base_fc = forecast_molecule_product(df, molecule_name, product_name, growth_rate=0.0, context=context, penetration=1.0)
+    base = float(base_fc["Y1 Revenue"].sum())
+
+    pen = np.asarray(penetrations, dtype=float)
+    gr = np.asarray(growth_rates, dtype=float)
+    compounding = (1 + gr)[None, :] ** np.arange(len(YEARS))[:, None]          # (years, growth)
+    revenue = base * pen[None, :, None] * compounding[:, None, :]              # (years, penetration, growth)
+
+    return {
+        "molecule": molecule_name.strip().upper(),
+        "product": product_name.strip().upper(),
+        "penetration": pen,
+        "growth": gr,
+        "revenue": dict(zip(YEARS, revenue), Total=revenue.sum(axis=0)),
+    }
+
+
+def grid_axis(low, high, steps):
+    """
+    `steps` evenly spaced values from `low` to `high` (inclusive).
+    """
+    return np.linspace(low, high, int(steps))
+
+
+# ─── 2/ Charts ──────────────────────────────────────────────────────────────────
+def plot_scenario_heatmap(grid, metric="Total", marker=None):
+    """
+    Revenue surface over penetration (y) × growth (x). `marker` is an optional
+    (penetration, growth) point to highlight, e.g. the analyst's base case.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Heatmap(
+        z=grid["revenue"][metric],
+        x=grid["growth"] * 100,
+        y=grid["penetration"] * 100,
+        colorscale="Viridis",
+        colorbar=dict(title="AED"),
+        hovertemplate="Penetration: %{y:.1f}%<br>Growth: %{x:.1f}%<br>Revenue: AED %{z:,.0f}<extra></extra>"
+    ))
+    if marker is not None:
+        fig.add_trace(go.Scatter(
+            x=[marker[1] * 100], y=[marker[0] * 100], mode="markers", name="Base case",
+            marker=dict(symbol="x", size=12, color="white", line=dict(width=2, color="black")),
+            hoverinfo="skip"
+        ))
+    fig.update_layout(
+        title=f"{metric} Revenue – {grid['product']}",
+        xaxis_title="YoY Growth Rate (%)",
+        yaxis_title="Market Penetration Y1 (%)",
+        template="plotly_white",
+        height=500
+    )
+    return fig
+
+
+def plot_sensitivity_slices(grid, penetration, growth_rate, metric="Total"):
+    """
+    Two slices through the surface at the grid points nearest the base case:
+    revenue vs growth at fixed penetration, and revenue vs penetration at fixed growth.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    i = int(np.abs(grid["penetration"] - penetration).argmin())
+    j = int(np.abs(grid["growth"] - growth_rate).argmin())
+    surface = grid["revenue"][metric]
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=(
+        f"Penetration fixed at {grid['penetration'][i] * 100:.1f}%",
+        f"Growth fixed at {grid['growth'][j] * 100:.1f}%",
+    ))
+    fig.add_trace(go.Scatter(
+        x=grid["growth"] * 100, y=surface[i, :], mode="lines", name="vs growth",
+        hovertemplate="Growth: %{x:.1f}%<br>Revenue: AED %{y:,.0f}<extra></extra>"
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        x=grid["penetration"] * 100, y=surface[:, j], mode="lines", name="vs penetration",
+        hovertemplate="Penetration: %{x:.1f}%<br>Revenue: AED %{y:,.0f}<extra></extra>"
+    ), row=1, col=2)
+    fig.update_xaxes(title_text="YoY Growth Rate (%)", row=1, col=1)
+    fig.update_xaxes(title_text="Market Penetration Y1 (%)", row=1, col=2)
+    fig.update_yaxes(title_text=f"{metric} Revenue (AED)", row=1, col=1)
+    fig.update_layout(template="plotly_white", height=400, showlegend=False)
+    return fig
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+from tool_functions1.Reg import clean_ingredient_string
+
+# Sortable numeric columns, in display order
+SCREENER_METRICS = [
+    "2024 Value (AED)",
+    "2024 Units",
+    "Value CAGR (%)",
+    "Units CAGR (%)",
+    "Manufacturers",
+    "Originator Share 2024 (%)",
+    "Originator Erosion (pts)",
+    "Private Share (%)",
+    "LPO Share (%)",
+    "MOHAP Registrations",
+    "MOHAP Companies",
+    "OB Patent Expiry",
+    "Fitted Value Growth (%)",
+    "2029 Value Fit (AED)",
+]
+
+
+# ─── 1/ Per-combination aggregates from the master ──────────────────────────────
+def _originator_erosion(df):
+    """
+    Top 2024 manufacturer (by units) per combination and its unit share in
+    2021 and 2024 — the same originator rule as the erosion tab, in one pass.
+    """
+    manu = df.groupby(["Molecule Combination", "Manufacturer"])[["2021 Units", "2024 Units"]].sum()
+    totals = manu.groupby(level=0).sum()
+    top = manu.sort_values("2024 Units", ascending=False).groupby(level=0).head(1).droplevel(1)
+    top = top.reindex(totals.index)
+
+    share_21 = (top["2021 Units"] / totals["2021 Units"].where(totals["2021 Units"] > 0)).fillna(0)
+    share_24 = (top["2024 Units"] / totals["2024 Units"].where(totals["2024 Units"] > 0)).fillna(0)
+    return pd.DataFrame({
+        "Originator Share 2024 (%)": share_24 * 100,
+        "Originator Erosion (pts)": (share_21 - share_24) * 100,
+    })
+
+
+def _market_split(df):
+    units = (
+        df.assign(Market=df["Market"].astype(str).str.upper().str.strip())
+          .pivot_table(index="Molecule Combination", columns="Market", values="2024 Units", aggfunc="sum", fill_value=0)
+    )
+    total = units.sum(axis=1).replace(0, np.nan)
+    split = pd.DataFrame(index=units.index)
+    split["Private Share (%)"] = (units.get("PRIVATE MARKET", 0) / total * 100).fillna(0)
+    split["LPO Share (%)"] = (units.get("LPO", 0) / total * 100).fillna(0)
+    return split
+
+
+# ─── 2/ Registry lookups (same substring rule as the regulatory snapshot) ───────
+def _match_matrix(needles, labels):
+    """
+    Boolean (needles × unique labels) matrix: label contains needle.
+    Runs over the unique label strings, not over every registry row.
+    """
+    labels = np.asarray(labels, dtype=str)
+    return np.vstack([np.char.find(labels, n) >= 0 for n in needles]) if len(needles) else np.zeros((0, len(labels)), bool)
+
+
+def _mohap_counts(combos, mohap_df):
+    ingredient = mohap_df["Ingredient"].astype(str).map(clean_ingredient_string)
+    company = mohap_df["Company"].astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+    ing_codes, ing_labels = pd.factorize(ingredient)
+    comp_codes, _ = pd.factorize(company)
+
+    hits = _match_matrix([clean_ingredient_string(c) for c in combos], ing_labels)
+    regs, companies = np.zeros(len(combos), int), np.zeros(len(combos), int)
+    for i, row in enumerate(hits):
+        if row.any():
+            rows = row[ing_codes]
+            regs[i] = rows.sum()
+            companies[i] = len(np.unique(comp_codes[rows]))
+    return pd.DataFrame({"MOHAP Registrations": regs, "MOHAP Companies": companies}, index=combos)
+
+
+def _ob_expiry(combos, ob_products, ob_product_table):
+    nda = ob_products[ob_products["Appl_Type"] == "N"]
+    keys = pd.MultiIndex.from_frame(nda[["Appl_No", "Product_No"]])
+    expiry = pd.Series(ob_product_table["Patent_Max"].reindex(keys).to_numpy(), index=nda.index)
+    by_label = expiry.groupby(nda["Ingredient_Formatted_Clean"]).max().dropna()
+
+    hits = _match_matrix([clean_ingredient_string(c) for c in combos], by_label.index)
+    dates = by_label.to_numpy()
+    latest = [dates[row].max() if row.any() else pd.NaT for row in hits]
+    return pd.Series(pd.to_datetime(latest), index=combos, name="OB Patent Expiry")
+
+
+# ─── 3/ Screener table ──────────────────────────────────────────────────────────
+def build_screener_table(df, mohap_df=None, ob_products=None, ob_product_table=None, hierarchy=None, trends=None):
+    """
+    One row per molecule combination with every screening metric. Built once
+    per dataset version; filtering and sorting then run on this small frame.
+    `trends` (combination-level TrendForecasts) adds the fitted value trend.
+    """
+    if hierarchy is None:
+        from tool_functions1.AtcHierarchy import build_atc_hierarchy
+        hierarchy = build_atc_hierarchy(df)
+
+    leaf = hierarchy.totals["Molecule Combination"]
+    table = pd.DataFrame({
+        "2024 Value (AED)": leaf["2024 LC Value"],
+        "2024 Units": leaf["2024 Units"],
+        "Value CAGR (%)": leaf["Value CAGR (%)"],
+        "Units CAGR (%)": leaf["Units CAGR (%)"],
+        "Manufacturers": leaf["Competitors"],
+    })
+
+    # Main ATC4 of each combination: the one holding most of its 2024 value
+    placed = hierarchy.tree["Molecule Combination"]["2024 LC Value"].reset_index()
+    placed = placed.sort_values("2024 LC Value", ascending=False).drop_duplicates("Molecule Combination")
+    table["ATC4"] = placed.set_index("Molecule Combination")["ATC4"]
+    table["ATC1"] = (
+        table["ATC4"].map(hierarchy.parents("ATC4"))
+                     .map(hierarchy.parents("ATC3"))
+                     .map(hierarchy.parents("ATC2"))
+    )
+
+    data = df[["Molecule Combination", "Manufacturer", "Market", "2021 Units", "2024 Units"]]
+    table = table.join(_originator_erosion(data)).join(_market_split(data))
+
+    combos = table.index.tolist()
+    if mohap_df is not None:
+        table = table.join(_mohap_counts(combos, mohap_df))
+    if ob_products is not None and ob_product_table is not None:
+        table = table.join(_ob_expiry(combos, ob_products, ob_product_table))
+    if trends is not None:
+        fitted = trends.tables["LC Value"]
+        table["Fitted Value Growth (%)"] = fitted["Trend Growth (%)"]
+        table["2029 Value Fit (AED)"] = fitted[f"{trends.horizon[-1]} Fit"]
+
+    table.index.name = "Molecule Combination"
+    return table.sort_values("2024 Value (AED)", ascending=False)
+
+
+def screen_combinations(table, atc1=None, min_value=0, min_value_cagr=None, max_manufacturers=None,
+                        expiry_before=None, sort_by="2024 Value (AED)", ascending=False):
+    """
+    Filters and sorts a screener table with boolean masks (no regrouping).
+    """
+    mask = table["2024 Value (AED)"] >= min_value
+    if atc1:
+        mask &= table["ATC1"].isin(atc1)
+    if min_value_cagr is not None:
+        mask &= table["Value CAGR (%)"] >= min_value_cagr
+    if max_manufacturers is not None:
+        mask &= table["Manufacturers"] <= max_manufacturers
+    if expiry_before is not None and "OB Patent Expiry" in table.columns:
+        mask &= table["OB Patent Expiry"] < pd.Timestamp(expiry_before)
+    return table[mask].sort_values(sort_by, ascending=ascending)
@@ -0,0 +1,144 @@
+import bisect
+import re
+from collections import defaultdict
+
+# Match tiers, best first
+EXACT, PREFIX, COMPONENT_EXACT, COMPONENT_PREFIX, SUBSTRING = range(5)
+
+
+class SearchIndex:
+    """
+    Precomputed typeahead index over a fixed list of keys (molecule combinations,
+    MOHAP ingredients, Orange Book ingredients, Molecule → Product labels).
+
+    Keeps the keys sorted once, plus a sorted component list for prefix lookups
+    on each molecule of a combination and a trigram index for substring matches,
+    so each keystroke only touches the candidate keys instead of the whole column.
+    """
+
+    def __init__(self, keys, weights=None, separators=(" + ",), ngram=3):
+        weights = weights or {}
+        self.ngram = ngram
+        self.keys = sorted({str(k).strip() for k in keys if str(k).strip()})
+        self._upper = [k.upper() for k in self.keys]
+        self._weight = [float(weights.get(k, 0) or 0) for k in self.keys]
+
+        # Default ranking (empty query): heaviest first, then alphabetical
+        self._default = sorted(range(len(self.keys)), key=lambda i: (-self._weight[i], self.keys[i]))
+
+        # Full-key prefix lookups reuse the sorted upper-case keys directly
+        self._sorted_upper = sorted(range(len(self.keys)), key=lambda i: self._upper[i])
+        self._sorted_upper_keys = [self._upper[i] for i in self._sorted_upper]
+
+        # Component prefix lookups: one (component, key) entry per molecule
+        splitter = re.compile("|".join(re.escape(s) for s in separators))
+        components = []
+        for i, key in enumerate(self._upper):
+            parts = {p.strip() for p in splitter.split(key) if p.strip()}
+            if len(parts) > 1:
+                components.extend((p, i) for p in parts)
+        components.sort()
+        self._components = components
+        self._component_keys = [c for c, _ in components]
+
+        # Trigram → key positions, for substring queries
+        grams = defaultdict(set)
+        for i, key in enumerate(self._upper):
+            for g in self._grams(key):
+                grams[g].add(i)
+        self._grams_index = dict(grams)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grams(self, text):
+        n = self.ngram
+        return {text[j:j + n] for j in range(len(text) - n + 1)}
+
+    def _prefix_range(self, sorted_keys, prefix):
+        lo = bisect.bisect_left(sorted_keys, prefix)
+        hi = bisect.bisect_left(sorted_keys, prefix + "\uffff")
+        return lo, hi
+
+    def search(self, query, limit=50):
+        """
+        Returns up to `limit` keys ranked by match quality (exact, prefix,
+        component exact, component prefix, substring), then by weight.
+        An empty query returns the heaviest keys.
+        """
+        q = str(query or "").strip().upper()
+        if not q:
+            return [self.keys[i] for i in self._default[:limit]]
+
+        tier = {}
+
+        def _add(i, t):
+            if t < tier.get(i, SUBSTRING + 1):
+                tier[i] = t
+
+        lo, hi = self._prefix_range(self._sorted_upper_keys, q)
+        for pos in range(lo, hi):
+            i = self._sorted_upper[pos]
+            _add(i, EXACT if self._upper[i] == q else PREFIX)
+
+        lo, hi = self._prefix_range(self._component_keys, q)
+        for pos in range(lo, hi):
+            comp, i = self._components[pos]
+            _add(i, COMPONENT_EXACT if comp == q else COMPONENT_PREFIX)
+
+        if len(q) >= self.ngram:
+            grams = sorted(self._grams(q), key=lambda g: len(self._grams_index.get(g, ())))
+            candidates = set(self._grams_index.get(grams[0], ()))
+            for g in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= self._grams_index.get(g, set())
+            for i in candidates:
+                if q in self._upper[i]:
+                    _add(i, SUBSTRING)
+
+        ranked = sorted(tier, key=lambda i: (tier[i], -self._weight[i], self.keys[i]))
+        return [self.keys[i] for i in ranked[:limit]]
+
+
+def build_combination_index(df):
+    """
+    Index over 'Molecule Combination', weighted by 2024 value so the biggest
+    markets surface first.
+    """
+    weights = (
+        df.groupby("Molecule Combination")["2024 LC Value"]
+          .sum()
+          .to_dict()
+    )
+    return SearchIndex(df["Molecule Combination"].dropna().unique(), weights=weights)
+
+
+def build_ingredient_index(series, separators=(",", ";", " +")):
+    """
+    Index over a free-text ingredient column (MOHAP, Orange Book), weighted by
+    how many rows carry each ingredient string.
+    """
+    counts = series.dropna().astype(str).str.strip().value_counts().to_dict()
+    return SearchIndex(counts.keys(), weights=counts, separators=separators)
+
+
+def build_pair_labels(df, top_product_for_combo):
+    """
+    Builds the 'Combination → Product' labels (★ on the top seller) in one
+    vectorized pass, with 2024 units as weights.
+    """
+    pairs = (
+        df.groupby(["Molecule Combination", "Product"])["2024 Units"]
+          .sum()
+          .reset_index()
+    )
+    is_top = pairs["Molecule Combination"].map(top_product_for_combo) == pairs["Product"]
+    labels = pairs["Molecule Combination"] + " → " + pairs["Product"]
+    labels = labels.where(~is_top, labels + " ★")
+    return dict(zip(labels, pairs["2024 Units"]))
+
+
+def build_pair_index(df, top_product_for_combo):
+    weights = build_pair_labels(df, top_product_for_combo)
+    return SearchIndex(weights.keys(), weights=weights, separators=(" → ", " + ", " ★"))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+READ_ONLY_MESSAGE = "shared {name} frame is read-only: filter it or take a .copy() first"
+
+
+class FrozenFrame(pd.DataFrame):
+    """
+    A loaded source frame shared by every session in the process.
+
+    Its column arrays are read-only, so in-place value writes (`.loc[...] =`,
+    `+=`, chained assignment) raise, and adding, replacing or dropping columns
+    on the shared handle raises too. Anything derived from it (filters,
+    selections, `.copy()`, groupbys) is a plain, writable DataFrame.
+    """
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def _read_only(self, *args, **kwargs):
+        raise ValueError(READ_ONLY_MESSAGE.format(name=self.attrs.get("dataset", "data")))
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    insert = _read_only
+    pop = _read_only
+    _update_inplace = _read_only   # every `inplace=True` method ends here
+
+    def __setattr__(self, name, value):
+        # `frame.columns = ...` / `frame.index = ...` would relabel the shared handle
+        if name in ("columns", "index"):
+            self._read_only()
+        super().__setattr__(name, value)
+
+
+def freeze_frame(df):
+    """
+    Wraps `df` as a FrozenFrame without copying its data: every existing
+    block is marked read-only (arrays mapped from the Arrow store already
+    are). Blocks are not consolidated: merging them allocates new 2-D
+    arrays, i.e. a private copy of every mapped numeric column. The manager
+    is marked consolidated so pandas does not merge them later either.
+    """
+    if isinstance(df, FrozenFrame):
+        return df
+    for block in df._mgr.blocks:
+        values = block.values
+        array = values if isinstance(values, np.ndarray) else getattr(values, "_ndarray", None)
+        if array is not None:
+            array.flags.writeable = False
+    frozen = FrozenFrame(df, copy=False)
+    frozen._mgr._known_consolidated = frozen._mgr._is_consolidated = True
+    frozen.attrs = dict(df.attrs)
+    return frozen
+
+
+def freeze_frames(frames):
+    """
+    `freeze_frame` over a tuple of frames (e.g. the Orange Book sources).
+    """
+    return tuple(freeze_frame(frame) for frame in frames)
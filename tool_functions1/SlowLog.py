@@ -0,0 +1,186 @@
+import contextvars
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from tool_functions1.DataRegistry import registry
+from tool_functions1.Metrics import METRICS
+from tool_functions1.SharedFrame import FrozenFrame
+
+DEFAULT_SLOW_LOG_PATH = os.environ.get("PHARMAI_SLOW_LOG_PATH", os.path.join(".cache", "slow_calls.jsonl"))
+SLOW_SECONDS = float(os.environ.get("PHARMAI_SLOW_SECONDS", "2.0"))
+MAX_LOG_BYTES = 20 * 1024 * 1024     # rotated to <path>.1 beyond this
+MAX_EMBED_ROWS = 5000                # untagged frames up to this size are logged inline
+
+# What the current script run is doing (open tab, selection, dataset version);
+# each Streamlit session runs on its own thread, so values never cross sessions
+_annotations = contextvars.ContextVar("pharmai_slow_log_annotations", default={})
+
+
+# ─── 1/ Replayable argument encoding ────────────────────────────────────────────
+def encode_arg(value):
+    """
+    JSON stand-in for a tool argument that `replay.py` can turn back into the
+    real object: shared (frozen) sources by dataset name, derived objects
+    (combination context, ATC hierarchy, trend fits, figure budget) by class
+    and `cache_token()`, other small frames and arrays inline.
+    """
+    if isinstance(value, pd.DataFrame):
+        # only the shared source handles are frozen; slices inherit the tag through attrs
+        tag = value.attrs.get("dataset")
+        if tag and isinstance(value, FrozenFrame):
+            encoded = {"$frame": tag, "shape": list(value.shape)}
+            if value.attrs.get("partition"):
+                encoded["partition"] = value.attrs["partition"]     # country:release of a partitioned master
+            return encoded
+        if len(value) <= MAX_EMBED_ROWS:
+            return {"$frame_split": json.loads(value.to_json(orient="split", date_format="iso"))}
+        return {"$unreplayable": f"DataFrame {value.shape[0]}×{value.shape[1]}"}
+    if isinstance(value, pd.Series):
+        if len(value) <= MAX_EMBED_ROWS:
+            return {"$series_split": json.loads(value.to_json(orient="split", date_format="iso"))}
+        return {"$unreplayable": f"Series of {len(value)}"}
+    token = getattr(value, "cache_token", None)
+    if callable(token):
+        return {"$object": type(value).__name__, "token": encode_arg(token())}
+    if isinstance(value, np.ndarray):
+        return {"$array": value.tolist(), "dtype": str(value.dtype)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, tuple):
+        return {"$tuple": [encode_arg(v) for v in value]}
+    if isinstance(value, list):
+        return [encode_arg(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): encode_arg(v) for k, v in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return {"$unreplayable": repr(value)[:200]}
+
+
+def decode_arg(value, resolve):
+    """
+    Inverse of `encode_arg`. `resolve(kind, name, token)` supplies sources
+    (`kind="frame"`, token = the partition or None) and derived objects
+    (`kind="object"`).
+    """
+    if isinstance(value, list):
+        return [decode_arg(v, resolve) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "$frame" in value:
+        return resolve("frame", value["$frame"], value.get("partition"))
+    if "$frame_split" in value:
+        split = value["$frame_split"]
+        return pd.DataFrame(split["data"], index=split["index"], columns=split["columns"])
+    if "$series_split" in value:
+        split = value["$series_split"]
+        return pd.Series(split["data"], index=split["index"], name=split.get("name"))
+    if "$object" in value:
+        return resolve("object", value["$object"], decode_arg(value["token"], resolve))
+    if "$array" in value:
+        return np.asarray(value["$array"], dtype=value["dtype"])
+    if "$tuple" in value:
+        return tuple(decode_arg(v, resolve) for v in value["$tuple"])
+    if "$unreplayable" in value:
+        raise ValueError(f"argument was not captured: {value['$unreplayable']}")
+    return {k: decode_arg(v, resolve) for k, v in value.items()}
+
+
+# ─── 2/ Log ─────────────────────────────────────────────────────────────────────
+def annotate(**fields):
+    """
+    Context for slow records written from this script run (open tab,
+    selected combination, widget values, dataset version).
+    """
+    _annotations.set(dict(fields))
+
+
+class SlowCallLog:
+    """
+    Appends one JSON line per tool call slower than `threshold` seconds: the
+    function, its encoded arguments, the dataset version, the run's
+    annotations and the error if it raised. `replay.py` re-runs these lines
+    under the profiler.
+    """
+
+    def __init__(self, path=DEFAULT_SLOW_LOG_PATH, threshold=SLOW_SECONDS, max_bytes=MAX_LOG_BYTES):
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def write(self, record):
+        line = json.dumps(record, default=repr) + "\n"
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass                     # logging must never break the tab
+
+    def _base(self, kind, seconds):
+        notes = _annotations.get()
+        return {
+            "kind": kind,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": round(seconds, 4),
+            "version": notes.get("version") or registry.version(),
+            "pid": os.getpid(),
+            "context": {k: v for k, v in notes.items() if k != "version"},
+        }
+
+    def on_call(self, kind, name, fn, args, kwargs, seconds, error):
+        if kind != "tool" or seconds < self.threshold:
+            return
+        record = self._base("call", seconds)
+        record.update({
+            "fn": f"{fn.__module__}:{fn.__qualname__}",
+            "args": [encode_arg(a) for a in args],
+            "kwargs": {k: encode_arg(v) for k, v in kwargs.items()},
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+        })
+        self.write(record)
+
+    def record_rerun(self, seconds):
+        """
+        Logs a whole slow script run (its annotations say which tab and inputs).
+        """
+        if seconds >= self.threshold:
+            self.write(self._base("rerun", seconds))
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def install_slow_log(path=None, threshold=None):
+    """
+    Hooks the process's slow-call log into the instrumented tool functions
+    (once per process) and returns it.
+    """
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = SlowCallLog(path or DEFAULT_SLOW_LOG_PATH, SLOW_SECONDS if threshold is None else threshold)
+            METRICS.on_call(_log.on_call)
+        return _log
+
+
+def read_slow_log(path=DEFAULT_SLOW_LOG_PATH):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tool_functions1.Metrics import METRICS
+
+
+class StartupLoader:
+    """
+    Reads every data source concurrently in a thread pool (CSV I/O and parsing
+    release the GIL for much of the work) and exposes one future per source.
+
+    `loaders` maps a name to a zero-argument callable; `derived` maps a name to
+    `(source_name, fn)` and runs `fn(source_result)` as soon as that source is in.
+    Callers block only on the futures they actually need. Every load is timed
+    and its size recorded (`kind="loader"` in `tool_functions1.Metrics`).
+    """
+
+    def __init__(self, loaders, derived=None, max_workers=None):
+        derived = derived or {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or (len(loaders) + len(derived)),
+            thread_name_prefix="pharmai-load"
+        )
+        self.futures = {name: self._pool.submit(self._load, name, fn) for name, fn in loaders.items()}
+        for name, (source, fn) in derived.items():
+            self.futures[name] = self._pool.submit(self._chain, name, source, fn)
+        # No new work after startup; threads exit once the loads finish
+        self._pool.shutdown(wait=False)
+
+    def _load(self, name, fn, *args):
+        value = METRICS.instrument(fn, kind="loader", name=name)(*args)
+        METRICS.record_size(name, value)
+        return value
+
+    def _chain(self, name, source, fn):
+        return self._load(name, fn, self.futures[source].result())
+
+    def future(self, name):
+        return self.futures[name]
+
+    def ready(self, name):
+        return self.futures[name].done()
+
+    def result(self, name, timeout=None):
+        """
+        Blocks until `name` is loaded; re-raises the loader's exception.
+        """
+        return self.futures[name].result(timeout=timeout)
+
+    def status(self):
+        return {
+            name: ("failed" if f.done() and f.exception() else "ready" if f.done() else "loading")
+            for name, f in self.futures.items()
+        }
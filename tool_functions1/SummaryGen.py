@@ -1,8 +1,13 @@
 import pandas as pd
 
-def generate_exec_summary_data(df, molecule_name):
+from tool_functions1.AtcHierarchy import class_totals
+
+def generate_exec_summary_data(df, molecule_name, hierarchy=None, context=None):
     molecule_name = molecule_name.strip().upper()
-    mol_df = df[df["Molecule Combination"].str.upper() == molecule_name].copy()
+    if context is not None:
+        mol_df = context.rows.copy()
+    else:
+        mol_df = df[df["Molecule Combination"].str.upper() == molecule_name].copy()
     if mol_df.empty:
         return None
 
@@ -96,27 +101,23 @@ def generate_exec_summary_data(df, molecule_name):
         forecast_units[year] = int(total_2024_units * ((1 + unit_cagr / 100) ** i))
         forecast_value[year] = int(total_2024_value * ((1 + value_cagr / 100) ** i))
 
-    # ATC-level metrics
-    df_clean = df.copy()
-    for col in ["2021 Units", "2022 Units", "2023 Units", "2024 Units", "2021 LC Value", "2022 LC Value", "2023 LC Value", "2024 LC Value"]:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors="coerce").fillna(0)
-
+    # ATC-level metrics: looked up in the precomputed hierarchy when given
     atc4_code = mol_df["ATC4"].dropna().unique()[0]
     atc3_code = mol_df["ATC3"].dropna().unique()[0]
 
-    atc4_df = df_clean[df_clean["ATC4"] == atc4_code]
-    atc3_df = df_clean[df_clean["ATC3"] == atc3_code]
-
-    def get_class_metrics(subdf):
+    def get_class_metrics(level, code):
+        totals = class_totals(df, level, code, hierarchy)
+        if totals is None:
+            return {"value_2024": 0, "unit_cagr": 0.0, "value_cagr": 0.0}
         return {
-            "value_2024": subdf["2024 LC Value"].sum(),
+            "value_2024": totals["2024 LC Value"],
             "unit_cagr": compute_cagr_flexible(
-                {"2021": subdf["2021 Units"].sum(), "2022": subdf["2022 Units"].sum(), "2023": subdf["2023 Units"].sum()},
-                subdf["2024 Units"].sum()
+                {"2021": totals["2021 Units"], "2022": totals["2022 Units"], "2023": totals["2023 Units"]},
+                totals["2024 Units"]
             ),
             "value_cagr": compute_cagr_flexible(
-                {"2021": subdf["2021 LC Value"].sum(), "2022": subdf["2022 LC Value"].sum(), "2023": subdf["2023 LC Value"].sum()},
-                subdf["2024 LC Value"].sum()
+                {"2021": totals["2021 LC Value"], "2022": totals["2022 LC Value"], "2023": totals["2023 LC Value"]},
+                totals["2024 LC Value"]
             )
         }
 
@@ -147,8 +148,8 @@ def generate_exec_summary_data(df, molecule_name):
         "atc4": pretty_list(mol_df["ATC4"].dropna().unique()),
         "forecast_units": forecast_units,
         "forecast_value": forecast_value,
-        "atc4_metrics": get_class_metrics(atc4_df),
-        "atc3_metrics": get_class_metrics(atc3_df),
+        "atc4_metrics": get_class_metrics("ATC4", atc4_code),
+        "atc3_metrics": get_class_metrics("ATC3", atc3_code),
         "top_product": top_product_name,
         "top_product_launch_year": top_product_launch_year
     }
\ No newline at end of file
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+KINDS = ["Units", "LC Value"]
+HORIZON = list(range(2025, 2030))
+
+# Two-sided Student-t critical values for small samples (dof 1–10); larger dof
+# use a Cornish–Fisher expansion around the normal quantile
+_T_TABLE = {
+    0.80: [3.078, 1.886, 1.638, 1.533, 1.476, 1.440, 1.415, 1.397, 1.383, 1.372],
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228],
+}
+_Z = {0.80: 1.2816, 0.90: 1.6449, 0.95: 1.9600}
+
+
+def _t_critical(dof, level):
+    """
+    Vectorized two-sided t critical value; NaN where dof < 1.
+    """
+    dof = np.asarray(dof, dtype=float)
+    z = _Z[level]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        approx = z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+    table = np.asarray(_T_TABLE[level])
+    small = np.clip(dof, 1, len(table)).astype(int) - 1
+    out = np.where(dof <= len(table), table[small], approx)
+    return np.where(dof >= 1, out, np.nan)
+
+
+# ─── 1/ Batched fit ─────────────────────────────────────────────────────────────
+def fit_log_trend(matrix, years, horizon=HORIZON, damping=1.0, level=0.90):
+    """
+    Least-squares fit of log(value) on year for every row of an entity × year
+    matrix at once. Non-positive years are left out of a row's fit instead of
+    breaking it. With `damping` φ < 1 the slope fades (damped trend): the
+    projection h years ahead adds slope × (φ + φ² + … + φʰ).
+
+    Returns (fit, low, high, slope, points): `fit`/`low`/`high` are
+    (entities × horizon) levels with a `level` prediction band; the band is
+    NaN for rows with fewer than three usable years, the fit for fewer than two.
+    """
+    values = np.asarray(matrix, dtype=float)
+    t = np.asarray(years, dtype=float) - years[-1]                 # last history year = 0
+    mask = values > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.where(mask, np.log(np.where(mask, values, 1)), 0.0)
+    w = mask.astype(float)
+
+    # Per-row normal equations from masked sums
+    n = w.sum(axis=1)
+    st = w @ t
+    stt = w @ t ** 2
+    sy = (w * y).sum(axis=1)
+    sty = (w * y) @ t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_bar, y_bar = st / n, sy / n
+        sxx = stt - n * t_bar ** 2
+        slope = np.where(sxx > 0, (sty - n * t_bar * y_bar) / sxx, np.nan)
+        intercept = y_bar - slope * t_bar
+
+        resid = w * (y - intercept[:, None] - slope[:, None] * t[None, :])
+        dof = n - 2
+        s2 = np.where(dof > 0, (resid ** 2).sum(axis=1) / dof, np.nan)
+
+    steps = np.asarray(horizon, dtype=float) - years[-1]
+    reach = np.array([(damping ** np.arange(1, int(h) + 1)).sum() for h in steps])   # damped step count
+    log_fit = intercept[:, None] + slope[:, None] * reach[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        se = np.sqrt(s2[:, None] * (1 + 1 / n[:, None] + (reach[None, :] - t_bar[:, None]) ** 2 / sxx[:, None]))
+    half = _t_critical(dof, level)[:, None] * se
+
+    return np.exp(log_fit), np.exp(log_fit - half), np.exp(log_fit + half), slope, n.astype(int)
+
+
+# ─── 2/ Precomputed projections ─────────────────────────────────────────────────
+class TrendForecasts:
+    """
+    Fitted projections for every entity (combination, or combination ×
+    manufacturer), one table per kind ("Units", "LC Value"), built once per
+    dataset. Each table has "Trend Growth (%)", "Fit Points" and, per horizon
+    year, "<year> Fit" / "<year> Low" / "<year> High".
+    """
+
+    def __init__(self, tables, by, history, horizon, damping, level):
+        self.tables = tables
+        self.by = by
+        self.history = history
+        self.horizon = horizon
+        self.damping = damping
+        self.level = level
+
+    def cache_token(self):
+        return {
+            "trend_forecasts": self.by, "history": self.history, "horizon": self.horizon,
+            "damping": self.damping, "level": self.level, "rows": len(self.tables[KINDS[0]]),
+        }
+
+    def projection(self, key, scale=1.0):
+        """
+        Year × (Units / Value fit, low, high) table for one entity, or None.
+        `scale` rescales levels (e.g. 1 / molecules for per-molecule totals).
+        """
+        if key not in self.tables[KINDS[0]].index:
+            return None
+        rows = {}
+        for kind, label in zip(KINDS, ("Units", "Value (AED)")):
+            row = self.tables[kind].loc[key]
+            for suffix in ("Fit", "Low", "High"):
+                rows[f"{label} {suffix}"] = [row[f"{y} {suffix}"] * scale for y in self.horizon]
+        return pd.DataFrame(rows, index=pd.Index(self.horizon, name="Year"))
+
+
+def build_trend_forecasts(df, by="Molecule Combination", history=None, horizon=HORIZON, damping=1.0, level=0.90):
+    """
+    One grouped sum and one batched fit per kind over the whole master.
+    `history` defaults to every year before the first horizon year.
+    """
+    years = sorted(int(c.split()[0]) for c in df.columns if c.endswith(" Units") and c.split()[0].isdigit())
+    history = history or [y for y in years if y < horizon[0]]
+    by = [by] if isinstance(by, str) else list(by)
+
+    cols = [f"{y} {kind}" for kind in KINDS for y in history]
+    data = df[by + cols].copy()
+    data[cols] = data[cols].apply(pd.to_numeric, errors="coerce").fillna(0)
+    grouped = data.groupby(by)[cols].sum()
+
+    tables = {}
+    for kind in KINDS:
+        fit, low, high, slope, points = fit_log_trend(
+            grouped[[f"{y} {kind}" for y in history]].to_numpy(), history, horizon, damping, level
+        )
+        table = pd.DataFrame(index=grouped.index)
+        table["Trend Growth (%)"] = (np.exp(slope) - 1) * 100
+        table["Fit Points"] = points
+        for i, y in enumerate(horizon):
+            table[f"{y} Fit"] = fit[:, i]
+            table[f"{y} Low"] = low[:, i]
+            table[f"{y} High"] = high[:, i]
+        tables[kind] = table
+
+    return TrendForecasts(tables, by, history, list(horizon), damping, level)
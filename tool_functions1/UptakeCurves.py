@@ -0,0 +1,185 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+MARKETS = ["ALL", "PRIVATE MARKET", "LPO"]
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Competitor buckets used by the fixed-penetration rule in the forecast
+COMPETITOR_BUCKETS = {"1": (1, 1), "2–4": (2, 4), "5+": (5, None)}
+
+
+# ─── 1/ Cohort extraction ───────────────────────────────────────────────────────
+def _entry_cohorts(units, years, market):
+    """
+    Share-since-entry curves for every manufacturer of every combination in
+    one matrix pass. `units` is indexed by (combination, manufacturer) with one
+    column per year.
+    """
+    u = units.to_numpy(dtype=float)
+    combo_codes = pd.factorize(units.index.get_level_values(0))[0]
+    n_combos = combo_codes.max() + 1 if len(u) else 0
+    n_years = len(years)
+
+    # Combination totals and active-manufacturer counts per year, broadcast back to rows
+    totals = np.zeros((n_combos, n_years))
+    active = np.zeros((n_combos, n_years))
+    np.add.at(totals, combo_codes, u)
+    np.add.at(active, combo_codes, u > 0)
+    row_totals = totals[combo_codes]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = np.where(row_totals > 0, u / row_totals, np.nan)
+
+    # Entry = first year with sales; genuine entries only (the combination sold before)
+    selling = u > 0
+    entry = selling.argmax(axis=1)
+    combo_start = (totals > 0).argmax(axis=1)[combo_codes]
+    is_entry = selling.any(axis=1) & (entry > combo_start)
+
+    rows = np.flatnonzero(is_entry)
+    entry = entry[rows]
+    offsets = entry[:, None] + np.arange(n_years)[None, :]
+    inside = offsets < n_years
+    aligned = np.where(inside, shares[rows[:, None], np.minimum(offsets, n_years - 1)], np.nan)
+
+    cohorts = pd.DataFrame(aligned, columns=[f"Y{k}" for k in range(n_years)])
+    cohorts.insert(0, "Molecule Combination", units.index.get_level_values(0)[rows])
+    cohorts.insert(1, "Manufacturer", units.index.get_level_values(1)[rows])
+    cohorts.insert(2, "Market", market)
+    cohorts.insert(3, "Entry Year", np.asarray(years)[entry].astype(int))
+    cohorts.insert(4, "Competitors At Entry", (active[combo_codes[rows], entry] - 1).astype(int))
+    return cohorts
+
+
+def build_uptake_library(df, years=None):
+    """
+    Every generic entry in the dataset as an aligned share-since-entry curve
+    (Y0 = entry year), for the total market and per market type, tagged with
+    ATC4 and the number of incumbents at entry.
+    """
+    years = years or sorted(int(c.split()[0]) for c in df.columns if c.endswith(" Units") and c.split()[0].isdigit())
+    unit_cols = [f"{y} Units" for y in years]
+    data = df[["Molecule Combination", "Manufacturer", "Market", "ATC4"] + unit_cols].copy()
+    data[unit_cols] = data[unit_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
+    data["Market"] = data["Market"].astype(str).str.strip().str.upper()
+
+    frames = [_entry_cohorts(data.groupby(["Molecule Combination", "Manufacturer"])[unit_cols].sum(), years, "ALL")]
+    for market in MARKETS[1:]:
+        sub = data[data["Market"] == market]
+        frames.append(_entry_cohorts(sub.groupby(["Molecule Combination", "Manufacturer"])[unit_cols].sum(), years, market))
+    library = pd.concat(frames, ignore_index=True)
+
+    atc4 = data.dropna(subset=["ATC4"]).drop_duplicates("Molecule Combination").set_index("Molecule Combination")["ATC4"]
+    library.insert(3, "ATC4", library["Molecule Combination"].map(atc4))
+    library.attrs["dataset"] = "uptake_library"
+    if df.attrs.get("partition"):
+        library.attrs["partition"] = df.attrs["partition"]
+    return library
+
+
+# ─── 2/ Percentile curves ───────────────────────────────────────────────────────
+def filter_cohorts(library, atc4=None, competitors=None, market="ALL"):
+    """
+    `competitors` is an int or an inclusive (lo, hi) range; hi=None is open.
+    """
+    mask = library["Market"] == market
+    if atc4:
+        mask &= library["ATC4"].isin([atc4] if isinstance(atc4, str) else atc4)
+    if competitors is not None:
+        lo, hi = (competitors, competitors) if isinstance(competitors, int) else competitors
+        mask &= library["Competitors At Entry"] >= lo
+        if hi is not None:
+            mask &= library["Competitors At Entry"] <= hi
+    return library[mask]
+
+
+def uptake_percentiles(library, atc4=None, competitors=None, market="ALL", percentiles=PERCENTILES):
+    """
+    Percentile share (%) by years since entry, plus the number of cohorts
+    observed at each horizon.
+    """
+    cohorts = filter_cohorts(library, atc4, competitors, market)
+    curve_cols = [c for c in library.columns if c.startswith("Y") and c[1:].isdigit()]
+    matrix = cohorts[curve_cols].to_numpy(dtype=float) * 100
+    observed = (~np.isnan(matrix)).sum(axis=0)
+
+    if len(matrix):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN horizons
+            values = np.nanpercentile(matrix, percentiles, axis=0)
+    else:
+        values = np.full((len(percentiles), len(curve_cols)), np.nan)
+
+    table = pd.DataFrame(values.T, columns=[f"P{p}" for p in percentiles], index=pd.Index(range(len(curve_cols)), name="Years Since Entry"))
+    table["Cohorts"] = observed
+    return table[table["Cohorts"] > 0]
+
+
+def empirical_uptake(library, atc4=None, competitors=None, market="ALL", horizon=3, percentile=50, min_cohorts=5):
+    """
+    Share of market (fraction) for the first `horizon` years of sales: the
+    entry year (library Y0) through Y`horizon - 1`, i.e. forecast years
+    Y1..Y`horizon`. Taken from the narrowest cohort with at least
+    `min_cohorts` entries at every horizon: ATC4 + competitors, then ATC4,
+    then competitors, then all entries. Returns (shares, description) or
+    (None, None).
+    """
+    for a, c, label in (
+        (atc4, competitors, "ATC4 + competitors"),
+        (atc4, None, "ATC4"),
+        (None, competitors, "competitors"),
+        (None, None, "all entries"),
+    ):
+        if label != "all entries" and a is None and c is None:
+            continue
+        table = uptake_percentiles(library, a, c, market, (percentile,))
+        table = table.reindex(range(horizon))
+        if table["Cohorts"].ge(min_cohorts).all():
+            shares = table[f"P{percentile}"].to_numpy() / 100
+            return shares, f"P{percentile} of {int(table['Cohorts'].iloc[0])} cohorts ({label})"
+    return None, None
+
+
+def competitor_range(n_competitors):
+    """
+    The COMPETITOR_BUCKETS range holding `n_competitors` incumbents.
+    """
+    for lo, hi in COMPETITOR_BUCKETS.values():
+        if n_competitors >= lo and (hi is None or n_competitors <= hi):
+            return lo, hi
+    return None
+
+
+# ─── 3/ Chart ───────────────────────────────────────────────────────────────────
+def plot_uptake_percentiles(table, title="Share Since Entry"):
+    """
+    P10–P90 and P25–P75 bands with the median line, from `uptake_percentiles`.
+    """
+    import plotly.graph_objects as go
+
+    x = table.index.tolist()
+    fig = go.Figure()
+    for lo, hi, opacity in (("P10", "P90", 0.15), ("P25", "P75", 0.3)):
+        if lo not in table.columns or hi not in table.columns:
+            continue
+        fig.add_trace(go.Scatter(x=x, y=table[hi], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(
+            x=x, y=table[lo], mode="lines", line=dict(width=0), fill="tonexty",
+            fillcolor=f"rgba(31,119,180,{opacity})", name=f"{lo}–{hi}", hoverinfo="skip"
+        ))
+    if "P50" in table.columns:
+        fig.add_trace(go.Scatter(
+            x=x, y=table["P50"], mode="lines+markers", name="Median", line=dict(color="#1f77b4", width=3),
+            customdata=table[["Cohorts"]].to_numpy(),
+            hovertemplate="Year %{x} after entry<br>Median share: %{y:.1f}%<br>Cohorts: %{customdata[0]}<extra></extra>"
+        ))
+    fig.update_layout(
+        title=title,
+        xaxis_title="Years Since Entry",
+        yaxis_title="Share of Combination Units (%)",
+        xaxis=dict(dtick=1),
+        template="plotly_white",
+        height=450
+    )
+    return fig
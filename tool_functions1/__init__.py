@@ -0,0 +1,84 @@
+"""
+Tool functions for the PharmAI app.
+
+Entry points are resolved lazily: `tool_functions1.plot_market_erosion` imports
+`tool_functions1.Erosion` the first time it is accessed, so a rerun only imports
+the tool modules of the open tab. Headless callers (the API, warm-up, notebooks)
+that only need numbers, such as the exec summary, never import plotly. The
+Streamlit app gets no plotly saving, because `import streamlit` already loads
+`plotly.graph_objects`.
+Functions resolved here are instrumented (calls, errors, latency, rows scanned;
+see `tool_functions1.Metrics`).
+"""
+import importlib
+import inspect
+
+from tool_functions1.Metrics import METRICS
+
+# ─── Lazy registry: public name → submodule ─────────────────────────────────────
+_REGISTRY = {
+    "generate_molecule_overview":               "summary",
+    "generate_combination_first_clean_summary": "PacksAndProducts",
+    "build_pack_breakdown":                     "PacksAndProducts",
+    "render_pack_breakdown":                    "PacksAndProducts",
+    "format_registered_products_by_company":    "MohapLandscape",
+    "plot_combination_market_breakdown_plotly": "MoleculePlot",
+    "generate_growth_by_column_card":           "MoleculePlot",
+    "plotly_combinations_within_atc4_go":       "MoleculeATC4",
+    "generate_exec_summary_data":               "SummaryGen",
+    "plot_manufacturer_market_share":           "MarketShare",
+    "plot_market_erosion":                      "Erosion",
+    "display_patent_summary":                   "OrangeBook",
+    "build_product_regulatory_table":           "OrangeBook",
+    "get_regulatory_summary":                   "Reg",
+    "forecast_molecule_product":                "DetailedForecast",
+    "forecast_molecule_product_fmt":            "DetailedForecast",
+    "summarize_portfolio":                      "DetailedForecast",
+    "create_combination_column":                "combinations",
+    "build_atc_hierarchy":                      "AtcHierarchy",
+    "format_atc_nodes":                         "AtcHierarchy",
+    "build_screener_table":                     "Screener",
+    "screen_combinations":                      "Screener",
+    "SCREENER_METRICS":                         "Screener",
+    "build_combination_context":                "CombinationContext",
+    "build_uptake_library":                     "UptakeCurves",
+    "uptake_percentiles":                       "UptakeCurves",
+    "empirical_uptake":                         "UptakeCurves",
+    "competitor_range":                         "UptakeCurves",
+    "plot_uptake_percentiles":                  "UptakeCurves",
+    "COMPETITOR_BUCKETS":                       "UptakeCurves",
+    "forecast_scenario_grid":                   "ScenarioGrid",
+    "grid_axis":                                "ScenarioGrid",
+    "plot_scenario_heatmap":                    "ScenarioGrid",
+    "plot_sensitivity_slices":                  "ScenarioGrid",
+    "SCENARIO_METRICS":                         "ScenarioGrid",
+    "build_trend_forecasts":                    "TrendForecast",
+    "fit_log_trend":                            "TrendForecast",
+}
+
+__all__ = sorted(_REGISTRY)
+
+
+def __getattr__(name):
+    module_name = _REGISTRY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{module_name}")
+    value = getattr(module, name)
+    if inspect.isfunction(value):
+        value = METRICS.instrument(value, kind="tool")
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_REGISTRY))
+
+
+def loaded_modules():
+    """
+    Submodules imported so far (handy when checking startup cost).
+    """
+    import sys
+    prefix = __name__ + "."
+    return sorted(m[len(prefix):] for m in sys.modules if m.startswith(prefix))
@@ -1,6 +1,31 @@
 import pandas as pd
 
-def create_combination_column(df: pd.DataFrame) -> pd.DataFrame:
+
+def combination_name(molecules):
+    """
+    "A + B" for the molecules of one product, sorted and de-duplicated.
+    """
+    return " + ".join(sorted(set(molecules)))
+
+
+def product_combination_map(df: pd.DataFrame) -> dict:
+    """
+    { product: molecule combination } over the (normalized) rows of `df`.
+    """
+    return (
+        df.groupby("Product")["Molecule"]
+        .unique()
+        .apply(combination_name)
+        .to_dict()
+    )
+
+
+def create_combination_column(df: pd.DataFrame, combination_map=None) -> pd.DataFrame:
+    """
+    Adds 'Molecule Combination' and 'Molecule Combination Type'. The
+    product → combination mapping comes from `df` itself unless
+    `combination_map` is given (chunked ingest builds it over the whole file).
+    """
     df = df.copy()
 
     # Ensure columns are clean
@@ -11,15 +36,11 @@ def create_combination_column(df: pd.DataFrame) -> pd.DataFrame:
     df["Product"] = df["Product"].astype(str).str.strip().str.upper()
 
     # Step 1: Create a mapping from Product → sorted list of Molecules in that product
-    product_molecule_map = (
-        df.groupby("Product")["Molecule"]
-        .unique()
-        .apply(lambda mols: " + ".join(sorted(set(mols))))
-        .to_dict()
-    )
+    if combination_map is None:
+        combination_map = product_combination_map(df)
 
     # Step 2: Apply combination and type
-    df["Molecule Combination"] = df["Product"].map(product_molecule_map)
+    df["Molecule Combination"] = df["Product"].map(combination_map)
     df["Molecule Combination Type"] = df["Molecule Combination"].apply(
         lambda x: "MONO" if " + " not in x else "COMBINATION"
     )
@@ -1,11 +1,15 @@
 import pandas as pd
 
-def generate_molecule_overview(df, molecule_name):
+from tool_functions1.AtcHierarchy import class_totals
+
+def generate_molecule_overview(df, molecule_name, hierarchy=None, context=None):
     """
     Returns a clean, formatted vertical summary DataFrame for a given molecule.
+    ATC4 / ATC3 class figures come from `hierarchy` and the molecule's rows
+    from `context` when given.
     """
     m = molecule_name.strip().upper()
-    mol_df = df[df["Molecule Combination"].str.upper() == m]
+    mol_df = context.rows if context is not None else df[df["Molecule Combination"].str.upper() == m]
     if mol_df.empty:
         return None
 
@@ -21,8 +25,11 @@ def generate_molecule_overview(df, molecule_name):
     # ATC info
     atc3 = mol_df["ATC3"].mode()[0] if not mol_df["ATC3"].isna().all() else "N/A"
     atc4 = mol_df["ATC4"].mode()[0] if not mol_df["ATC4"].isna().all() else "N/A"
-    atc4_df = df[df["ATC4"] == atc4]
-    atc3_df = df[df["ATC3"] == atc3]
+    atc4_tot = class_totals(df, "ATC4", atc4, hierarchy)
+    atc3_tot = class_totals(df, "ATC3", atc3, hierarchy)
+
+    def class_sum(totals, col):
+        return totals[col] if totals is not None else 0
 
     # Yearly values
     years = ["2021", "2022", "2023", "2024"]
@@ -32,11 +39,11 @@ def generate_molecule_overview(df, molecule_name):
     # CAGR calculations
     units_cagr = cagr(units[0], units[-1])
     value_cagr = cagr(values[0], values[-1])
-    atc4_cagr = cagr(atc4_df["2021 LC Value"].sum(), atc4_df["2024 LC Value"].sum())
-    atc3_cagr = cagr(atc3_df["2021 LC Value"].sum(), atc3_df["2024 LC Value"].sum())
+    atc4_cagr = cagr(class_sum(atc4_tot, "2021 LC Value"), class_sum(atc4_tot, "2024 LC Value"))
+    atc3_cagr = cagr(class_sum(atc3_tot, "2021 LC Value"), class_sum(atc3_tot, "2024 LC Value"))
 
     # Market stats
-    competitors = atc4_df["Molecule Combination"].nunique() - 1
+    competitors = class_sum(atc4_tot, "Combinations") - 1
     manuf_df = mol_df.groupby("Manufacturer")["2024 Units"].sum().reset_index(name="units_2024")
     manuf_total = manuf_df["Manufacturer"].nunique()
     manuf_df["share"] = manuf_df["units_2024"] / (units[-1] or 1) * 100
@@ -64,9 +71,9 @@ def generate_molecule_overview(df, molecule_name):
         "First Launch Year": launch_year,
         "Private Market Share 2024 (%)": private_pct_24,
         "Private Market Shift (21→24) (%)": private_delta,
-        "ATC4 Value 2024 (AED)": atc4_df["2024 LC Value"].sum(),
+        "ATC4 Value 2024 (AED)": class_sum(atc4_tot, "2024 LC Value"),
         "ATC4 Value CAGR (%)": atc4_cagr,
-        "ATC3 Value 2024 (AED)": atc3_df["2024 LC Value"].sum(),
+        "ATC3 Value 2024 (AED)": class_sum(atc3_tot, "2024 LC Value"),
         "ATC3 Value CAGR (%)": atc3_cagr,
     }
 
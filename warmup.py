@@ -0,0 +1,166 @@
+"""
+Pre-populates the shared disk cache before a deploy takes traffic.
+
+    python warmup.py --top 50
+
+Loads the master, MOHAP and Orange Book data for the current dataset version,
+then computes the default views of the app (exec summary, breakdown, growth
+cards, ATC4 breakdown, overview, pack breakdown, erosion, regulatory snapshot)
+for the top-N combinations by 2024 value. Calls mirror PharmAI2.py exactly, so
+every worker process finds them in the cache on first request. Load times and
+per-view compute times are written as Prometheus text (`--metrics`), so a
+refresh that makes a view slow shows up before users see it. With a
+partitioned master (PHARMAI_MASTER_SOURCES) it also builds the partition
+store and warms one country and release (`--country`, `--release`).
+"""
+import argparse
+import os
+import sys
+import time
+
+from tool_functions1.DataLoader import (
+    read_master_data, read_mohap_data, read_orange_book, compute_top_products, top_combinations
+)
+from tool_functions1.DataRegistry import registry
+from tool_functions1.DiskCache import DiskCache, cached_call, scoped_version
+from tool_functions1.StartupLoader import StartupLoader
+from tool_functions1.Metrics import METRICS
+from tool_functions1.SharedFrame import freeze_frame, freeze_frames
+from tool_functions1.ArrowStore import ArrowStore, arrow_available, load_mapped
+from tool_functions1.MasterIngest import load_master, load_master_aggregates
+from tool_functions1.PartitionStore import (
+    DEFAULT_COUNTRY, PartitionedStore, default_partition, master_sources, partition_key, partitioning_enabled
+)
+from tool_functions1.SummaryGen import generate_exec_summary_data
+from tool_functions1.MoleculePlot import plot_combination_market_breakdown_plotly, generate_growth_by_column_card
+from tool_functions1.MoleculeATC4 import plotly_combinations_within_atc4_go
+from tool_functions1.summary import generate_molecule_overview
+from tool_functions1.Erosion import plot_market_erosion
+from tool_functions1.Reg import get_regulatory_summary
+from tool_functions1.OrangeBook import build_product_regulatory_table
+from tool_functions1.AtcHierarchy import build_atc_hierarchy
+from tool_functions1.Screener import build_screener_table
+from tool_functions1.CombinationContext import build_combination_context
+from tool_functions1.PacksAndProducts import build_pack_breakdown
+from tool_functions1.UptakeCurves import build_uptake_library
+from tool_functions1.TrendForecast import build_trend_forecasts
+
+
+def default_views(combo, df, mohap_df, orange_book, hierarchy):
+    """
+    (fn, args, kwargs) for every cached call the app makes with its default widget state.
+    """
+    ctx = build_combination_context(df, combo)
+    calls = [
+        (generate_exec_summary_data, (df, combo), dict(hierarchy=hierarchy, context=ctx)),
+        (plot_combination_market_breakdown_plotly, (df,), dict(
+            selected_molecule=combo, use_market_filter=True, market_type="PRIVATE MARKET",
+            use_value=False, group_by_column="Manufacturer", context=ctx
+        )),
+        (generate_growth_by_column_card, (df,), dict(combo=combo, group_col="NFC3", context=ctx)),
+        (generate_growth_by_column_card, (df,), dict(combo=combo, group_col="Strength", context=ctx)),
+        (generate_molecule_overview, (df, combo), dict(hierarchy=hierarchy, context=ctx)),
+        (plot_market_erosion, (df, combo), dict(context=ctx)),
+        (build_pack_breakdown, (df, combo), dict(context=ctx)),
+    ]
+    if ctx.atc["ATC4"] is not None:
+        calls.append((plotly_combinations_within_atc4_go, (df,), dict(atc4_name=ctx.atc["ATC4"], UseValue=False, hierarchy=hierarchy)))
+    if orange_book is not None:
+        ob_products, ob_product_table = orange_book
+        calls.append((get_regulatory_summary, (combo, mohap_df, ob_products, ob_product_table), {}))
+    return calls
+
+
+def warm_up(top_n=50, cache=None, log=print, country=DEFAULT_COUNTRY, release=None):
+    cache = cache or DiskCache()
+    version, _ = registry.refresh()
+    removed = cache.evict_stale(version)
+    log(f"dataset version {version} (evicted {removed} stale entries)")
+    # Arrow files written here are memory-mapped by every app worker that starts later
+    store = ArrowStore() if arrow_available() else None
+
+    if partitioning_enabled():
+        partitions = PartitionedStore()
+        catalog = partitions.ensure(master_sources(), version)
+        country, release = default_partition(catalog, country, release)
+        log(f"partitioned master: warming {country} {release}\n{catalog.summary().to_string(index=False)}")
+        cache_version = scoped_version(version, partition_key(country, release))
+        aggregates_store = None                 # per-partition totals are not kept in the Arrow store
+
+        def load_master_source():
+            return partitions.scan(catalog, country, release)
+    else:
+        cache_version, aggregates_store = version, store
+
+        def load_master_source():
+            return load_master(store, version, lambda: cached_call(cache, version, read_master_data))
+
+    t0 = time.perf_counter()
+    loader = StartupLoader(
+        {
+            "master":      lambda: freeze_frame(load_master_source()),
+            "mohap":       lambda: freeze_frame(load_mapped(
+                store, "mohap", version, lambda: cached_call(cache, version, read_mohap_data)
+            )),
+            "orange_book": lambda: freeze_frames(load_mapped(
+                store, ("ob_products", "ob_patents", "ob_exclusivity"), version,
+                lambda: cached_call(cache, version, read_orange_book)
+            )),
+        },
+        derived={
+            "master_aggregates": ("master", lambda master: load_master_aggregates(aggregates_store, version, master)),
+            "top_products": ("master_aggregates", lambda totals: cached_call(cache, cache_version, compute_top_products, totals)),
+            "atc_hierarchy": ("master", lambda master: cached_call(cache, cache_version, build_atc_hierarchy, master)),
+            "uptake_library": ("master", lambda master: cached_call(cache, cache_version, build_uptake_library, master)),
+            "trend_forecasts": ("master", lambda master: cached_call(cache, cache_version, build_trend_forecasts, master)),
+            "ob_product_table": ("orange_book", lambda ob: freeze_frame(cached_call(
+                cache, version, build_product_regulatory_table, ob[1], ob[2]
+            ))),
+        }
+    )
+    df = loader.result("master")
+    mohap_df = loader.result("mohap")
+    loader.result("top_products")
+    hierarchy = loader.result("atc_hierarchy")
+    loader.result("uptake_library")
+    trends = loader.result("trend_forecasts")
+    try:
+        orange_book = (loader.result("orange_book")[0], loader.result("ob_product_table"))
+    except FileNotFoundError as e:
+        log(f"Orange Book not available, skipping regulatory views: {e}")
+        orange_book = None
+    log(f"loaded sources in {time.perf_counter() - t0:.1f}s")
+
+    # Dataset-wide views, computed once rather than per combination
+    if orange_book is not None:
+        cached_call(cache, cache_version, build_screener_table, df, mohap_df, *orange_book, hierarchy=hierarchy, trends=trends)
+
+    failures = 0
+    for rank, combo in enumerate(top_combinations(loader.result("master_aggregates"), top_n), 1):
+        t1 = time.perf_counter()
+        for fn, args, kwargs in default_views(combo, df, mohap_df, orange_book, hierarchy):
+            try:
+                cached_call(cache, cache_version, fn, *args, **kwargs)
+            except Exception as e:
+                failures += 1
+                log(f"  ! {fn.__name__} failed for {combo}: {e}")
+        log(f"[{rank}/{top_n}] {combo} ({time.perf_counter() - t1:.2f}s)")
+
+    stats = cache.stats()
+    log(f"cache ready: {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB in {stats['path']}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm the shared PharmAI cache.")
+    parser.add_argument("--top", type=int, default=50, help="number of combinations to precompute (by 2024 value)")
+    parser.add_argument("--cache", default=None, help="SQLite cache path (default: PHARMAI_CACHE_PATH or .cache/)")
+    parser.add_argument("--metrics", default=os.path.join(".cache", "metrics-warmup.prom"),
+                        help="where to write load and compute timings (.prom or .json; '' to skip)")
+    parser.add_argument("--country", default=DEFAULT_COUNTRY, help="country to warm when the master is partitioned")
+    parser.add_argument("--release", default=None, help="data release (default: the country's latest)")
+    opts = parser.parse_args()
+    failed = warm_up(opts.top, DiskCache(opts.cache) if opts.cache else None, country=opts.country, release=opts.release)
+    if opts.metrics:
+        print(f"metrics written to {METRICS.write(opts.metrics)}")
+    sys.exit(1 if failed else 0)